@@ -0,0 +1,201 @@
+# ===== АДАПТЕР TELEGRAM =====
+#
+# Всё, что зависит от python-telegram-bot: запросы к Bot API с метриками,
+# исходящая сторона движка (TelegramBot), ответ на
+# апдейт (TelegramReply), таблица обработчиков и сборка Application.
+#
+# main.py импортирует модуль лениво (lazy.lazy_import): PTB с httpx
+# грузится около 0.3 с, и в режиме вебхука сервер в это время уже
+# принимает апдейты.
+
+import time
+
+import httpx
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram.request import HTTPXRequest
+
+import metrics
+from dispatch import ChatUpdateProcessor
+from engine import STALE_PRESS, Engine
+from outbox import GAME, INFO
+
+class MetricsRequest(HTTPXRequest):
+    """HTTPXRequest, который считает запросы к Bot API и их длительность по методам."""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        t = time.perf_counter()
+        outcome = "error"
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+            outcome = "ok" if code < 400 else str(code)
+            return code, payload
+        finally:
+            metrics.API_SECONDS.observe(time.perf_counter() - t, api_method)
+            metrics.API_CALLS.inc(api_method, outcome)
+
+def markup(buttons):
+    # не кэшируется: в кнопках стола версия игры, набор почти не повторяется
+    if buttons is None:
+        return None
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton(text, callback_data=data) for text, data in row] for row in buttons]
+    )
+
+def flood_wait(exc):
+    """Секунды из RetryAfter (flood control) или None для прочих ошибок."""
+    if not isinstance(exc, RetryAfter):
+        return None
+    delay = exc.retry_after
+    # int до PTB_TIMEDELTA, timedelta после
+    return delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+
+class TelegramBot:
+    """Исходящая сторона движка поверх бота python-telegram-bot.
+
+    Стол и уведомления игры идут через outbox в классе GAME.
+    """
+
+    def __init__(self, bot, outbox):
+        self.bot = bot
+        self.outbox = outbox
+
+    async def send(self, chat_id, text, buttons=None):
+        msg = await self.outbox.call(
+            chat_id, GAME, lambda: self.bot.send_message(chat_id, text, reply_markup=markup(buttons))
+        )
+        return msg.message_id
+
+    async def edit(self, chat_id, message_id, text, buttons=None):
+        # правка, ещё ждущая в очереди, заменяется новой (ключ – сообщение)
+        return await self.outbox.call(
+            chat_id, GAME, lambda: self._edit(chat_id, message_id, text, buttons), key=message_id
+        )
+
+    async def _edit(self, chat_id, message_id, text, buttons):
+        try:
+            await self.bot.edit_message_text(
+                text, chat_id=chat_id, message_id=message_id, reply_markup=markup(buttons)
+            )
+        except BadRequest as exc:
+            # тот же текст – стол и так актуален; иначе сообщение пропало
+            return "not modified" in str(exc)
+        return True
+
+class TelegramReply:
+    """Ответ на один апдейт: сообщение с командой или нажатие кнопки."""
+
+    __slots__ = ("update", "outbox")
+
+    def __init__(self, update: Update, outbox):
+        self.update = update
+        self.outbox = outbox
+
+    async def reply(self, text):
+        # ответы на команды – в очередь INFO, обработчик их не ждёт
+        message = self.update.effective_message
+        self.outbox.post(message.chat_id, INFO, lambda: message.reply_text(text))
+
+    async def answer(self, text=None, alert=False):
+        # answerCallbackQuery не под лимитом чата и должен уйти сразу
+        await self.update.callback_query.answer(text, show_alert=alert)
+
+    async def edit(self, text):
+        message = self.update.callback_query.message
+        # ключ не совпадает с ключом правки стола (TelegramBot.edit): иначе
+        # этот текст заменил бы в очереди стол того же сообщения и отдал бы
+        # его ожидающему свой результат
+        self.outbox.post(
+            message.chat_id, INFO, lambda: self.update.callback_query.edit_message_text(text),
+            key=("reply", message.chat_id, message.message_id),
+        )
+
+# ===== ОБРАБОТЧИКИ =====
+
+class Handlers:
+    """Обработчики апдейтов поверх движка.
+
+    Вместо CommandHandler на каждую команду – один на все Engine.COMMANDS
+    (PTB проверяет имя по множеству) и один на кнопки: таблица
+    регистрируется одним add_handlers, и апдейт не перебирает по
+    обработчику на команду. engine и outbox появляются в on_startup.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.outbox = None
+
+    def table(self):
+        return [
+            CommandHandler(tuple(Engine.COMMANDS), self.on_command),
+            CallbackQueryHandler(self.on_button),
+        ]
+
+    async def on_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.effective_message
+        # "/команда@бот аргументы" – CommandHandler уже проверил, что команда наша
+        name = message.text[1:message.entities[0].length].partition("@")[0].lower()
+        user = update.effective_user
+        await self.engine.command(
+            name, TelegramReply(update, self.outbox), update.effective_chat.id, user.id, user.first_name,
+            context.args or (),
+        )
+
+    async def on_button(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await self.engine.press(
+            TelegramReply(update, self.outbox), query.message.chat.id, query.from_user.id,
+            query.from_user.first_name, query.data,
+        )
+
+    def stale_button(self, update):
+        """Ответ на устаревшее или повторное нажатие – до очереди чата (ChatUpdateProcessor)."""
+        query = update.callback_query if isinstance(update, Update) else None
+        if self.engine is None or query is None or query.message is None or not query.data:
+            return None
+        if not self.engine.stale_press(query.message.chat.id, query.data):
+            return None
+        metrics.STALE_PRESSES.inc("dispatch")
+        return query.answer(STALE_PRESS)
+
+# ===== ПРИЛОЖЕНИЕ =====
+
+def build_app(token, handlers, post_init, post_shutdown, urls=None, max_concurrent=256) -> Application:
+    builder = Application.builder().token(token)
+    if urls:
+        builder = builder.base_url(urls["base_url"]).base_file_url(urls["base_file_url"])
+    # один TLS-контекст на оба пула соединений: сертификаты грузятся один раз
+    tls = {"verify": httpx.create_ssl_context()}
+    app = (
+        builder
+        .request(MetricsRequest(connection_pool_size=256, httpx_kwargs=tls))
+        .get_updates_request(HTTPXRequest(connection_pool_size=1, httpx_kwargs=tls))
+        # разные чаты параллельно, внутри чата – по очереди
+        .concurrent_updates(ChatUpdateProcessor(max_concurrent, bypass=handlers.stale_button))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    app.bot_data["handlers"] = handlers
+    app.add_handlers(handlers.table())
+    return app
+
+async def set_webhook(bot: Bot, url, secret):
+    await bot.set_webhook(url, secret_token=secret, allowed_updates=Update.ALL_TYPES)
+
+async def process_raw_update(app: Application, data: dict):
+    update = Update.de_json(data, app.bot)
+    # через тот же процессор, что и при polling: порядок внутри чата сохраняется
+    await app.update_processor.process_update(update, app.process_update(update))
+
+async def poll_updates(bot: Bot, handle, stop):
+    """getUpdates без Application – для фронта шардированного режима."""
+    await bot.delete_webhook()
+    offset = 0
+    while not stop.is_set():
+        updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=Update.ALL_TYPES)
+        for update in updates:
+            offset = update.update_id + 1
+            await handle(update.to_dict())
@@ -0,0 +1,79 @@
+# Двойные нажатия: кнопки без версии ("hit") против версионных
+# ("hit:<gid>:<version>").
+#
+# Каждое нажатие приходит --taps раз подряд с одним и тем же
+# callback_data, как при двойном тапе или повторной доставке. Меряется:
+#
+#   лишних ходов – ходов сверх задуманных (повтор Hit тянет лишнюю карту,
+#                  повтор Stand ставит следующего игрока);
+#   правок стола – редактирований сообщения-стола за все раздачи;
+#   повтор, мкс  – среднее время обработки повторного нажатия.
+#
+#   python bench/bench_double_tap.py --chats 300 --taps 2
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.loadtest import FakeBot, FakeReply, button
+from engine import Engine
+from storage import NullStorage
+
+async def play(engine, r, chat_id, rounds, taps, versioned, stats):
+    users = ((chat_id * 2, f"P{chat_id}a"), (chat_id * 2 + 1, f"P{chat_id}b"))
+    await engine.command("newgame", r, chat_id, *users[0])
+    for uid, name in users:
+        await engine.command("join", r, chat_id, uid, name)
+    for rnd in range(rounds):
+        if rnd:
+            await engine.command("rematch", r, chat_id, *users[0])
+        await engine.command("startgame", r, chat_id, *users[0])
+        game = engine.games[chat_id]
+        while game.started:
+            uid = game.order[game.turn]
+            p = game.players[uid]
+            action = "hit" if p.hand.score < 17 else "stand"
+            data = button(game, action) if versioned else action
+            stats["intended"] += 1
+            for tap in range(taps):
+                moves = game.version
+                t = time.perf_counter()
+                await engine.press(r, chat_id, uid, p.name, data)
+                if tap:
+                    stats["repeat_time"] += time.perf_counter() - t
+                    stats["repeats"] += 1
+                    stats["extra"] += game.version != moves
+            # стол успевает отрисоваться, как между нажатиями живых игроков
+            await asyncio.sleep(0)
+
+async def run(args, versioned):
+    bot = FakeBot()
+    engine = Engine(NullStorage(), bot, table_delay=0, shoe_seed=1)
+    await engine.start()
+    r = FakeReply(bot)
+    stats = {"intended": 0, "extra": 0, "repeats": 0, "repeat_time": 0.0}
+    await asyncio.gather(*(play(engine, r, -1 - i, args.rounds, args.taps, versioned, stats) for i in range(args.chats)))
+    await engine.stop()
+    return stats, bot.calls
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--taps", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"чатов: {args.chats}, раундов: {args.rounds}, нажатий подряд: {args.taps}")
+    for label, versioned in (("без версии", False), ("с версией", True)):
+        stats, calls = asyncio.run(run(args, versioned))
+        print(
+            f"{label:>10}: задуманных ходов {stats['intended']}, лишних {stats['extra']} | "
+            f"правок стола {calls['edit']} | повтор {stats['repeat_time'] / stats['repeats'] * 1e6:.1f} мкс"
+        )
+
+if __name__ == "__main__":
+    main()
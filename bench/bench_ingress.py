@@ -0,0 +1,189 @@
+# Сравнение приёма апдейтов: long polling против вебхука.
+#
+# Поднимает фейковый Bot API (bench/fake_api.py) и настоящий Application
+# с ChatUpdateProcessor. В режиме polling апдейты кладутся в очередь
+# getUpdates фейкового API, в режиме webhook – POST-ятся в WebhookServer.
+# Меряется время от «отправки» апдейта до входа в обработчик.
+#
+#   python bench/bench_ingress.py --updates 5000 --rate 2000
+#   python bench/bench_ingress.py --replay recorded_updates.jsonl
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from bench.fake_api import FakeBotAPI
+from dispatch import ChatUpdateProcessor
+from webhook import WebhookServer
+
+SECRET = "bench-secret"
+
+def synthetic_updates(n, chats):
+    for i in range(n):
+        chat = -1000 - i % chats
+        yield {
+            "message": {
+                "message_id": i + 1,
+                "date": 0,
+                "chat": {"id": chat, "type": "group", "title": "bench"},
+                "from": {"id": i % 7 + 1, "is_bot": False, "first_name": "P"},
+                "text": "/status",
+            }
+        }
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                data.pop("update_id", None)
+                yield data
+
+class WebhookClient:
+    """Как Telegram: до connections постоянных соединений, POST за POST-ом."""
+
+    def __init__(self, port, path, connections=40):
+        self.port = port
+        self.path = path
+        self.queue = asyncio.Queue()
+        self.connections = connections
+        self.tasks = []
+
+    async def start(self):
+        self.tasks = [asyncio.create_task(self._conn()) for _ in range(self.connections)]
+
+    async def _conn(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        try:
+            while True:
+                body = await self.queue.get()
+                writer.write(
+                    f"POST {self.path} HTTP/1.1\r\nHost: bench\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                status = await reader.readline()
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                if b" 200 " not in status:
+                    # 503: очередь полна, Telegram повторил бы позже
+                    await asyncio.sleep(0.01)
+                    self.queue.put_nowait(body)
+                self.queue.task_done()
+        finally:
+            writer.close()
+
+    def post(self, data):
+        self.queue.put_nowait(json.dumps(data).encode())
+
+    async def stop(self):
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+async def run(mode, updates, rate, work):
+    api = FakeBotAPI()
+    await api.start()
+    sent_at = {}
+    latencies = []
+    done = asyncio.Event()
+    total = len(updates)
+
+    async def handler(update, context):
+        latencies.append(time.perf_counter() - sent_at[update.update_id])
+        if work:
+            await asyncio.sleep(work)
+        if len(latencies) == total:
+            done.set()
+
+    app = (
+        Application.builder()
+        .token("1:bench")
+        .base_url(f"{api.url}/bot")
+        .concurrent_updates(ChatUpdateProcessor(256))
+        .build()
+    )
+    app.add_handler(TypeHandler(Update, handler))
+
+    async def process(data):
+        update = Update.de_json(data, app.bot)
+        await app.update_processor.process_update(update, app.process_update(update))
+
+    server = WebhookServer(process, port=0, secret=SECRET, workers=256)
+
+    async with app:
+        await app.start()
+        if mode == "polling":
+            await app.updater.start_polling(poll_interval=0, timeout=10)
+        else:
+            await server.start()
+            client = WebhookClient(server.port, server.path)
+            await client.start()
+
+        started = time.perf_counter()
+        for i, data in enumerate(updates):
+            if rate:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if mode == "polling":
+                uid = api._next_update_id
+                sent_at[uid] = time.perf_counter()
+                api.push_update(data)
+            else:
+                uid = i + 1
+                sent_at[uid] = time.perf_counter()
+                client.post(dict(data, update_id=uid))
+            if not rate and i % 100 == 99:
+                await asyncio.sleep(0)
+        await asyncio.wait_for(done.wait(), 60)
+        elapsed = time.perf_counter() - started
+
+        if mode == "polling":
+            await app.updater.stop()
+        else:
+            await client.stop()
+            await server.stop()
+        await app.stop()
+    await api.stop()
+
+    ms = [x * 1000 for x in latencies]
+    print(
+        f"{mode:<8} {total / elapsed:9.0f} апд/с   "
+        f"p50 {percentile(ms, 0.5):7.2f} мс   p99 {percentile(ms, 0.99):7.2f} мс   "
+        f"вызовов API: {sum(api.calls.values())}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="polling против webhook")
+    parser.add_argument("--updates", type=int, default=3000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду, 0 – без ограничения")
+    parser.add_argument("--work", type=float, default=0.0, help="время обработки апдейта, с")
+    parser.add_argument("--replay", help="jsonl с записанными апдейтами")
+    args = parser.parse_args()
+
+    if args.replay:
+        updates = list(load_updates(args.replay))
+    else:
+        updates = list(synthetic_updates(args.updates, args.chats))
+    for mode in ("polling", "webhook"):
+        asyncio.run(run(mode, updates, args.rate, args.work))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Память на одного отслеживаемого пользователя: старые записи-dict
+# (руки – списки Unicode-строк, имя своё в каждой структуре) против
+# записей со __slots__ из records.py (руки – array('B'), имя интернировано).
+#
+# Для каждой пары игроков в чате строится игра, строки статистики и
+# балансы – как после /join и одной раздачи. Имя каждый раз приходит
+# новой строкой, как из JSON очередного апдейта.
+#
+#   python bench/bench_memory.py --chats 50000
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import DECK_SIZE, GLYPHS, Hand
+from records import Balance, Game, Player, StatLine
+from shoe import Shoe
+
+def fresh(name):
+    # новый объект str с тем же текстом
+    return "".join(list(name))
+
+def deal(rng):
+    return [rng.randrange(DECK_SIZE) for _ in range(rng.choice((2, 3, 4)))]
+
+# ===== СТАРЫЕ DICT-ЗАПИСИ =====
+
+def build_dicts(chats, rng, shoes):
+    games, stats, balances = {}, {}, {}
+    for chat_id in range(chats):
+        users = [(chat_id * 2 + i, f"Игрок {chat_id * 2 + i}") for i in range(2)]
+        games[chat_id] = {
+            "players": {
+                uid: {
+                    "name": fresh(name),
+                    "hand": [GLYPHS[c] for c in deal(rng)],
+                    "stand": True,
+                    "busted": False,
+                    "bet": 10,
+                }
+                for uid, name in users
+            },
+            "order": [uid for uid, _ in users],
+            "turn": 0,
+            "started": False,
+            "finished": True,
+            "table_id": None,
+            "shoe": shoes[chat_id],
+        }
+        stats[chat_id] = {
+            uid: {"name": fresh(name), "wins": 1, "losses": 0, "draws": 0, "busts": 0}
+            for uid, name in users
+        }
+        balances[chat_id] = {uid: {"name": fresh(name), "balance": 1000} for uid, name in users}
+    return games, stats, balances
+
+# ===== ЗАПИСИ СО __slots__ =====
+
+def build_records(chats, rng, shoes):
+    games, stats, balances = {}, {}, {}
+    for chat_id in range(chats):
+        users = [(chat_id * 2 + i, f"Игрок {chat_id * 2 + i}") for i in range(2)]
+        game = Game(shoes[chat_id])
+        for uid, name in users:
+            game.players[uid] = Player(fresh(name), Hand(deal(rng)), True, False, 10)
+            game.order.append(uid)
+        game.finished = True
+        games[chat_id] = game
+        stats[chat_id] = {uid: StatLine(fresh(name), 1) for uid, name in users}
+        balances[chat_id] = {uid: Balance(fresh(name), 1000) for uid, name in users}
+    return games, stats, balances
+
+def measure(build, chats, seed, shoes):
+    gc.collect()
+    tracemalloc.start()
+    data = build(chats, random.Random(seed), shoes)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # башмаки одинаковы в обоих вариантах и в замер не входят
+    shoes = [Shoe(6, seed=i) for i in range(args.chats)]
+    users = args.chats * 2
+
+    print(f"чатов: {args.chats}, пользователей: {users}")
+    results = {}
+    for label, build in (("dict", build_dicts), ("__slots__", build_records)):
+        size = measure(build, args.chats, args.seed, shoes)
+        results[label] = size
+        print(f"{label:>10}: {size / 2**20:7.1f} МиБ, {size / users:6.0f} байт на пользователя")
+    print(f"экономия: {1 - results['__slots__'] / results['dict']:.0%}")
+
+if __name__ == "__main__":
+    main()
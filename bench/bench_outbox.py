@@ -0,0 +1,141 @@
+# Очередь исходящих (outbox.Outbox) против отправки прямо из обработчика.
+#
+# Фейковый Bot API (bench/fake_api.py) с flood control: --chat-limit
+# сообщений за --window секунд на чат и --global-limit за то же окно на
+# бота, сверх – 429 с retry_after. Настоящий telegram.Bot шлёт в него:
+#
+#   в каждый из --chats чатов сначала --info ответов на команды (как
+#   наплыв /top, /stats, /balance), следом --edits правок сообщения-стола
+#   (ходы раздачи, важна последняя); один «горячий» чат получает
+#   впятеро больше.
+#
+# Напрямую – как было: каждый запрос await-ится сразу, 429 – ошибка
+# обработчика и потерянное сообщение. Через outbox – лимиты на чат и на
+# бота, GAME раньше INFO, RetryAfter усыпляет только свой чат, правки
+# стола, не успевшие уйти, заменяются последней.
+#
+# Меряется: ответов 429, потерянных сообщений, запросов к API, время до
+# последней правки стола (p50/p99 по чатам) и до ответов на команды.
+#
+#   python bench/bench_outbox.py --chats 50 --info 6 --edits 6
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
+
+from adapter import flood_wait
+from bench.fake_api import FakeBotAPI
+from outbox import GAME, INFO, Outbox
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+async def run(args, mode):
+    window = args.window
+    api = FakeBotAPI(chat_limit=(args.chat_limit, window), global_limit=(args.global_limit, window))
+    await api.start()
+    bot = Bot("1:bench", base_url=f"{api.url}/bot", request=HTTPXRequest(connection_pool_size=128))
+    outbox = Outbox(
+        rate=args.global_limit / window, burst=1,
+        group_rate=args.chat_limit / window, group_burst=1,
+        concurrency=64, retry_after=flood_wait,
+    )
+    stats = {"lost": 0, "game": [], "info": []}
+
+    async with bot:
+        chats = [-1 - i for i in range(args.chats)]
+        tables = {}
+        for chat_id in chats:
+            tables[chat_id] = (await bot.send_message(chat_id, "стол")).message_id
+        # окно лимитов – с чистого листа
+        await asyncio.sleep(window)
+        api.flooded.clear()
+        api.calls.clear()
+
+        if mode == "outbox":
+            outbox.start()
+        t0 = time.perf_counter()
+
+        async def direct(call):
+            try:
+                await call()
+            except RetryAfter:
+                stats["lost"] += 1
+
+        async def chat(chat_id):
+            scale = 5 if chat_id == chats[0] else 1
+            pending = []
+            for i in range(args.info * scale):
+                call = lambda i=i: bot.send_message(chat_id, f"/top #{i}")
+                if mode == "outbox":
+                    pending.append(("info", outbox.call(chat_id, INFO, call)))
+                else:
+                    pending.append(("info", direct(call)))
+            message_id = tables[chat_id]
+            last = None
+            for i in range(args.edits * scale):
+                call = lambda i=i: bot.edit_message_text(f"ход {i}", chat_id=chat_id, message_id=message_id)
+                if mode == "outbox":
+                    last = outbox.call(chat_id, GAME, call, key=message_id)
+                else:
+                    last = direct(call)
+                pending.append(("edit", last))
+
+            async def timed(kind, aw):
+                await aw
+                if kind == "info":
+                    stats["info"].append(time.perf_counter() - t0)
+                return time.perf_counter() - t0
+
+            results = await asyncio.gather(*(timed(kind, aw) for kind, aw in pending), return_exceptions=True)
+            stats["game"].append(results[-1])
+
+        await asyncio.gather(*(chat(chat_id) for chat_id in chats))
+        elapsed = time.perf_counter() - t0
+        if mode == "outbox":
+            await outbox.stop()
+    await api.stop()
+    return {
+        "flooded": sum(api.flooded.values()),
+        "lost": stats["lost"],
+        "requests": api.calls["sendMessage"] + api.calls["editMessageText"],
+        "game": stats["game"],
+        "info": stats["info"],
+        "elapsed": elapsed,
+        "superseded": outbox.superseded,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--info", type=int, default=6)
+    parser.add_argument("--edits", type=int, default=6)
+    parser.add_argument("--chat-limit", type=int, default=5)
+    parser.add_argument("--global-limit", type=int, default=100)
+    parser.add_argument("--window", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(
+        f"чатов: {args.chats}, на чат: {args.info} ответов + {args.edits} правок стола; "
+        f"лимит {args.chat_limit} на чат и {args.global_limit} на бота за {args.window:g} с"
+    )
+    for mode in ("direct", "outbox"):
+        r = asyncio.run(run(args, mode))
+        print(
+            f"{mode:>7}: 429 {r['flooded']:>4} | потеряно {r['lost']:>4} | запросов {r['requests']:>4} "
+            f"(заменено правок {r['superseded']}) | стол p50/p99 {percentile(r['game'], 0.5):.2f}/"
+            f"{percentile(r['game'], 0.99):.2f} с | ответы p50/p99 {percentile(r['info'], 0.5):.2f}/"
+            f"{percentile(r['info'], 0.99):.2f} с | всего {r['elapsed']:.2f} с"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Профили игроков по всем чатам (/me): индекс по user_id против обхода
+# чатов.
+#
+# --chats чатов на SQLite (Storage во временном файле) играют по --rounds
+# раздач; за каждым столом двое из --users игроков, так что у игрока
+# несколько чатов. Дальше проверяется, что индекс совпадает с таблицами
+# чатов – и с записями в памяти (profiles.aggregate), и с базой после
+# сброса (Storage.load_profiles), и после перезапуска движка, где профили
+# поднимаются из базы по одному. Меряется:
+#
+#   /me          – среднее время команды на индексе;
+#   обход памяти – то же по stats/balances всех чатов в памяти;
+#   из базы      – подъём одного профиля (Storage.load_profile, по user_id);
+#   пересборка   – один проход load_profiles по всей базе.
+#
+#   python bench/bench_profiles.py --chats 2000 --users 1000
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.loadtest import FakeBot, FakeReply, button
+from engine import START_BALANCE, Engine
+from profiles import aggregate, chat_records
+from storage import Storage
+
+async def play(engine, r, chat_id, users, rounds):
+    await engine.command("newgame", r, chat_id, *users[0])
+    for uid, name in users:
+        await engine.command("join", r, chat_id, uid, name)
+    for rnd in range(rounds):
+        if rnd:
+            await engine.command("rematch", r, chat_id, *users[0])
+        for uid, name in users:
+            await engine.command("bet", r, chat_id, uid, name, ["10"])
+        await engine.command("startgame", r, chat_id, *users[0])
+        game = engine.games[chat_id]
+        while game.started:
+            uid = game.order[game.turn]
+            p = game.players[uid]
+            await engine.press(r, chat_id, uid, p.name, button(game, "hit" if p.hand.score < 17 else "stand"))
+
+def scan(engine, user_id):
+    """Итог игрока обходом всех чатов в памяти – как без индекса."""
+    totals = [0, 0, 0, 0, 0]
+    for chat in dict.values(engine.stats):
+        s = chat.get(user_id)
+        if s is not None:
+            totals[0] += s.wins
+            totals[1] += s.losses
+            totals[2] += s.draws
+            totals[3] += s.busts
+    for chat in dict.values(engine.balances):
+        b = chat.get(user_id)
+        if b is not None:
+            totals[4] += b.balance - START_BALANCE
+    return totals
+
+def normalized(rows):
+    return sorted((uid, sorted(chats), tuple(totals)) for uid, _, chats, *totals in rows)
+
+def timed(fn, items):
+    t = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - t) / len(items)
+
+async def run(args, path):
+    rng = random.Random(1)
+    db = Storage(path)
+    engine = Engine(db, FakeBot(), table_delay=0, shoe_seed=1)
+    await engine.start()
+    r = FakeReply(engine.bot)
+    await asyncio.gather(*(
+        play(engine, r, -1 - i, [(uid, f"P{uid}") for uid in rng.sample(range(1, args.users + 1), 2)], args.rounds)
+        for i in range(args.chats)
+    ))
+    await engine.stop()
+    db.flush_sync()
+
+    index = normalized(engine.profiles.rows())
+    in_memory = aggregate(chat_records(engine.stats, engine.balances), START_BALANCE)
+    assert index == normalized(in_memory), "индекс разошёлся с чатами в памяти"
+    assert index == normalized(db.load_profiles(START_BALANCE)), "индекс разошёлся с базой"
+
+    users = list(engine.profiles.users)
+    t = time.perf_counter()
+    for uid in users:
+        await engine.command("me", r, -1, uid, f"P{uid}")
+    me = (time.perf_counter() - t) / len(users)
+    walk = timed(lambda uid: scan(engine, uid), users)
+    load = timed(lambda uid: db.load_profile(uid, START_BALANCE), users)
+    t = time.perf_counter()
+    db.load_profiles(START_BALANCE)
+    rebuild = time.perf_counter() - t
+    db.close()
+
+    # перезапуск: профили поднимаются из базы по одному и совпадают с прежними
+    db = Storage(path)
+    restarted = Engine(db, FakeBot(), table_delay=0)
+    await restarted.start()
+    rows = [restarted.profiles.get(uid).row(uid) for uid in users]
+    assert normalized(rows) == index, "после перезапуска индекс другой"
+    await restarted.stop()
+    db.close()
+    return len(users), me, walk, load, rebuild
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        users, me, walk, load, rebuild = asyncio.run(run(args, os.path.join(tmp, "bench.db")))
+    print(f"чатов: {args.chats}, игроков: {users}, раздач на чат: {args.rounds}; индекс совпал с чатами и базой")
+    print(f"/me по индексу: {me * 1e6:.1f} мкс")
+    print(f"обход чатов в памяти: {walk * 1e6:.1f} мкс ({walk / me:.0f}×)")
+    print(f"подъём профиля из базы: {load * 1e6:.1f} мкс")
+    print(f"пересборка одним проходом: {rebuild * 1e3:.1f} мс")
+
+if __name__ == "__main__":
+    main()
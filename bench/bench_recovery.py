@@ -0,0 +1,97 @@
+# Время старта на журнале событий в зависимости от длины истории.
+#
+# Для каждого размера истории движок с EventStore играет столько игр
+# (bench/loadtest.py: /newgame, /join, /bet, /startgame, Hit/Stand,
+# /rematch), снимок пишется раз в --snapshot-every событий, а в конце
+# процесс «падает» – журнал закрывается без финального снимка. Затем
+# замеряется:
+#
+#   старт     – EventStore + Engine.start(): mmap снимка и повтор хвоста;
+#   с нуля    – повтор всего журнала без снимка (так стартовал бы бот,
+#               если бы снимков не было).
+#
+# Старт должен оставаться плоским: хвост не длиннее --snapshot-every.
+#
+#   python bench/bench_recovery.py --games 2000,10000,50000
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.loadtest import FakeBot, FakeReply, play_chat
+from engine import Engine
+from eventlog import EventStore, read_events
+from storage import NullStorage
+
+ROUNDS = 5
+
+def crash(db):
+    """Закрыть файлы хранилища без финального снимка, как при падении."""
+    db.log.close()
+    if db.snap is not None:
+        db.snap.close()
+
+async def build_history(log_path, snap_path, games, snapshot_every, batch=200):
+    db = EventStore(log_path, snap_path, snapshot_every=snapshot_every)
+    bot = FakeBot()
+    engine = Engine(db, bot, table_delay=0, log=db.log)
+    await engine.start()
+    r = FakeReply(bot)
+    chats = games // ROUNDS
+    for first in range(0, chats, batch):
+        await asyncio.gather(
+            *(play_chat(engine, r, -1000 - i, ROUNDS, []) for i in range(first, min(chats, first + batch)))
+        )
+        if db.log.appended - db._snapshot_at >= snapshot_every:
+            db.snapshot()
+    # недоигранные раздачи в хвосте после последнего снимка
+    for i in range(10):
+        await engine.command("newgame", r, i + 1, 1, "A")
+        await engine.command("join", r, i + 1, 1, "A")
+        await engine.command("join", r, i + 1, 2, "B")
+        await engine.command("startgame", r, i + 1, 1, "A")
+    await engine.stop()
+    crash(db)
+    return db.log.offset
+
+async def recover(log_path, snap_path):
+    t = time.perf_counter()
+    db = EventStore(log_path, snap_path)
+    engine = Engine(db, FakeBot(), table_delay=0, log=db.log)
+    replayed = db.recover(engine)
+    elapsed = time.perf_counter() - t
+    crash(db)
+    return elapsed, replayed
+
+def replay_all(log_path):
+    t = time.perf_counter()
+    engine = Engine(NullStorage(), FakeBot(), table_delay=0)
+    count = engine.replay(read_events(log_path))
+    return time.perf_counter() - t, count
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", default="2000,10000,50000")
+    parser.add_argument("--snapshot-every", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"снимок раз в {args.snapshot_every} событий")
+    with tempfile.TemporaryDirectory() as tmp:
+        for games in (int(x) for x in args.games.split(",")):
+            log_path = os.path.join(tmp, f"{games}.events")
+            snap_path = os.path.join(tmp, f"{games}.snapshot")
+            size = asyncio.run(build_history(log_path, snap_path, games, args.snapshot_every))
+            start, tail = asyncio.run(recover(log_path, snap_path))
+            full, events = replay_all(log_path)
+            print(
+                f"игр {games:>6}: журнал {size / 2**20:5.1f} МиБ, {events} событий | "
+                f"старт {start * 1000:6.1f} мс (хвост {tail}) | с нуля {full * 1000:7.1f} мс"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Рендер стола: строки игроков каждый раз с нуля против кэша по игроку
+# (Engine.player_line, сбрасывается ходом).
+#
+# Сценарий похож на живую раздачу: на каждый ход меняется рука одного
+# игрока, а между ходами идут /status и повторные показы стола.
+#
+#   python bench/bench_render.py
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import DECK_SIZE, Hand
+from engine import Engine
+from records import Game, Player
+from shoe import Shoe
+
+# ===== БЕЗ КЭША (как было) =====
+
+def legacy_format_game_state(game):
+    lines = []
+    for uid in game.order:
+        p = game.players[uid]
+        s = p.hand.score
+        status = ""
+        if p.busted:
+            status = " (перебор 💥)"
+        elif p.stand:
+            status = " (стоит)"
+        bet_info = f", ставка: {p.bet}" if p.bet else ""
+        cards_str = str(p.hand) if p.hand else "—"
+        lines.append(f"{p.name}: {cards_str} = {s}{status}{bet_info}")
+    return "\n".join(lines)
+
+# ===== ЗАМЕРЫ =====
+
+def make_game(rng):
+    game = Game(Shoe(6, seed=1))
+    for uid in (1, 2):
+        game.players[uid] = Player(f"Игрок {uid}", Hand([rng.randrange(DECK_SIZE) for _ in range(2)]), bet=50)
+        game.order.append(uid)
+    return game
+
+def scenario(render, game, rng, renders_per_change):
+    # ход: одна карта одному игроку, затем несколько показов
+    p = game.players[rng.choice((1, 2))]
+    if p.hand.score >= 21:
+        p.hand = Hand([rng.randrange(DECK_SIZE) for _ in range(2)])
+    else:
+        p.hand.add(rng.randrange(DECK_SIZE))
+    p.line = None
+    for _ in range(renders_per_change):
+        render(game)
+
+def main():
+    number = 20000
+    # цена самого хода (карта в руку) – вычитается из замеров
+    rng = random.Random(1)
+    game = make_game(rng)
+    change = timeit.timeit(lambda: scenario(lambda g: None, game, rng, 1), number=number)
+    for renders in (1, 4):
+        results = {}
+        for label, render in (("без кэша", legacy_format_game_state), ("кэш", Engine.format_game_state)):
+            rng = random.Random(1)
+            game = make_game(rng)
+            t = timeit.timeit(lambda: scenario(render, game, rng, renders), number=number) - change
+            results[label] = t
+            print(f"показов на ход {renders}, {label:>9}: {t / (number * renders) * 1e6:6.2f} мкс на показ")
+        print(f"  ускорение: x{results['без кэша'] / results['кэш']:.1f}")
+
+if __name__ == "__main__":
+    main()
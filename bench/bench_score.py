@@ -0,0 +1,83 @@
+# Микро-бенчмарк подсчёта очков: старый score() по Unicode-строкам
+# (cards.index на каждую карту) против Hand с таблицами и накопленной суммой.
+#
+#   python bench/bench_score.py
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import DECK_SIZE, GLYPHS, Hand
+
+# ===== СТАРАЯ РЕАЛИЗАЦИЯ (как была в main.py) =====
+
+legacy_cards = list(GLYPHS)
+
+def legacy_card_value(card: str) -> int:
+    idx = legacy_cards.index(card) % 13 + 1
+    if idx == 1:
+        return 11
+    if idx > 10:
+        return 10
+    return idx
+
+def legacy_score(hand):
+    total = sum(legacy_card_value(c) for c in hand)
+    aces = sum(1 for c in hand if legacy_card_value(c) == 11)
+    while total > 21 and aces > 0:
+        total -= 10
+        aces -= 1
+    return total
+
+# ===== ЗАМЕРЫ =====
+
+def make_hands(n, size, rng):
+    return [[rng.randrange(DECK_SIZE) for _ in range(size)] for _ in range(n)]
+
+def bench(label, fn, number, hands):
+    per_hand = min(timeit.repeat(fn, number=number, repeat=5)) / number / hands
+    print(f"{label:<40} {per_hand * 1e6:8.2f} мкс/раздача")
+    return per_hand
+
+def main():
+    rng = random.Random(1)
+    hands = make_hands(1000, 5, rng)
+    glyph_hands = [[GLYPHS[c] for c in h] for h in hands]
+
+    # проверка: обе реализации считают одинаково на каждом префиксе
+    for ints, strs in zip(hands, glyph_hands):
+        h = Hand()
+        for i, c in enumerate(ints, start=1):
+            h.add(c)
+            assert h.score == legacy_score(strs[:i])
+
+    # Типичная раздача: 2 карты, 3 добора, после каждого действия счёт
+    # перечитывается (format_game_state, on_button, finish_game).
+    def legacy_hand():
+        for h in glyph_hands:
+            cur = h[:2]
+            legacy_score(cur)
+            for c in h[2:]:
+                cur.append(c)
+                legacy_score(cur)
+                legacy_score(cur)
+
+    def new_hand():
+        for h in hands:
+            cur = Hand(h[:2])
+            cur.score
+            for c in h[2:]:
+                cur.add(c)
+                cur.score
+                cur.score
+
+    n = 20
+    old = bench("score() по строкам (старый)", legacy_hand, n, len(hands))
+    new = bench("Hand с таблицами (новый)", new_hand, n, len(hands))
+    print(f"ускорение: x{old / new:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Масштабирование шардированного режима: пропускная способность бота
+# (main.py в режиме вебхука) в зависимости от числа процессов-воркеров.
+#
+# Для каждого SHARDS из списка поднимается фейковый Bot API, бот
+# запускается отдельным процессом, все чаты заводят игру (/newgame, два
+# /join, /startgame – не в зачёт), а затем замеряется, за сколько бот
+# ответит на --per-chat команд /status в каждом чате. SHARDS=1 – обычный
+# однопроцессный режим без фронта.
+#
+#   python bench/bench_shards.py --shards 1,2,4 --chats 500 --per-chat 20
+#
+# Масштабирование упирается в число ядер: на одноядерной машине
+# воркеры только делят одно ядро.
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.bench_ingress import SECRET, WebhookClient
+from bench.fake_api import FakeBotAPI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def command(chat_id, user_id, text, seq):
+    cmd = text.split()[0]
+    return {
+        "update_id": seq,
+        "message": {
+            "message_id": seq,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "group", "title": "bench"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"P{user_id}"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(cmd)}],
+        },
+    }
+
+async def wait_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"бот не открыл порт {port}")
+
+async def wait_sent(api, count, timeout=300.0):
+    deadline = time.monotonic() + timeout
+    while api.calls["sendMessage"] < count:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"ответов {api.calls['sendMessage']} из {count}")
+        await asyncio.sleep(0.005)
+
+async def run(shards, args, tmp):
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    port = free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN="1:bench",
+        BOT_API_URL=api.url,
+        BOT_MODE="webhook",
+        WEBHOOK_PORT=str(port),
+        WEBHOOK_SECRET=SECRET,
+        SHARDS=str(shards),
+        DB_PATH=os.path.join(tmp, f"bench-{shards}.db"),
+        HINT_TABLE=os.path.join(tmp, "hint_table.bin"),
+        BOT_RATE_LIMIT=str(args.rate_limit),
+        TABLE_DEBOUNCE="0.01",
+        GAME_TTL="0",
+    )
+    env.pop("METRICS_PORT", None)
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), env=env, stdout=asyncio.subprocess.DEVNULL
+    )
+    try:
+        await wait_port(port)
+        client = WebhookClient(port, "/webhook")
+        await client.start()
+        chats = [-100000 - i for i in range(args.chats)]
+        seq = 0
+
+        # подготовка по фазам: внутри чата команды должны прийти по порядку
+        phases = (("/newgame", 0, 1), ("/join", 0, 1), ("/join", 1, 2), ("/startgame", 0, 2))
+        expected = 0
+        for text, user, replies in phases:
+            for chat_id in chats:
+                seq += 1
+                client.post(command(chat_id, -chat_id * 2 + user, text, seq))
+            expected += replies * args.chats
+            await wait_sent(api, expected)
+
+        base = api.calls["sendMessage"]
+        total = args.chats * args.per_chat
+        started = time.perf_counter()
+        for _ in range(args.per_chat):
+            for chat_id in chats:
+                seq += 1
+                client.post(command(chat_id, -chat_id * 2, "/status", seq))
+        await wait_sent(api, base + total)
+        elapsed = time.perf_counter() - started
+        await client.stop()
+    finally:
+        proc.send_signal(2)
+        await proc.wait()
+        await api.stop()
+    return total, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", default="1,2,4")
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--per-chat", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка фейкового Bot API, с")
+    parser.add_argument("--rate-limit", type=float, default=0, help="BOT_RATE_LIMIT (0 – без лимита)")
+    args = parser.parse_args()
+
+    print(f"ядер: {os.cpu_count()}, чатов: {args.chats}, команд на чат: {args.per_chat}")
+    base = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in (int(x) for x in args.shards.split(",")):
+            total, elapsed = asyncio.run(run(shards, args, tmp))
+            rate = total / elapsed
+            base = base or rate
+            print(f"SHARDS={shards}: {total} апдейтов за {elapsed:.2f} с – {rate:,.0f}/с (x{rate / base:.2f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# Точный решатель для /hint: время построения таблицы, её размер,
+# время загрузки из бинарного файла и цена одного поиска.
+#
+#   python bench/bench_solver.py
+
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import Hand
+from solver import TABLE_SIZE, HintTable
+
+def main():
+    started = time.perf_counter()
+    hints = HintTable.build()
+    build = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hint_table.bin")
+        hints.save(path)
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        loaded = HintTable.load(path)
+        load = time.perf_counter() - started
+    assert loaded.table == hints.table
+
+    me, opp = Hand([9, 5]), Hand([0, 6])
+    n = 200000
+    lookup = min(timeit.repeat(lambda: hints.hint(me, opp, "to_act"), number=n, repeat=5)) / n
+
+    print(f"состояний:          {TABLE_SIZE // 2}")
+    print(f"построение:         {build * 1000:8.1f} мс")
+    print(f"память таблицы:     {hints.nbytes / 1024:8.1f} КиБ (файл {size / 1024:.1f} КиБ)")
+    print(f"загрузка из файла:  {load * 1000:8.2f} мс")
+    print(f"поиск /hint:        {lookup * 1e9:8.0f} нс")
+
+if __name__ == "__main__":
+    main()
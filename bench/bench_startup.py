@@ -0,0 +1,193 @@
+# Холодный старт: время от запуска процесса бота до первого обработанного
+# апдейта.
+#
+# Заранее пишется состояние на --chats чатов по два игрока (--users
+# игроков всего): SQLite-база или снимок журнала событий (--storage).
+# Бот (main.py) запускается отдельным процессом против фейкового Bot API
+# (bench/fake_api.py); апдейт /balance в одном из чатов уже ждёт его:
+#
+#   polling – лежит в очереди getUpdates;
+#   webhook – шлётся POST-ом на вебхук раз в 10 мс, пока его не примут
+#             (отказы соединения – апдейты, потерянные бы при деплое).
+#
+# Меряется: когда открылся порт вебхука, когда ушёл первый ответ и RSS
+# бота к этому моменту; всё – медиана по --runs запускам.
+#
+#   python bench/bench_startup.py --chats 200000 --storage events --mode webhook
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.bench_ingress import SECRET
+from bench.bench_shards import command, free_port
+from bench.fake_api import FakeBotAPI
+from engine import START_BALANCE
+from eventlog import chat_blob, profile_blob, write_snapshot
+from profiles import aggregate
+from records import Balance, StatLine
+from solver import HintTable
+from storage import Storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def state(chats, users):
+    """(chat_id, {user_id: StatLine}, {user_id: Balance}) для каждого чата."""
+    for i in range(chats):
+        chat_id = -1 - i
+        pair = ((i * 2) % users + 1, (i * 2 + 1) % users + 1)
+        stats = {uid: StatLine(f"P{uid}", i % 7, i % 5, i % 3, i % 2) for uid in pair}
+        balances = {uid: Balance(f"P{uid}", START_BALANCE + (i % 11) * 10 - 50) for uid in pair}
+        yield chat_id, stats, balances
+
+def rows(chats, users):
+    for chat_id, stats, balances in state(chats, users):
+        for uid, s in stats.items():
+            yield chat_id, uid, s.name, s.wins, s.losses, s.draws, s.busts, None
+        for uid, b in balances.items():
+            yield chat_id, uid, b.name, 0, 0, 0, 0, b.balance
+
+def write_state(args, tmp):
+    env = {"HINT_TABLE": os.path.join(tmp, "hint_table.bin")}
+    HintTable.load_or_build(env["HINT_TABLE"])
+    if args.storage == "events":
+        env.update(
+            STORAGE="events",
+            EVENT_LOG=os.path.join(tmp, "bench.events"),
+            SNAPSHOT_PATH=os.path.join(tmp, "bench.snapshot"),
+        )
+        blobs = sorted((chat_id, chat_blob(None, s, b)) for chat_id, s, b in state(args.chats, args.users))
+        profiles = aggregate(rows(args.chats, args.users), START_BALANCE)
+        leaders = sorted(((uid, name, wins) for uid, name, _, wins, *_ in profiles if wins), key=lambda r: -r[2])
+        users = sorted((row[0], profile_blob(row)) for row in profiles)
+        write_snapshot(env["SNAPSHOT_PATH"], 0, blobs, leaders, users)
+        open(env["EVENT_LOG"], "wb").close()
+    else:
+        env["DB_PATH"] = os.path.join(tmp, "bench.db")
+        db = Storage(env["DB_PATH"])
+        with db.reader as conn:
+            for chat_id, stats, balances in state(args.chats, args.users):
+                conn.executemany(
+                    "INSERT INTO stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(chat_id, uid, s.name, s.wins, s.losses, s.draws, s.busts) for uid, s in stats.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO balances VALUES (?, ?, ?, ?)",
+                    [(chat_id, uid, b.name, b.balance) for uid, b in balances.items()],
+                )
+        db.close()
+    return env
+
+async def post_until_accepted(port, body, deadline):
+    """POST апдейта на вебхук, пока не примут. (время приёма, отказов)."""
+    request = (
+        f"POST /webhook HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+    refused = 0
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            refused += 1
+            await asyncio.sleep(0.01)
+            continue
+        writer.write(request)
+        await writer.drain()
+        status = await reader.readline()
+        writer.close()
+        if b" 200 " in status:
+            return time.monotonic(), refused
+        refused += 1
+        await asyncio.sleep(0.01)
+    raise RuntimeError("вебхук не принял апдейт")
+
+def rss_mib(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+async def run(args, env):
+    api = FakeBotAPI()
+    await api.start()
+    port = free_port()
+    env = dict(
+        os.environ, **env,
+        BOT_TOKEN="1:bench",
+        BOT_API_URL=api.url,
+        BOT_MODE=args.mode,
+        WEBHOOK_PORT=str(port),
+        WEBHOOK_SECRET=SECRET,
+        GAME_TTL="0",
+    )
+    env.pop("METRICS_PORT", None)
+    update = command(-1 - args.chats // 2, (args.chats // 2 * 2) % args.users + 1, "/balance", 1)
+    if args.mode == "polling":
+        api.push_update(update)
+
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), env=env, stdout=asyncio.subprocess.DEVNULL
+    )
+    deadline = started + 120
+    accepted, refused = None, 0
+    try:
+        if args.mode == "webhook":
+            accepted, refused = await post_until_accepted(port, json.dumps(update).encode(), deadline)
+        while not api.calls["sendMessage"]:
+            if time.monotonic() > deadline:
+                raise RuntimeError("бот не ответил")
+            await asyncio.sleep(0.002)
+        first = time.monotonic()
+        rss = rss_mib(proc.pid)
+    finally:
+        proc.send_signal(2)
+        await proc.wait()
+        await api.stop()
+    return {
+        "accepted": None if accepted is None else accepted - started,
+        "refused": refused,
+        "first": first - started,
+        "rss": rss,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--storage", choices=("sqlite", "events"), default="events")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="webhook")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t = time.perf_counter()
+        env = write_state(args, tmp)
+        print(
+            f"состояние: {args.chats} чатов, {args.users} игроков ({args.storage}), "
+            f"записано за {time.perf_counter() - t:.1f} с; режим {args.mode}"
+        )
+        results = [asyncio.run(run(args, env)) for _ in range(args.runs)]
+
+    def med(key):
+        return statistics.median(r[key] for r in results)
+
+    if args.mode == "webhook":
+        print(f"апдейт принят вебхуком: {med('accepted') * 1e3:.0f} мс, до этого отказов: {med('refused'):.0f}")
+    print(f"первый ответ: {med('first') * 1e3:.0f} мс (min {min(r['first'] for r in results) * 1e3:.0f}), "
+          f"RSS {med('rss'):.0f} МиБ")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Цена хода в зависимости от размера стола (2..7 игроков, с дилером и без).
+#
+# Для каждого размера много чатов играют полные раздачи через Engine
+# (FakeBot, NullStorage) и меряется:
+#
+#   ход        – среднее время engine.press (Hit/Stand) целиком, с
+#                обновлением стола;
+#   очередь    – только выбор следующего ходящего: all_players_done и
+#                переход хода, как было (обход order по модулю с полной
+#                проверкой всех игроков) и как стало (turn += 1);
+#   сообщений  – запросов к боту (ответы, отправки и правки стола) на
+#                игрока за раздачу: стол на 7 человек – одно сообщение-стол
+#                на всех.
+#
+#   python bench/bench_table_size.py --chats 300 --rounds 5
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.loadtest import FakeBot, FakeReply, button
+from engine import MAX_PLAYERS, Engine
+from records import Game, Player
+from shoe import Shoe
+from storage import NullStorage
+
+# ===== ОЧЕРЕДЬ ХОДОВ: КАК БЫЛО =====
+
+def legacy_all_done(game):
+    for uid in game.order:
+        p = game.players[uid]
+        if not p.stand and not p.busted:
+            return False
+    return True
+
+def legacy_next(game):
+    game.players[game.order[game.turn]].stand = True
+    if legacy_all_done(game):
+        return True
+    while True:
+        game.turn = (game.turn + 1) % len(game.order)
+        p = game.players[game.order[game.turn]]
+        if not p.stand and not p.busted:
+            return False
+
+def queue_next(game):
+    game.players[game.order[game.turn]].stand = True
+    Engine._advance_turn(game)
+    return Engine.all_players_done(game)
+
+def scheduling_cost(n, step):
+    """Среднее время одного перехода хода за раздачу на n игроков, мкс."""
+    game = Game(Shoe(1, seed=1))
+    for uid in range(n):
+        game.players[uid] = Player(f"P{uid}")
+        game.order.append(uid)
+
+    def hand():
+        for p in game.players.values():
+            p.stand = False
+        game.turn = 0
+        while not step(game):
+            pass
+
+    number = 20000 // n
+    return timeit.timeit(hand, number=number) / (number * n) * 1e6
+
+# ===== ПОЛНЫЕ РАЗДАЧИ =====
+
+async def play(engine, r, chat_id, n, rounds, dealer, presses):
+    users = [(chat_id * 10 + i, f"P{chat_id}-{i}") for i in range(n)]
+    uid, name = users[0]
+    await engine.command("newgame", r, chat_id, uid, name, ["dealer"] if dealer else [])
+    for uid, name in users:
+        await engine.command("join", r, chat_id, uid, name)
+        await engine.command("bet", r, chat_id, uid, name, ["10"])
+    for rnd in range(rounds):
+        if rnd:
+            await engine.command("rematch", r, chat_id, *users[0])
+        await engine.command("startgame", r, chat_id, *users[0])
+        game = engine.games[chat_id]
+        while game.started:
+            uid = game.order[game.turn]
+            p = game.players[uid]
+            t = time.perf_counter()
+            await engine.press(r, chat_id, uid, p.name, button(game, "hit" if p.hand.score < 17 else "stand"))
+            presses.append(time.perf_counter() - t)
+            # debounce стола: даём рендеру отработать, как между нажатиями живых игроков
+            await asyncio.sleep(0)
+
+async def run(n, dealer, args):
+    bot = FakeBot()
+    engine = Engine(NullStorage(), bot, table_delay=0, shoe_seed=1)
+    await engine.start()
+    r = FakeReply(bot)
+    presses = []
+    await asyncio.gather(*(play(engine, r, -1 - i, n, args.rounds, dealer, presses) for i in range(args.chats)))
+    await engine.stop()
+    hands = args.chats * args.rounds
+    # без подготовки стола: /newgame, /join и /bet
+    setup = args.chats * (1 + 2 * n)
+    per_player = (sum(bot.calls.values()) - setup) / (hands * n)
+    return sum(presses) / len(presses) * 1e6, per_player
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"чатов: {args.chats}, раундов: {args.rounds}")
+    print(" игроков | дилер | ход, мкс | очередь было/стало, мкс | сообщений на игрока за раздачу")
+    for dealer in (False, True):
+        for n in range(1 if dealer else 2, MAX_PLAYERS + 1):
+            press, per_player = asyncio.run(run(n, dealer, args))
+            legacy = scheduling_cost(n, legacy_next)
+            queue = scheduling_cost(n, queue_next)
+            print(
+                f" {n:>7} | {'да' if dealer else 'нет':>5} | {press:8.1f} | "
+                f"{legacy:8.2f} / {queue:5.2f}          | {per_player:5.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
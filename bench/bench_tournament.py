@@ -0,0 +1,85 @@
+# Турнир на выбывание на --players участников в одном чате (FakeBot).
+#
+# Регистрация через /tournament join, дальше драйвер жмёт Hit/Stand за
+# текущего игрока каждого играющего стола (Hit до 17), пока не останется
+# победитель. Меряется:
+#
+#   время      – от /tournament start до победителя, без лимитов Telegram
+#                (FakeBot без очереди исходящих);
+#   раздач     – сыграно раздач, с переигровками ничьих;
+#   запросов   – отправок и правок сообщений турнира;
+#   память     – пик tracemalloc за турнир и пиковый RSS процесса;
+#   по лимитам – сколько шёл бы тот же турнир, если каждое сообщение ждёт
+#                20 в минуту на группу и 20 в секунду на бота.
+#
+#   python bench/bench_tournament.py --players 1024 --tables 32
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.loadtest import FakeBot, FakeReply
+from engine import Engine
+from storage import NullStorage
+from tournament import TournamentScheduler, turn_buttons
+
+CHAT = -100
+
+async def run(args):
+    bot = FakeBot()
+    scheduler = TournamentScheduler(max_tables=args.tables)
+    engine = Engine(NullStorage(), bot, table_delay=0, shoe_seed=1, tournament_scheduler=scheduler)
+    await engine.start()
+    r = FakeReply(bot)
+    manager = engine.tournaments
+
+    await engine.command("tournament", r, CHAT, 1, "P1")
+    for uid in range(1, args.players + 1):
+        await engine.command("tournament", r, CHAT, uid, f"P{uid}", ["join"])
+    t = manager.by_chat[CHAT]
+    before = sum(bot.calls.values())
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await engine.command("tournament", r, CHAT, 1, "P1", ["start"])
+    peak_tables = 0
+    while CHAT in manager.by_chat:
+        peak_tables = max(peak_tables, len(t.tables))
+        for no, game in list(t.tables.items()):
+            uid = game.order[game.turn]
+            p = game.players[uid]
+            hit, stand = turn_buttons(no, game)[0]
+            await engine.press(r, CHAT, uid, p.name, (hit if p.hand.score < 17 else stand)[1])
+        await asyncio.sleep(0)
+    await engine.stop()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ответы на нажатия (answerCallbackQuery) у Telegram не лимитируются
+    messages = sum(bot.calls.values()) - bot.calls.get("answer", 0) - before
+    return t, elapsed, messages, peak, peak_tables
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=1024)
+    parser.add_argument("--tables", type=int, default=32)
+    args = parser.parse_args()
+
+    t, elapsed, messages, peak, peak_tables = asyncio.run(run(args))
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"участников: {args.players}, столов одновременно: до {args.tables} (было {peak_tables})")
+    print(f"раундов: {t.round}, раздач: {t.hands}, запросов к боту: {messages}")
+    print(f"время: {elapsed:.2f} с, {elapsed / t.hands * 1e3:.2f} мс на раздачу")
+    print(f"память: пик tracemalloc {peak / 2**20:.1f} МиБ, RSS {rss:.0f} МиБ")
+    limited = max(messages / (20 / 60), messages / 20)
+    print(f"по лимитам Telegram (20/мин на группу): ≈ {limited / 60:.0f} мин на отправку сообщений")
+
+if __name__ == "__main__":
+    main()
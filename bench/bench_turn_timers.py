@@ -0,0 +1,114 @@
+# Накладные расходы сроков на ход при большом числе активных столов.
+#
+# --tables столов, у каждого свой срок; каждое «действие» переносит срок
+# одного случайного стола на turn_timeout вперёд. Сравниваются:
+#
+#   колесо     – timers.TimingWheel: перенос O(1), один обход на тик;
+#   call_later – таймер asyncio на каждую игру: cancel() + call_later()
+#                на каждое действие (так выглядела бы «задача на игру»);
+#   куча       – heapq с новой записью на каждое действие и ленивым
+#                удалением старых при обходе.
+#
+# Меряется цена переноса (мкс на действие, под tracemalloc – сравнивать
+# между собой), средняя цена обхода за тик, пока истекают все сроки, и
+# память под сроки после всех действий.
+#
+#   python bench/bench_turn_timers.py --tables 10000,50000
+
+import argparse
+import asyncio
+import heapq
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timers import TimingWheel
+
+TIMEOUT = 60.0
+ACTIONS = 200000
+SWEEP = 90
+
+def bench_wheel(n, keys):
+    tracemalloc.start()
+    wheel = TimingWheel(1.0, now=0.0)
+    for k in range(n):
+        wheel.schedule(k, TIMEOUT + k % 60)
+    t = time.perf_counter()
+    now = 0.0
+    for i, k in enumerate(keys):
+        now = i * 1e-4
+        wheel.schedule(k, now + TIMEOUT)
+    move = time.perf_counter() - t
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t = time.perf_counter()
+    for step in range(1, SWEEP + 1):
+        wheel.advance(now + step)
+    sweep = (time.perf_counter() - t) / SWEEP
+    return move, sweep, memory
+
+def bench_call_later(n, keys):
+    loop = asyncio.new_event_loop()
+    callback = lambda: None
+    tracemalloc.start()
+    handles = [loop.call_later(TIMEOUT + k % 60, callback) for k in range(n)]
+    t = time.perf_counter()
+    for k in keys:
+        handles[k].cancel()
+        handles[k] = loop.call_later(TIMEOUT, callback)
+    move = time.perf_counter() - t
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for h in handles:
+        h.cancel()
+    loop.close()
+    return move, None, memory
+
+def bench_heap(n, keys):
+    tracemalloc.start()
+    heap = [(TIMEOUT + k % 60, k) for k in range(n)]
+    heapq.heapify(heap)
+    deadlines = dict((k, d) for d, k in heap)
+    t = time.perf_counter()
+    now = 0.0
+    for i, k in enumerate(keys):
+        now = i * 1e-4
+        deadlines[k] = now + TIMEOUT
+        heapq.heappush(heap, (now + TIMEOUT, k))
+    move = time.perf_counter() - t
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t = time.perf_counter()
+    for step in range(1, SWEEP + 1):
+        limit = now + step
+        while heap and heap[0][0] <= limit:
+            d, k = heapq.heappop(heap)
+            if deadlines.get(k) == d:
+                del deadlines[k]
+    sweep = (time.perf_counter() - t) / SWEEP
+    return move, sweep, memory
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", default="10000,50000")
+    args = parser.parse_args()
+
+    print(f"действий: {ACTIONS}, срок на ход {TIMEOUT:g} с")
+    print(" столов  | способ     | перенос, мкс | обход тика, мс | память, МиБ")
+    for n in (int(x) for x in args.tables.split(",")):
+        rng = random.Random(n)
+        keys = [rng.randrange(n) for _ in range(ACTIONS)]
+        for label, fn in (("колесо", bench_wheel), ("call_later", bench_call_later), ("куча", bench_heap)):
+            move, sweep, memory = fn(n, keys)
+            sweep_text = "—" if sweep is None else f"{sweep * 1e3:.2f}"
+            print(
+                f" {n:>7} | {label:<10} | {move / ACTIONS * 1e6:12.3f} | {sweep_text:>14} | "
+                f"{memory / 2**20:.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# Локальный фейковый Bot API для офлайн-тестов и бенчмарков.
+#
+# Понимает ровно то, что нужно боту: getMe, getUpdates (long polling из
+# внутренней очереди), setWebhook/deleteWebhook, sendMessage,
+# editMessageText, answerCallbackQuery. Все вызовы записываются в calls.
+# Бот подключается через BOT_API_URL=http://127.0.0.1:<port>.
+#
+# С chat_limit/global_limit = (сообщений, окно в секундах) API ведёт себя
+# как flood control Telegram: sendMessage и editMessageText сверх лимита
+# в скользящем окне получают 429 с retry_after (число отказов – в flooded).
+#
+#   python bench/fake_api.py --port 8081
+#   python bench/fake_api.py --chat-limit 20/60 --global-limit 30/1
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from urllib.parse import parse_qsl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook import read_request, write_response
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Blackjack", "username": "blackjack_bot"}
+
+# методы, на которые действует flood control
+LIMITED = frozenset({"sendMessage", "editMessageText"})
+
+def _params(headers, body):
+    if not body:
+        return {}
+    if headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body)
+    params = {}
+    for key, value in parse_qsl(body.decode()):
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+class FakeBotAPI:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, chat_limit=None, global_limit=None):
+        self.host = host
+        self.port = port
+        self.latency = latency      # искусственная задержка каждого ответа
+        self.chat_limit = chat_limit        # (сообщений, окно) на чат или None
+        self.global_limit = global_limit    # (сообщений, окно) на бота или None
+        self._chat_windows = defaultdict(deque)
+        self._global_window = deque()
+        self.flooded = Counter()    # chat_id -> сколько раз ответили 429
+        self.calls = Counter()      # method -> сколько раз вызван
+        self.sent = []              # (method, params)
+        self._updates = []
+        self._next_update_id = 1
+        self._new_update = asyncio.Event()
+        self._message_id = 0
+        self._server = None
+        self._writers = set()
+        self._closing = False
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._closing = True
+        self._new_update.set()     # отпускаем висящие getUpdates
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    def push_update(self, update: dict) -> int:
+        """Поставить апдейт в очередь getUpdates; update_id назначается здесь."""
+        update = dict(update, update_id=self._next_update_id)
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._new_update.set()
+        return update["update_id"]
+
+    async def _serve(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while not self._closing:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                _, path, headers, body = request
+                method = path.rstrip("/").rsplit("/", 1)[-1]
+                params = _params(headers, body)
+                retry_after = self.flood(method, params)
+                if retry_after:
+                    payload = {
+                        "ok": False, "error_code": 429,
+                        "description": f"Too Many Requests: retry after {retry_after}",
+                        "parameters": {"retry_after": retry_after},
+                    }
+                    write_response(writer, 429, json.dumps(payload).encode())
+                else:
+                    result = await self.call(method, params)
+                    write_response(writer, 200, json.dumps({"ok": True, "result": result}).encode())
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def flood(self, method, params):
+        """0 – запрос проходит, иначе через сколько секунд повторить (429)."""
+        if method not in LIMITED or "chat_id" not in params:
+            return 0
+        now = time.monotonic()
+        windows = []
+        if self.chat_limit:
+            windows.append((self._chat_windows[params["chat_id"]], self.chat_limit))
+        if self.global_limit:
+            windows.append((self._global_window, self.global_limit))
+        for window, (limit, period) in windows:
+            while window and window[0] <= now - period:
+                window.popleft()
+            if len(window) >= limit:
+                self.calls[method] += 1
+                self.flooded[params["chat_id"]] += 1
+                return max(1, math.ceil(window[0] + period - now))
+        for window, _ in windows:
+            window.append(now)
+        return 0
+
+    async def call(self, method, params):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            self.sent.append((method, params))
+            return True
+        return await handler(params)
+
+    async def api_getMe(self, params):
+        return BOT_USER
+
+    async def api_getUpdates(self, params):
+        offset = params.get("offset") or 0
+        if offset:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and not self._closing:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), params.get("timeout") or 0)
+            except asyncio.TimeoutError:
+                pass
+        limit = params.get("limit") or 100
+        return self._updates[:limit]
+
+    def _message(self, params, message_id=None):
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": params["chat_id"], "type": "group", "title": "fake"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def api_sendMessage(self, params):
+        self.sent.append(("sendMessage", params))
+        return self._message(params)
+
+    async def api_editMessageText(self, params):
+        self.sent.append(("editMessageText", params))
+        if "chat_id" not in params:
+            return True
+        return self._message(params, params.get("message_id"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Фейковый Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--chat-limit", help="сообщений/секунд на чат, например 20/60")
+    parser.add_argument("--global-limit", help="сообщений/секунд на бота, например 30/1")
+    args = parser.parse_args()
+
+    def limit(text):
+        if not text:
+            return None
+        count, period = text.split("/")
+        return int(count), float(period)
+
+    async def run():
+        api = FakeBotAPI(args.host, args.port, args.latency, limit(args.chat_limit), limit(args.global_limit))
+        await api.start()
+        print(f"Фейковый Bot API: {api.url}")
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
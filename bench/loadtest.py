@@ -0,0 +1,150 @@
+# Нагрузочный прогон движка без Telegram и без сети.
+#
+# Engine подключается к FakeBot в памяти (send/edit только считаются, по
+# желанию с задержкой) и к NullStorage. Тысячи чатов параллельно играют
+# полные раздачи: /newgame, два /join, /bet, /startgame, Hit до 17 и Stand,
+# потом /rematch на следующий раунд. Меряется время каждого вызова
+# обработчика, число игр в секунду и пиковая память.
+#
+#   python bench/loadtest.py --chats 5000 --rounds 3
+#   python bench/loadtest.py --chats 1000 --latency 0.02 --tracemalloc
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import Engine
+from storage import NullStorage
+
+class FakeBot:
+    """Исходящая сторона: считает запросы, ничего не отправляет."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._next_id = 0
+
+    async def _wait(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send(self, chat_id, text, buttons=None):
+        self.calls["send"] += 1
+        await self._wait()
+        self._next_id += 1
+        return self._next_id
+
+    async def edit(self, chat_id, message_id, text, buttons=None):
+        self.calls["edit"] += 1
+        await self._wait()
+        return True
+
+class FakeReply:
+    __slots__ = ("bot",)
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def reply(self, text):
+        self.bot.calls["reply"] += 1
+        await self.bot._wait()
+
+    async def answer(self, text=None, alert=False):
+        self.bot.calls["answer"] += 1
+        await self.bot._wait()
+
+    async def edit(self, text):
+        self.bot.calls["edit"] += 1
+        await self.bot._wait()
+
+def button(game, action):
+    """callback_data кнопки текущего стола – то, что прислал бы Telegram."""
+    hit, stand = Engine.turn_buttons(game)[0]
+    return (hit if action == "hit" else stand)[1]
+
+async def play_chat(engine, r, chat_id, rounds, latencies):
+    players = ((chat_id * 2, f"P{chat_id}a"), (chat_id * 2 + 1, f"P{chat_id}b"))
+    clock = time.perf_counter
+
+    async def command(name, user_id, user_name, *args):
+        t = clock()
+        await engine.command(name, r, chat_id, user_id, user_name, args)
+        latencies.append(clock() - t)
+
+    async def press(user_id, user_name, data):
+        t = clock()
+        await engine.press(r, chat_id, user_id, user_name, data)
+        latencies.append(clock() - t)
+
+    uid, name = players[0]
+    await command("newgame", uid, name)
+    for uid, name in players:
+        await command("join", uid, name)
+        await command("bet", uid, name, "10")
+
+    for rnd in range(rounds):
+        if rnd:
+            await command("rematch", *players[0])
+        await command("startgame", *players[0])
+        game = engine.games[chat_id]
+        while game.started:
+            uid = game.order[game.turn]
+            p = game.players[uid]
+            await press(uid, p.name, button(game, "hit" if p.hand.score < 17 else "stand"))
+    return rounds
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+async def run(args):
+    bot = FakeBot(args.latency)
+    engine = Engine(NullStorage(), bot, table_delay=args.table_delay, shoe_seed=args.seed)
+    await engine.start()
+    r = FakeReply(bot)
+    latencies = []
+
+    t0 = time.perf_counter()
+    done = await asyncio.gather(
+        *(play_chat(engine, r, -1000 - i, args.rounds, latencies) for i in range(args.chats))
+    )
+    elapsed = time.perf_counter() - t0
+    await engine.stop()
+
+    games = sum(done)
+    latencies.sort()
+    print(f"чатов: {args.chats}, раундов: {args.rounds}, задержка бота: {args.latency * 1000:.0f} мс")
+    print(f"игр: {games} за {elapsed:.2f} с – {games / elapsed:,.0f} игр/с")
+    print(
+        f"обработчик: p50 {percentile(latencies, 0.5) * 1e6:.0f} мкс, "
+        f"p99 {percentile(latencies, 0.99) * 1e6:.0f} мкс, вызовов {len(latencies)}"
+    )
+    print("запросы к боту: " + ", ".join(f"{k}={v}" for k, v in sorted(bot.calls.items())))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка фейкового бота, с")
+    parser.add_argument("--table-delay", type=float, default=0.0, help="debounce стола, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="пик памяти Python-объектов (медленнее)")
+    args = parser.parse_args()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    asyncio.run(run(args))
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"пик tracemalloc: {peak / 2**20:.1f} МиБ")
+    # ru_maxrss в Linux – в КиБ
+    print(f"пик RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} МиБ")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Офлайн-повтор журнала событий (eventlog.py) через движок.
+#
+# Журнал прогоняется через те же переходы Engine.apply_*, что и в боте, но
+# с NullStorage и фейковым ботом: без сети и без диска. По умолчанию – на
+# полной скорости (сколько событий в секунду движок успевает применить),
+# с --speed N – в темпе записи, ускоренном в N раз (форма реального
+# трафика для нагрузки). В конце печатается сводка состояния и её хеш:
+# два прогона одного журнала должны дать один и тот же хеш.
+#
+#   python bench/replay.py blackjack.events
+#   python bench/replay.py blackjack.events --speed 60 --chat -100123
+#   python bench/replay.py blackjack.events --from-snapshot blackjack.snapshot
+
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.loadtest import FakeBot
+from engine import Engine
+from eventlog import KIND_NAMES, NAME, EventStore, read_events
+from storage import NullStorage
+
+def state_digest(engine):
+    """Хеш балансов, статистики и столов в памяти – для сравнения прогонов."""
+    h = hashlib.sha256()
+    for chat_id in sorted(dict.keys(engine.balances)):
+        for uid, rec in sorted(dict.__getitem__(engine.balances, chat_id).items()):
+            h.update(f"b{chat_id}:{uid}:{rec.name}:{rec.balance};".encode())
+    for chat_id in sorted(dict.keys(engine.stats)):
+        for uid, rec in sorted(dict.__getitem__(engine.stats, chat_id).items()):
+            h.update(f"s{chat_id}:{uid}:{rec.wins}:{rec.losses}:{rec.draws}:{rec.busts};".encode())
+    for chat_id in sorted(dict.keys(engine.games)):
+        game = dict.__getitem__(engine.games, chat_id)
+        hands = ",".join(f"{uid}={list(game.players[uid].hand)}" for uid in game.order)
+        h.update(f"g{chat_id}:{game.started}:{game.finished}:{game.turn}:{hands};".encode())
+    return h.hexdigest()[:16]
+
+async def paced(events, speed):
+    """События в темпе записи, ускоренном в speed раз."""
+    first = None
+    started = time.perf_counter()
+    for event in events:
+        ts = event[2]
+        if first is None:
+            first = ts
+        delay = (ts - first) / speed - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield event
+
+async def run(args):
+    start = 0
+    if args.from_snapshot:
+        # как при старте бота: снимок плюс хвост журнала после него
+        db = EventStore(args.log, args.from_snapshot)
+        db.log.close()
+        start = 0 if db.snap is None else db.snap.log_offset
+    else:
+        db = NullStorage()
+    engine = Engine(db, FakeBot(), table_delay=0)
+
+    kinds = Counter()
+    chats = set(args.chat)
+
+    def counted(events):
+        for event in events:
+            kinds[event[1]] += 1
+            yield event
+
+    t0 = time.perf_counter()
+    events = read_events(args.log, start)
+    if chats:
+        # NAME нужны всем чатам: имя пишется один раз, в первом чате игрока
+        events = (e for e in events if e[3] in chats or e[1] == NAME)
+    events = counted(events)
+    if args.speed:
+        # по одному событию, чтобы темп держался
+        async for event in paced(events, args.speed):
+            engine.replay((event,))
+    else:
+        engine.replay(events)
+    elapsed = time.perf_counter() - t0
+    await engine.stop()
+
+    total = sum(kinds.values())
+    print(f"событий: {total} за {elapsed:.2f} с – {total / elapsed:,.0f}/с" if elapsed else f"событий: {total}")
+    print("по типам: " + ", ".join(f"{KIND_NAMES.get(k, k)}={n}" for k, n in sorted(kinds.items())))
+    print(
+        f"столов: {len(engine.games)}, игроков со статистикой: "
+        f"{sum(len(v) for v in engine.stats.values())}, хеш состояния: {state_digest(engine)}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log", help="файл журнала событий")
+    parser.add_argument("--speed", type=float, default=0, help="темп записи x N (0 – полная скорость)")
+    parser.add_argument("--chat", type=int, action="append", default=[], help="только этот чат (можно несколько)")
+    parser.add_argument("--from-snapshot", help="начать со снимка, а не с начала журнала")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# ===== КАРТЫ =====
+#
+# Карта хранится как целое число 0..51: масть * 13 + ранг,
+# т.е. индекс в GLYPHS (♠, ♥, ♦, ♣; внутри масти A, 2..10, J, Q, K).
+# Очки, признак туза и картинка берутся из заранее построенных таблиц,
+# так что ни одна операция не ищет карту в списке.
+
+from array import array
+
+GLYPHS = (
+    "🂡","🂢","🂣","🂤","🂥","🂦","🂧","🂨","🂩","🂪","🂫","🂭","🂮",  # ♠
+    "🂱","🂲","🂳","🂴","🂵","🂶","🂷","🂸","🂹","🂺","🂻","🂽","🂾",  # ♥
+    "🃁","🃂","🃃","🃄","🃅","🃆","🃇","🃈","🃉","🃊","🃋","🃍","🃎",  # ♦
+    "🃑","🃒","🃓","🃔","🃕","🃖","🃗","🃘","🃙","🃚","🃛","🃝","🃞"   # ♣
+)
+DECK_SIZE = len(GLYPHS)
+
+def _rank_value(rank: int) -> int:
+    if rank == 1:
+        return 11          # туз
+    if rank > 10:
+        return 10          # J Q K
+    return rank            # 2–10
+
+# дилер добирает, пока у него меньше 17 (на мягких 17 стоит)
+DEALER_STANDS = 17
+
+# VALUE[card] – очки карты (туз = 11), IS_ACE[card] – 1 для туза
+VALUE = tuple(_rank_value(c % 13 + 1) for c in range(DECK_SIZE))
+IS_ACE = tuple(int(c % 13 == 0) for c in range(DECK_SIZE))
+
+def card_value(card: int) -> int:
+    return VALUE[card]
+
+class Hand:
+    """Рука игрока с накопленной суммой очков.
+
+    score – текущие очки с учётом тузов, soft – сколько тузов ещё
+    считаются за 11. Взятие карты пересчитывает очки за O(1).
+    Карты лежат в array('B') – байт на карту.
+    """
+
+    __slots__ = ("cards", "score", "soft")
+
+    def __init__(self, cards=()):
+        self.cards = array("B")
+        self.score = 0
+        self.soft = 0
+        for card in cards:
+            self.add(card)
+
+    def add(self, card: int) -> int:
+        self.cards.append(card)
+        total = self.score + VALUE[card]
+        soft = self.soft + IS_ACE[card]
+        while total > 21 and soft:
+            total -= 10
+            soft -= 1
+        self.score = total
+        self.soft = soft
+        return total
+
+    @property
+    def busted(self) -> bool:
+        return self.score > 21
+
+    def last_glyph(self) -> str:
+        return GLYPHS[self.cards[-1]]
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __str__(self):
+        return " ".join([GLYPHS[c] for c in self.cards])
+
+def score(hand) -> int:
+    if isinstance(hand, Hand):
+        return hand.score
+    return Hand(hand).score
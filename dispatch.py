@@ -0,0 +1,84 @@
+# ===== ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА ПО ЧАТАМ =====
+#
+# Application по умолчанию обрабатывает апдейты строго по одному, и
+# медленный запрос к Telegram в одном чате тормозит все остальные.
+# ChatUpdateProcessor разрешает параллельную обработку, но апдейты одного
+# чата идут строго по очереди: обработчики меняют games/stats/balances
+# чата между await, и без этого две кнопки подряд могли бы гоняться.
+
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельно между чатами, последовательно внутри чата.
+
+    На каждый чат, в котором сейчас есть апдейты, заводится asyncio.Lock
+    (он честный, так что порядок прихода сохраняется). Когда очередь чата
+    пустеет, замок удаляется, и память не растёт с числом чатов.
+
+    bypass(update) – необязательная быстрая проверка до очереди чата: если
+    она вернула awaitable (например, ответ на устаревшее нажатие), апдейт
+    на этом и заканчивается, без замка и обработчиков.
+    """
+
+    __slots__ = ("_locks", "bypass")
+
+    def __init__(self, max_concurrent_updates: int = 256, bypass=None):
+        super().__init__(max_concurrent_updates)
+        # chat_id -> [lock, сколько апдейтов ждут или выполняются]
+        self._locks = {}
+        self.bypass = bypass
+
+    @staticmethod
+    def chat_key(update: object):
+        if isinstance(update, Update) and update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def process_update(self, update: object, coroutine) -> None:
+        # Вместо BaseUpdateProcessor.process_update: там общий семафор
+        # (max_concurrent_updates) берётся до do_process_update, и апдейты,
+        # ждущие занятый чат, держали бы места, нужные другим чатам. Здесь
+        # сначала очередь чата, место в семафоре – только на выполнение.
+        if self.bypass is not None:
+            early = self.bypass(update)
+            if early is not None:
+                coroutine.close()
+                async with self._semaphore:
+                    await early
+                return
+
+        chat_id = self.chat_key(update)
+        if chat_id is None:
+            async with self._semaphore:
+                await coroutine
+            return
+
+        entry = self._locks.get(chat_id)
+        if entry is None:
+            entry = self._locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._semaphore:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[chat_id]
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        # process_update выше своё, но BaseUpdateProcessor требует метод
+        await coroutine
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._locks)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,1313 @@
+# ===== ИГРОВОЙ ДВИЖОК =====
+#
+# Все правила игры без привязки к Telegram: состояние (games/stats/
+# balances), команды и кнопки. Движок говорит с внешним миром через два
+# объекта:
+#
+#   r   – ответ на конкретный апдейт (Reply): reply(text) на команду,
+#         answer(text, alert) и edit(text) на нажатие кнопки;
+#   bot – исходящая сторона (Bot): send(chat_id, text, buttons) -> message_id
+#         и edit(chat_id, message_id, text, buttons) -> bool
+#         (False – сообщения больше нет).
+#
+# Кнопки передаются как кортеж рядов ((текст, callback_data), ...), а во
+# что их превратить – решает адаптер. adapter.py подключает движок к
+# python-telegram-bot, bench/loadtest.py – к фейковому боту в памяти.
+#
+# Все команды имеют одну сигнатуру (r, chat_id, user_id, name, args),
+# кнопка – press(r, chat_id, user_id, name, data).
+#
+# Команды только проверяют условия и отвечают, а состояние меняют методы
+# apply_* (переходы). Каждый переход пишется в журнал событий (log,
+# eventlog.py), и replay() прогоняет журнал через те же переходы – так
+# восстанавливается хвост после снимка и воспроизводятся инциденты.
+
+import asyncio
+import heapq
+import time
+
+import eventlog
+import metrics
+import odds
+from cards import DEALER_STANDS, GLYPHS, Hand
+from leaderboard import LeaderboardIndex
+from profiles import Profile, ProfileIndex, aggregate, chat_records
+from records import Balance, Game, Player, StatLine, intern_name
+from shoe import ScriptedShoe, Shoe
+from storage import LazyChatTable
+from table import TableRenderer
+from timers import TimingWheel
+from tournament import Tournaments
+
+START_BALANCE = 1000
+
+# мест за столом; против дилера можно играть и одному
+MAX_PLAYERS = 7
+
+# cross_chat="db": общий топ перечитывается из базы не чаще, чем раз в столько секунд
+WORLD_REFRESH = 10.0
+
+# ответ на нажатие устаревшей или повторной кнопки
+STALE_PRESS = "Эта кнопка уже устарела."
+
+class Engine:
+    def __init__(self, db, bot, *, table_delay=0.3, shoe_decks=6, shoe_penetration=0.75,
+                 shoe_seed=None, odds_in_turn=False, hints=None, game_ttl=None, expiry_interval=60.0,
+                 log=None, max_players=MAX_PLAYERS, tournament_scheduler=None,
+                 turn_timeout=None, turn_tick=1.0, cross_chat="memory"):
+        self.db = db
+        self.bot = bot
+
+        # журнал событий (eventlog.EventLog) или None; при replay() не пишется
+        self.log = log
+        self.replaying = False
+        self._now = None             # время события при replay()
+        self._logged_names = {}      # user_id -> имя, уже записанное в журнал
+        self._replay_names = {}      # user_id -> имя из событий NAME при replay()
+
+        # games[chat_id] = Game (records.py), last_active – time.time()
+        # последнего изменения
+        self.games = LazyChatTable(self._load_game)
+
+        # stats[chat_id][user_id] = StatLine
+        self.stats = LazyChatTable(db.load_stats)
+
+        # balances[chat_id][user_id] = Balance
+        self.balances = LazyChatTable(db.load_balances)
+
+        # таблицы лидеров для /top, обновляются вместе со stats; общая
+        # строится при первом /top all
+        self.leaders = LeaderboardIndex(self._world_wins)
+
+        # профили игроков по всем чатам для /me, обновляются вместе со
+        # stats и balances; игрок поднимается из базы при первом обращении
+        self.profiles = ProfileIndex(self._load_profile)
+
+        # откуда /me и /top all берут данные по всем чатам: "memory" – индексы
+        # выше; "db" – общая база (шарды на одной SQLite: в памяти воркера
+        # только его чаты); None – недоступны (у шардов свои журналы)
+        self.cross_chat = cross_chat
+        self._world_loaded = 0.0
+
+        # одно редактируемое сообщение-стол на раздачу
+        self.tables = TableRenderer(bot, table_delay)
+
+        self.shoe_decks = shoe_decks
+        self.shoe_penetration = shoe_penetration
+        self.shoe_seed = shoe_seed
+        # seed игр от shoe_seed: база из хранилища (db.load_seeded() в
+        # start()) и номер игры с запуска – после перезапуска seed не повторяются
+        self._seed_base = 0
+        self._seeded = 0
+        self.odds_in_turn = odds_in_turn and odds.np is not None
+        # фоновые задачи: строки шансов к ходу (odds_in_turn), уведомления об истечении
+        self._tasks = set()
+        self.max_players = max_players
+        self.hints = hints
+
+        # турниры на выбывание: свои столы в памяти, общий планировщик
+        # (tournament.TournamentScheduler) решает, когда садиться за стол
+        self.tournaments = Tournaments(self, tournament_scheduler, table_delay=table_delay)
+
+        # Истечение игр: game_ttl секунд без изменений – игра закрывается.
+        # Куча (срок, chat_id) с ленивой проверкой: save_game только обновляет
+        # last_active, а в кучу чат попадает один раз. Обход снимает с вершины
+        # только просроченные записи и перекладывает тех, кто успел походить,
+        # так что он стоит O(истёкших), а не O(всех игр).
+        self.game_ttl = game_ttl
+        self.expiry_interval = expiry_interval
+        self._expiry = []          # куча (срок, chat_id)
+        self._expiring = set()     # чаты, у которых есть запись в куче
+        self._expiry_task = None
+
+        # Срок на ход: turn_timeout секунд без нажатия – игрок автоматически
+        # стоит. Сроки всех столов в одном колесе (timers.TimingWheel), ключ –
+        # chat_id или (chat_id, номер стола) у турнира; каждый показ хода
+        # переносит срок за O(1), одна задача раз в turn_tick снимает истёкшие.
+        self.turn_timeout = turn_timeout
+        self.turns = TimingWheel(turn_tick)
+        self._turn_task = None
+
+    async def start(self):
+        replayed = self.db.recover(self)
+        if replayed:
+            print(f"engine: восстановлено {replayed} событий из журнала")
+        self._seed_base = self.db.load_seeded()
+        self._seeded = 0
+        if self.game_ttl:
+            await self._seed_expiry()
+            self._expiry_task = asyncio.create_task(self._run_expiry())
+        if self.turn_timeout:
+            # раздачи, восстановленные из журнала, ждут хода с этого момента
+            for chat_id, game in dict.items(self.games):
+                if game.started:
+                    self.arm_turn(chat_id)
+            self._turn_task = asyncio.create_task(self._run_turns())
+
+    async def stop(self):
+        for task in (self._expiry_task, self._turn_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._expiry_task = self._turn_task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.tables.drain()
+        await self.tournaments.stop()
+
+    def register_gauges(self, registry=metrics.REGISTRY):
+        """Гейджи по загруженным в память чатам: считаются при опросе /metrics."""
+        registry.gauge("blackjack_chats_loaded", "Чатов с игрой в памяти", lambda: len(self.games))
+        registry.gauge(
+            "blackjack_games_active", "Раздач в процессе",
+            lambda: sum(1 for g in self.games.values() if g.started),
+        )
+        registry.gauge(
+            "blackjack_players_in_games", "Игроков за столами",
+            lambda: sum(len(g.players) for g in self.games.values()),
+        )
+        registry.gauge(
+            "blackjack_players_tracked", "Игроков со статистикой в памяти",
+            lambda: sum(len(chat) for chat in self.stats.values()),
+        )
+        registry.gauge(
+            "blackjack_balances_tracked", "Балансов в памяти",
+            lambda: sum(len(chat) for chat in self.balances.values()),
+        )
+
+    # ===== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =====
+
+    def game_seed(self, chat_id):
+        """seed новой игры из shoe_seed или None (случайный).
+
+        У каждой игры свой: к chat_id подмешиваются база из хранилища и номер
+        игры с запуска, так что прогон с теми же командами повторяется, а
+        /newgame в одном чате – и после перезапуска – не сдаёт те же карты.
+        Повтор журнала берёт seed из NEWGAME.
+        """
+        if self.shoe_seed is None:
+            return None
+        self._seeded += 1
+        self.db.mark_seeded(self._seed_base + self._seeded)
+        seed = (int(self.shoe_seed) * 1000003 + chat_id) * 1000003 + self._seed_base
+        return seed * 1000003 + self._seeded
+
+    def new_shoe(self, chat_id):
+        return Shoe(self.shoe_decks, self.shoe_penetration, self.game_seed(chat_id))
+
+    def _load_profile(self, user_id):
+        return self.db.load_profile(user_id, START_BALANCE)
+
+    async def rebuild_profiles(self):
+        """Пересобрать индекс профилей одним проходом по записям всех чатов.
+
+        Починка, если индекс разошёлся с таблицами чатов. Хранилище сначала
+        догоняет память (сброс SQLite или снимок), дальше load_profiles()
+        суммирует его stats и balances. Звать до приёма апдейтов: изменения
+        во время сброса в пересборку не попадут.
+        """
+        await self.db.flush()
+        rows = self.db.load_profiles(START_BALANCE)
+        if rows is None:
+            # хранилище без диска – все записи чатов в памяти
+            rows = aggregate(chat_records(self.stats, self.balances), START_BALANCE)
+        self.profiles.seed(rows)
+        self.leaders.refresh()
+        return len(rows)
+
+    def _world_wins(self):
+        """Победы по всем чатам для общей таблицы лидеров.
+
+        В базе (или снимке) суммы могут отставать от памяти, но каждый, кто
+        менялся с запуска, уже в self.profiles – берём их суммы.
+        """
+        wins = {uid: (name, w) for uid, name, w in self.db.load_total_wins()}
+        if self.cross_chat != "memory":
+            # профили в памяти могут отставать от других шардов, база – нет
+            return [(uid, name, w) for uid, (name, w) in wins.items()]
+        for uid, p in dict.items(self.profiles.users):
+            if p.wins:
+                wins[uid] = (p.name, p.wins)
+        return [(uid, name, w) for uid, (name, w) in wins.items()]
+
+    def ensure_stats(self, chat_id, user_id, name):
+        stats = self.stats
+        if chat_id not in stats:
+            stats[chat_id] = {}
+        if user_id not in stats[chat_id]:
+            stats[chat_id][user_id] = StatLine(name)
+        elif stats[chat_id][user_id].name != name:
+            stats[chat_id][user_id].name = intern_name(name)
+        else:
+            return
+        self.leaders.touch(chat_id, user_id, stats[chat_id][user_id])
+        self.profiles.link(chat_id, user_id, stats[chat_id][user_id].name)
+        self.db.mark_stats(chat_id, user_id, stats[chat_id][user_id])
+
+    def ensure_balance(self, chat_id, user_id, name):
+        balances = self.balances
+        if chat_id not in balances:
+            balances[chat_id] = {}
+        if user_id not in balances[chat_id]:
+            balances[chat_id][user_id] = Balance(name, START_BALANCE)
+        elif balances[chat_id][user_id].name != name:
+            balances[chat_id][user_id].name = intern_name(name)
+        else:
+            return False
+        self.profiles.link(chat_id, user_id, balances[chat_id][user_id].name)
+        self.db.mark_balance(chat_id, user_id, balances[chat_id][user_id])
+        return True
+
+    def add_stat(self, chat_id, user_id, name, field):
+        self.ensure_stats(chat_id, user_id, name)
+        record = self.stats[chat_id][user_id]
+        setattr(record, field, getattr(record, field) + 1)
+        if field == "wins":
+            self.leaders.win(chat_id, user_id, record)
+        self.profiles.add_stat(user_id, field)
+        self.db.mark_stats(chat_id, user_id, record)
+
+    def add_balance(self, chat_id, user_id, name, delta):
+        self.ensure_balance(chat_id, user_id, name)
+        record = self.balances[chat_id][user_id]
+        record.balance += delta
+        self.profiles.add_chips(user_id, delta)
+        self.db.mark_balance(chat_id, user_id, record)
+
+    def balance_of(self, chat_id, user_id):
+        return self.balances[chat_id][user_id].balance
+
+    def save_game(self, chat_id):
+        game = self.games[chat_id]
+        game.last_active = time.time() if self._now is None else self._now
+        # любое изменение делает кнопки уже показанного стола устаревшими
+        game.version += 1
+        self._schedule_expiry(chat_id, game)
+        self.db.mark_game(chat_id, game)
+
+    # ===== ЖУРНАЛ СОБЫТИЙ =====
+
+    def _log(self, kind, chat_id, key=0, arg=0, name=None, ts=None, payload=b""):
+        log = self.log
+        if log is None or self.replaying:
+            return
+        # имя пишется отдельным событием, только когда оно новое для журнала
+        if name is not None and self._logged_names.get(key) != name:
+            log.append(eventlog.NAME, chat_id, key, payload=name.encode())
+            self._logged_names[key] = name
+        log.append(kind, chat_id, key, arg, payload, ts=ts)
+
+    def forget_logged_names(self):
+        """После снимка: хвост журнала должен заново называть игроков."""
+        self._logged_names.clear()
+
+    def replay(self, events):
+        """Применить события журнала (как из eventlog.read_events). Возвращает их число.
+
+        Можно вызывать по частям: имена игроков помнятся между вызовами.
+        """
+        names = self._replay_names
+        count = 0
+        self.replaying = True
+        try:
+            for _, kind, ts, chat_id, key, arg, payload in events:
+                count += 1
+                self._now = ts
+                if kind == eventlog.NAME:
+                    names[key] = payload.decode()
+                elif kind == eventlog.NEWGAME:
+                    decks, penetration = eventlog.unpack_shoe(arg)
+                    self.apply_newgame(chat_id, Shoe(decks, penetration, key), bool(arg & eventlog.WITH_DEALER))
+                elif kind == eventlog.JOIN:
+                    self.apply_join(chat_id, key, names[key])
+                elif kind == eventlog.BET:
+                    self.apply_bet(chat_id, key, names[key], arg)
+                elif kind == eventlog.DEAL:
+                    self._with_cards(chat_id, payload, self.apply_deal, chat_id)
+                elif kind == eventlog.HIT:
+                    self._with_cards(chat_id, (arg,), self.apply_hit, chat_id, key)
+                elif kind == eventlog.STAND:
+                    self.apply_stand(chat_id, key)
+                elif kind == eventlog.SETTLE:
+                    self._with_cards(chat_id, payload, self.finish_game, chat_id)
+                elif kind == eventlog.REMATCH:
+                    self.apply_rematch(chat_id)
+                elif kind == eventlog.CANCEL:
+                    self.apply_cancel(chat_id)
+                elif kind == eventlog.EXPIRE:
+                    self.apply_expire(chat_id)
+                elif kind == eventlog.BALANCE:
+                    self.apply_balance(chat_id, key, names[key])
+                else:
+                    raise ValueError(f"неизвестное событие {kind}")
+        finally:
+            self.replaying = False
+            self._now = None
+        # имена из хвоста уже в журнале
+        self._logged_names.update(names)
+        return count
+
+    def _with_cards(self, chat_id, cards, apply, *args):
+        """Повторить переход с картами из журнала, а не из перетасовки башмака.
+
+        Тасовка зависит от NumPy (и его версии) – записанные карты нет.
+        """
+        game = self.games[chat_id]
+        shoe = game.shoe
+        game.shoe = ScriptedShoe(shoe, cards)
+        try:
+            return apply(*args)
+        finally:
+            game.shoe = shoe
+
+    # ===== РАЗДАЧА НА ОДНОМ СТОЛЕ =====
+    #
+    # Ходы над объектом Game без чата, базы и журнала: их используют и
+    # переходы apply_*, и турнирные столы (tournament.py).
+
+    @staticmethod
+    def deal(game):
+        # подрезная карта вышла в прошлой раздаче – тасуем башмак заново
+        shoe = game.shoe
+        if shoe.needs_shuffle:
+            shoe.shuffle()
+        for p in game.players.values():
+            p.hand = Hand((shoe.draw(), shoe.draw()))
+            p.stand = False
+            p.busted = False
+            p.line = None
+        if game.dealer is not None:
+            game.dealer = Hand((shoe.draw(), shoe.draw()))
+        game.started = True
+        game.finished = False
+        game.turn = 0
+
+    @staticmethod
+    def _advance_turn(game):
+        """Ход следующему в очереди order[turn:] – O(1) при любом размере стола."""
+        game.turn += 1
+
+    @staticmethod
+    def hit(game, user_id):
+        """Карта игроку; при переборе ход переходит дальше. Возвращает карту."""
+        p = game.players[user_id]
+        card = game.shoe.draw()
+        p.line = None
+        if p.hand.add(card) > 21:
+            p.busted = True
+            Engine._advance_turn(game)
+        return card
+
+    @staticmethod
+    def stand(game, user_id):
+        p = game.players[user_id]
+        p.stand = True
+        p.line = None
+        Engine._advance_turn(game)
+
+    @staticmethod
+    def rank_hands(game):
+        """Один проход по столу: (лучший счёт, user_id с ним, остальные user_id)."""
+        players = game.players
+        best = 0
+        top = []
+        for uid in game.order:
+            s = players[uid].hand.score
+            if s > 21:
+                continue
+            if s > best:
+                best = s
+                top = [uid]
+            elif s == best:
+                top.append(uid)
+        return best, top, [uid for uid in game.order if uid not in top]
+
+    # ===== ПЕРЕХОДЫ СОСТОЯНИЯ =====
+
+    def apply_newgame(self, chat_id, shoe, dealer=False):
+        game = self.games[chat_id] = Game(shoe, dealer=dealer)
+        # id игры для кнопок – из времени создания: то же время пишется в
+        # журнал, так что при replay() id совпадёт
+        now = time.time() if self._now is None else self._now
+        game.gid = int(now * 1000) & 0xFFFFFFFF
+        self.save_game(chat_id)
+        arg = eventlog.pack_shoe(shoe.decks, shoe.penetration)
+        if dealer:
+            arg |= eventlog.WITH_DEALER
+        self._log(eventlog.NEWGAME, chat_id, shoe.seed, arg, ts=now)
+
+    def apply_join(self, chat_id, user_id, name):
+        game = self.games[chat_id]
+        game.players[user_id] = Player(name)
+        game.order.append(user_id)
+        self.save_game(chat_id)
+        self.ensure_stats(chat_id, user_id, name)
+        self.ensure_balance(chat_id, user_id, name)
+        self._log(eventlog.JOIN, chat_id, user_id, name=name)
+
+    def apply_bet(self, chat_id, user_id, name, amount):
+        self.ensure_balance(chat_id, user_id, name)
+        p = self.games[chat_id].players[user_id]
+        p.bet = amount
+        p.line = None
+        self.save_game(chat_id)
+        self._log(eventlog.BET, chat_id, user_id, amount, name=name)
+
+    def apply_deal(self, chat_id):
+        game = self.games[chat_id]
+        for uid, p in game.players.items():
+            bet = p.bet or 10  # если игрок не сделал /bet – ставка по умолчанию 10
+            p.bet = bet
+            self.add_balance(chat_id, uid, p.name, -bet)
+        self.deal(game)
+        self.tables.reset(game)
+        self.save_game(chat_id)
+        # розданные карты – в порядке сдачи: игроки по две, потом дилер
+        dealt = [card for p in game.players.values() for card in p.hand]
+        if game.dealer is not None:
+            dealt.extend(game.dealer)
+        self._log(eventlog.DEAL, chat_id, payload=bytes(dealt))
+
+    def apply_hit(self, chat_id, user_id):
+        """Карта игроку; при переборе ход переходит дальше. Возвращает карту."""
+        card = self.hit(self.games[chat_id], user_id)
+        self.save_game(chat_id)
+        self._log(eventlog.HIT, chat_id, user_id, card)
+        return card
+
+    def apply_stand(self, chat_id, user_id):
+        self.stand(self.games[chat_id], user_id)
+        self.save_game(chat_id)
+        self._log(eventlog.STAND, chat_id, user_id)
+
+    def apply_rematch(self, chat_id):
+        game = self.games[chat_id]
+        for p in game.players.values():
+            p.hand = Hand()
+            p.stand = False
+            p.busted = False
+            p.line = None
+            # ставка остаётся, можно изменить /bet перед /startgame
+        if game.dealer is not None:
+            game.dealer = Hand()
+        game.started = False
+        game.finished = False
+        self.save_game(chat_id)
+        self._log(eventlog.REMATCH, chat_id)
+
+    def apply_cancel(self, chat_id):
+        # игра подгружается из базы, если её ещё нет в памяти (повтор журнала)
+        game = self.games[chat_id]
+        del self.games[chat_id]
+        self.db.drop_game(chat_id)
+        # отложенная правка стола не должна вернуть отменённую игру с кнопками
+        self.tables.discard(chat_id, game)
+        self.disarm_turn(chat_id)
+        self._log(eventlog.CANCEL, chat_id)
+
+    def apply_expire(self, chat_id):
+        """Закрыть игру с возвратом ставок недоигранной раздачи. True – ставки вернули."""
+        game = self.games[chat_id]
+        refunded = False
+        if game.started:
+            # ставки списаны в /startgame, а раздача так и не доиграна
+            for uid in game.order:
+                p = game.players[uid]
+                if p.bet:
+                    self.add_balance(chat_id, uid, p.name, p.bet)
+                    refunded = True
+        del self.games[chat_id]
+        self.db.drop_game(chat_id)
+        self.tables.discard(chat_id, game)
+        self.disarm_turn(chat_id)
+        self._log(eventlog.EXPIRE, chat_id)
+        return refunded
+
+    def apply_balance(self, chat_id, user_id, name):
+        # /balance заводит баланс новичку – это тоже переход
+        if self.ensure_balance(chat_id, user_id, name):
+            self._log(eventlog.BALANCE, chat_id, user_id, name=name)
+
+    # ===== ИСТЕЧЕНИЕ НЕАКТИВНЫХ ИГР =====
+
+    def _load_game(self, chat_id):
+        game = self.db.load_game(chat_id)
+        if game is not None:
+            # игры из базы до появления last_active считаем свежими
+            if not game.last_active:
+                game.last_active = time.time()
+            self._schedule_expiry(chat_id, game)
+            if game.started:
+                self.arm_turn(chat_id)
+        return game
+
+    def _schedule_expiry(self, chat_id, game):
+        if self.game_ttl and chat_id not in self._expiring:
+            self._expiring.add(chat_id)
+            heapq.heappush(self._expiry, (game.last_active + self.game_ttl, chat_id))
+
+    async def _seed_expiry(self):
+        """Сроки игр из хранилища: иначе игра чата, где больше не пишут, не истечёт никогда."""
+        now = time.time()
+        for chat_id, last_active in await self.db.load_game_times():
+            if chat_id not in self._expiring:
+                self._expiring.add(chat_id)
+                self._expiry.append(((last_active or now) + self.game_ttl, chat_id))
+        heapq.heapify(self._expiry)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def expire(self, now=None):
+        """Закрыть игры без изменений дольше game_ttl. Возвращает их chat_id."""
+        now = time.time() if now is None else now
+        expired = []
+        heap = self._expiry
+        while heap and heap[0][0] <= now:
+            _, chat_id = heapq.heappop(heap)
+            # в куче и игры из хранилища, ещё не поднятые в память
+            # (_seed_expiry): они подгружаются только к своему сроку
+            game = self.games.get(chat_id)
+            if game is None:
+                self._expiring.discard(chat_id)
+                continue
+            deadline = game.last_active + self.game_ttl
+            if deadline > now:
+                heapq.heappush(heap, (deadline, chat_id))
+                continue
+            self._expiring.discard(chat_id)
+            expired.append(chat_id)
+            self.evict_game(chat_id, game)
+        return expired
+
+    def evict_game(self, chat_id, game):
+        if self.apply_expire(chat_id):
+            # доставку не ждём: обход – только работа в памяти, сообщения
+            # уходят через outbox с его лимитами
+            self._spawn(self._notify_expired(chat_id))
+
+    async def _notify_expired(self, chat_id):
+        try:
+            await self.bot.send(chat_id, "Игра закрыта из-за неактивности. Ставки возвращены.")
+        except Exception as exc:
+            print(f"engine: не удалось сообщить об истечении игры в чате {chat_id}: {exc!r}")
+
+    async def _run_expiry(self):
+        while True:
+            await asyncio.sleep(self.expiry_interval)
+            try:
+                self.expire()
+            except Exception as exc:
+                print(f"engine: ошибка при истечении игр: {exc!r}")
+
+    # ===== СРОК НА ХОД =====
+
+    def arm_turn(self, key):
+        """Начать отсчёт хода для стола key (chat_id или турнирного стола)."""
+        if self.turn_timeout:
+            self.turns.schedule(key, time.monotonic() + self.turn_timeout)
+
+    def disarm_turn(self, key):
+        self.turns.cancel(key)
+
+    def turn_timeouts(self, now=None):
+        """Автоматический Stand за тех, чей срок истёк. Возвращает ключи столов."""
+        fired = self.turns.advance(time.monotonic() if now is None else now)
+        for key in fired:
+            try:
+                if isinstance(key, tuple):
+                    self.tournaments.turn_timeout(key)
+                else:
+                    self._turn_timeout(key)
+            except Exception as exc:
+                print(f"engine: ошибка при истечении хода {key!r}: {exc!r}")
+        return fired
+
+    def _turn_timeout(self, chat_id):
+        # dict.get – истёкший срок не повод подгружать чат из базы
+        game = dict.get(self.games, chat_id)
+        if game is None or not game.started or self.all_players_done(game):
+            return
+        user_id = game.order[game.turn]
+        player = game.players[user_id]
+        self.apply_stand(chat_id, user_id)
+        self.next_turn(chat_id, game, f"{player.name} не походил вовремя и остановился ⏰")
+
+    async def _run_turns(self):
+        while True:
+            await asyncio.sleep(self.turns.tick)
+            self.turn_timeouts()
+
+    @staticmethod
+    def player_line(p):
+        """Строка игрока для стола; готовую сбрасывают ходы, меняющие игрока (p.line = None)."""
+        if p.line is not None:
+            return p.line
+        status = ""
+        if p.busted:
+            status = " (перебор 💥)"
+        elif p.stand:
+            status = " (стоит)"
+        bet_info = f", ставка: {p.bet}" if p.bet else ""
+        cards_str = str(p.hand) if p.hand else "—"
+        text = f"{p.name}: {cards_str} = {p.hand.score}{status}{bet_info}"
+        p.line = text
+        return text
+
+    @staticmethod
+    def dealer_line(game):
+        hand = game.dealer
+        if not hand:
+            return "Дилер: —"
+        if game.started:
+            # вторая карта закрыта до расчёта
+            return f"Дилер: {GLYPHS[hand.cards[0]]} 🂠"
+        status = " (перебор 💥)" if hand.score > 21 else ""
+        return f"Дилер: {hand} = {hand.score}{status}"
+
+    @staticmethod
+    def format_game_state(game):
+        players = game.players
+        lines = [Engine.player_line(players[uid]) for uid in game.order]
+        if game.dealer is not None:
+            lines.insert(0, Engine.dealer_line(game))
+        return "\n".join(lines)
+
+    def show_turn(self, chat_id, last_action=""):
+        t = time.perf_counter()
+        game = self.games[chat_id]
+        current_id = game.order[game.turn]
+        current_player = game.players[current_id]
+
+        text = (
+            "Текущее состояние игры:\n\n"
+            f"{self.format_game_state(game)}\n\n"
+            f"Сейчас ход: {current_player.name}"
+        )
+        if self.turn_timeout:
+            text += f" (⏰ {self.turn_timeout:g} с)"
+        if last_action:
+            text = f"{last_action}\n\n{text}"
+        buttons = self.turn_buttons(game)
+        self.tables.update(chat_id, game, text, buttons)
+        if self.odds_in_turn:
+            # оценка – до odds.BUDGET, её считаем в потоке, как /odds; обычно
+            # готова раньше, чем стол уйдёт (table_delay)
+            self._spawn(self._turn_odds(chat_id, game, current_id, text, buttons))
+        self.arm_turn(chat_id)
+        metrics.HANDLER_SECONDS.observe(time.perf_counter() - t, "show_turn")
+
+    async def _turn_odds(self, chat_id, game, user_id, text, buttons):
+        version = game.version
+        result = await asyncio.to_thread(self.hand_odds, game, user_id)
+        # пока считали, ход могли сделать: тогда строка уже не про этот стол
+        if self.games.get(chat_id) is game and game.version == version:
+            self.tables.update(chat_id, game, f"{text}\n{result.line()}", buttons)
+
+    @staticmethod
+    def turn_buttons(game):
+        """Hit/Stand с id игры и версией состояния: "hit:<gid>:<version>" в hex."""
+        token = f"{game.gid:x}:{game.version:x}"
+        return ((("Hit 🃏", "hit:" + token), ("Stand ✋", "stand:" + token)),)
+
+    @staticmethod
+    def is_stale(game, data):
+        """Кнопка не от текущего состояния игры: старое сообщение или повторное нажатие."""
+        _, sep, token = data.partition(":")
+        if not sep:
+            return False  # кнопки без версии, отправленные до обновления бота
+        return token != f"{game.gid:x}:{game.version:x}"
+
+    def stale_press(self, chat_id, data):
+        """Проверка до очереди чата: True – нажатие можно отбросить одним answer.
+
+        Чат не в памяти – решит обычный путь _press (с загрузкой из базы).
+        """
+        if data.startswith("t:"):
+            return self.tournaments.is_stale(chat_id, data)
+        game = dict.get(self.games, chat_id)
+        return game is not None and self.is_stale(game, data)
+
+    def next_turn(self, chat_id, game, last_action):
+        """После Stand или перебора: расчёт, если все закончили, иначе ход следующему."""
+        if self.all_players_done(game):
+            self.finish_game(chat_id)
+        else:
+            self.show_turn(chat_id, last_action)
+
+    @staticmethod
+    def rival(game, user_id):
+        """Соперник для /odds и /hint: (рука, состояние).
+
+        Оценки считают дуэль один на один. За столом с дилером это дилер
+        (видна одна карта, он добирает до DEALER_STANDS), иначе – лучший из
+        остановившихся, а если таких нет – сильнейший из тех, кто ещё
+        ходит.
+        """
+        if game.dealer is not None:
+            return Hand(game.dealer.cards[:1]), odds.DEALER
+        stood = acting = busted = None
+        for uid in game.order:
+            if uid == user_id:
+                continue
+            hand = game.players[uid].hand
+            if game.players[uid].busted:
+                busted = hand
+            elif game.players[uid].stand:
+                if stood is None or hand.score > stood.score:
+                    stood = hand
+            elif acting is None or hand.score > acting.score:
+                acting = hand
+        if stood is not None:
+            return stood, odds.STOOD
+        if acting is not None:
+            return acting, odds.TO_ACT
+        return busted, odds.BUSTED
+
+    def hand_odds(self, game, user_id):
+        return odds.estimate(game.players[user_id].hand, *self.rival(game, user_id))
+
+    @staticmethod
+    def all_players_done(game):
+        return game.turn >= len(game.order)
+
+    @staticmethod
+    def min_players(game):
+        return 1 if game.dealer is not None else 2
+
+    # ===== КОМАНДЫ =====
+
+    async def start_help(self, r, chat_id, user_id, name, args):
+        await r.reply(
+            "Привет! Я бот Блэкджек 🎰\n\n"
+            f"Формат: от 2 до {self.max_players} игроков, банк забирает лучшая рука. "
+            "Или против дилера: /newgame dealer.\n\n"
+            "Команды:\n"
+            "/newgame – создать новую игру (/newgame dealer – против дилера)\n"
+            f"/join – присоединиться (до {self.max_players} игроков)\n"
+            "/bet N – поставить N фишек\n"
+            "/startgame – начать игру\n"
+            "/rematch – реванш теми же игроками\n"
+            "/status – показать текущие карты\n"
+            "/odds – шансы Hit и Stand для твоей руки\n"
+            "/hint – что выгоднее: Hit или Stand\n"
+            "/balance – твой баланс фишек\n"
+            "/stats – твоя статистика\n"
+            "/me – твой профиль по всем чатам\n"
+            "/top – топ игроков по победам\n"
+            "/top all – общий топ по всем чатам\n"
+            "/tournament – турнир на выбывание (join, start, status, cancel)\n"
+            "/cancel – отменить игру"
+        )
+
+    async def new_game(self, r, chat_id, user_id, name, args):
+        dealer = bool(args) and args[0].lower() in ("dealer", "дилер")
+        self.apply_newgame(chat_id, self.new_shoe(chat_id), dealer)
+        await r.reply(
+            ("Создана новая игра против дилера!\n" if dealer else "Создана новая игра!\n")
+            + f"Игроки могут присоединиться командой /join (максимум {self.max_players}).\n"
+            "Потом ставьте /bet и запускайте /startgame."
+        )
+
+    async def join(self, r, chat_id, user_id, name, args):
+        if chat_id not in self.games:
+            await r.reply("Сначала создайте игру командой /newgame.")
+            return
+
+        game = self.games[chat_id]
+
+        if game.started:
+            await r.reply("Игра уже началась, присоединиться нельзя.")
+            return
+
+        if user_id in game.players:
+            await r.reply("Ты уже участвуешь в этой игре.")
+            return
+
+        if len(game.players) >= self.max_players:
+            await r.reply(f"За столом уже {len(game.players)} игроков, мест нет.")
+            return
+
+        self.apply_join(chat_id, user_id, name)
+        bal = self.balance_of(chat_id, user_id)
+
+        await r.reply(
+            f"{name} присоединился к игре!\nБаланс: 💰 {bal} фишек.\n"
+            "Сделай ставку /bet N (например, /bet 50)."
+        )
+
+        if len(game.players) == self.max_players:
+            await r.reply(f"Стол заполнен: {len(game.players)} игроков. Ставьте /bet и запускайте /startgame.")
+        elif len(game.players) == 2 and game.dealer is None:
+            await r.reply("2 игрока в игре. Не забудьте поставить /bet и потом /startgame.")
+
+    async def bet(self, r, chat_id, user_id, name, args):
+        if chat_id not in self.games:
+            await r.reply("Сначала создайте игру /newgame.")
+            return
+        game = self.games[chat_id]
+
+        if user_id not in game.players:
+            await r.reply("Сначала присоединись к игре /join.")
+            return
+
+        if game.started:
+            await r.reply("Игра уже началась, ставку менять нельзя.")
+            return
+
+        if not args:
+            await r.reply("Использование: /bet N\nНапример: /bet 50")
+            return
+
+        try:
+            amount = int(args[0])
+        except ValueError:
+            await r.reply("Ставка должна быть целым числом.")
+            return
+
+        if amount <= 0:
+            await r.reply("Ставка должна быть > 0.")
+            return
+
+        # баланс заведён в /join
+        bal = self.balance_of(chat_id, user_id)
+
+        if amount > bal:
+            await r.reply(f"У тебя нет столько фишек. Баланс: {bal}.")
+            return
+
+        self.apply_bet(chat_id, user_id, name, amount)
+        await r.reply(f"Ставка {amount} фишек установлена для {name}.")
+
+    async def start_game(self, r, chat_id, user_id, name, args):
+        if chat_id not in self.games:
+            await r.reply("Сначала создайте игру командой /newgame.")
+            return
+
+        game = self.games[chat_id]
+
+        if game.started:
+            await r.reply("Игра уже началась.")
+            return
+
+        if len(game.players) < self.min_players(game):
+            if game.dealer is not None:
+                await r.reply("За столом никого нет. Присоединяйтесь: /join.")
+            else:
+                await r.reply("Для игры нужно 2 игрока. Пусть второй сделает /join.")
+            return
+
+        # Проверяем ставки (баланс заведён в /join), списывает apply_deal
+        for uid, p in game.players.items():
+            bal = self.balance_of(chat_id, uid)
+            bet = p.bet or 10  # если игрок не сделал /bet – ставка по умолчанию 10
+            if bet > bal:
+                await r.reply(f"{p.name} не хватает фишек на ставку {bet}. Баланс: {bal}.")
+                return
+
+        self.apply_deal(chat_id)
+
+        await r.reply("Игра началась! Раздаю карты 👇")
+        self.show_turn(chat_id)
+
+    async def rematch(self, r, chat_id, user_id, name, args):
+        if chat_id not in self.games:
+            await r.reply("Ещё не было игры. Используй /newgame.")
+            return
+
+        game = self.games[chat_id]
+
+        if not game.finished:
+            await r.reply("Текущая игра ещё не окончена. Доиграйте или /cancel.")
+            return
+
+        if len(game.players) < self.min_players(game):
+            await r.reply("Для реванша нужно, чтобы было 2 игрока.")
+            return
+
+        self.apply_rematch(chat_id)
+
+        await r.reply(
+            "Реванш! Игроки те же.\n"
+            "Можете поменять ставки /bet и снова запустить /startgame."
+        )
+
+    async def status(self, r, chat_id, user_id, name, args):
+        if chat_id not in self.games or not self.games[chat_id].started:
+            await r.reply("Сейчас нет активной игры. /newgame чтобы создать.")
+            return
+
+        await r.reply(self.format_game_state(self.games[chat_id]))
+
+    async def _active_player(self, r, chat_id, user_id):
+        """Игрок, который ещё ходит в текущей раздаче, или None (с ответом)."""
+        if chat_id not in self.games or not self.games[chat_id].started:
+            await r.reply("Сейчас нет активной игры. /newgame чтобы создать.")
+            return None
+
+        game = self.games[chat_id]
+
+        if user_id not in game.players:
+            await r.reply("Ты не участвуешь в этой игре.")
+            return None
+
+        p = game.players[user_id]
+        if p.stand or p.busted:
+            await r.reply("Ты уже закончил ход в этой раздаче.")
+            return None
+        return p
+
+    async def show_odds(self, r, chat_id, user_id, name, args):
+        p = await self._active_player(r, chat_id, user_id)
+        if p is None:
+            return
+
+        if odds.np is None:
+            await r.reply("Подсказки недоступны: на сервере не установлен NumPy.")
+            return
+
+        # симуляция укладывается в odds.BUDGET, но event loop ей не занимаем
+        result = await asyncio.to_thread(self.hand_odds, self.games[chat_id], user_id)
+        await r.reply(
+            f"{p.name}: {p.hand} = {p.hand.score}\n"
+            f"{result.line()}\n"
+            f"(по {result.rollouts} розыгрышам)"
+        )
+
+    async def hint(self, r, chat_id, user_id, name, args):
+        if self.hints is None:
+            # движок без таблицы (hints=None): нагрузочные тесты, офлайн-прогоны
+            await r.reply("Подсказки недоступны.")
+            return
+        p = await self._active_player(r, chat_id, user_id)
+        if p is None:
+            return
+
+        hit_ev, stand_ev = self.hints.hint(p.hand, *self.rival(self.games[chat_id], user_id))
+        best = "Hit 🃏" if hit_ev > stand_ev else "Stand ✋"
+        await r.reply(
+            f"{p.name}: {p.hand} = {p.hand.score}\n"
+            f"💡 Ожидание в ставках: Hit {hit_ev:+.2f} · Stand {stand_ev:+.2f}\n"
+            f"Выгоднее: {best}"
+        )
+
+    async def cancel(self, r, chat_id, user_id, name, args):
+        if chat_id not in self.games:
+            await r.reply("Игра не найдена.")
+            return
+
+        self.apply_cancel(chat_id)
+        await r.reply("Игра отменена.")
+
+    async def balance(self, r, chat_id, user_id, name, args):
+        self.apply_balance(chat_id, user_id, name)
+        bal = self.balance_of(chat_id, user_id)
+        await r.reply(f"Твой баланс в этом чате: 💰 {bal} фишек.")
+
+    async def show_stats(self, r, chat_id, user_id, name, args):
+        if chat_id not in self.stats or user_id not in self.stats[chat_id]:
+            await r.reply("У тебя пока нет статистики в этом чате. Сыграй пару игр!")
+            return
+
+        s = self.stats[chat_id][user_id]
+        await r.reply(
+            f"Статистика {s.name} в этом чате:\n"
+            f"🏆 Победы: {s.wins}\n"
+            f"😔 Поражения: {s.losses}\n"
+            f"🤝 Ничьи: {s.draws}\n"
+            f"💥 Переборы: {s.busts}"
+        )
+
+    async def _cross_chat_ready(self, r):
+        """Можно ли ответить по всем чатам."""
+        if self.cross_chat is None:
+            await r.reply("Статистика по всем чатам недоступна: у каждого шарда свой журнал.")
+            return False
+        return True
+
+    def _shared_profile(self, user_id):
+        """Профиль из общей базы (cross_chat="db") или None.
+
+        Чужие шарды сбрасывают свои записи не реже раза в DB_FLUSH_INTERVAL,
+        а свои могут ещё ждать сброса: чаты игрока, поднятые в память этого
+        воркера (их знает его профиль в индексе), считаются по памяти.
+        """
+        p = dict.get(self.profiles.users, user_id)
+        own = [] if p is None else [
+            c for c in p.chats if dict.get(self.stats, c) is not None or dict.get(self.balances, c) is not None
+        ]
+        row = self.db.load_profile(user_id, START_BALANCE, skip=own)
+        if not own:
+            return None if row is None else Profile(*row)
+        shared = Profile(p.name) if row is None else Profile(*row)
+        shared.name = p.name
+        for c in own:
+            s = self.stats.get(c, {}).get(user_id)
+            b = self.balances.get(c, {}).get(user_id)
+            if s is None and b is None:
+                continue
+            shared.chats.add(c)
+            if s is not None:
+                shared.wins += s.wins
+                shared.losses += s.losses
+                shared.draws += s.draws
+                shared.busts += s.busts
+            if b is not None:
+                shared.net += b.balance - START_BALANCE
+        return shared if shared.chats else None
+
+    async def show_profile(self, r, chat_id, user_id, name, args):
+        if not await self._cross_chat_ready(r):
+            return
+        if self.cross_chat == "db":
+            p = self._shared_profile(user_id)
+        else:
+            p = self.profiles.get(user_id)
+        if p is None:
+            await r.reply("У тебя пока нет игр ни в одном чате. /newgame чтобы начать.")
+            return
+
+        await r.reply(
+            f"Профиль {p.name} по всем чатам ({len(p.chats)}):\n"
+            f"🏆 Победы: {p.wins}\n"
+            f"😔 Поражения: {p.losses}\n"
+            f"🤝 Ничьи: {p.draws}\n"
+            f"💥 Переборы: {p.busts}\n"
+            f"💰 Фишки: {p.net:+} к стартовым"
+        )
+
+    async def top(self, r, chat_id, user_id, name, args):
+        if args and args[0].lower() in ("all", "global"):
+            if not await self._cross_chat_ready(r):
+                return
+            now = time.monotonic()
+            # общий топ из базы и так отстаёт до WORLD_REFRESH, свои записи
+            # попадают в неё за DB_FLUSH_INTERVAL – сброс здесь не нужен
+            if self.cross_chat == "db" and now - self._world_loaded >= WORLD_REFRESH:
+                self.leaders.refresh()
+                self._world_loaded = now
+            if not self.leaders.world:
+                await r.reply("Пока ни у кого нет побед. /newgame чтобы начать.")
+                return
+            title = "🌍 Общий топ игроков по победам:"
+            top = self.leaders.world.top(10)
+        else:
+            if chat_id not in self.stats or not self.stats[chat_id]:
+                await r.reply("В этом чате ещё нет игр. /newgame чтобы начать.")
+                return
+            title = "🏆 Топ игроков по победам:"
+            top = self.leaders.chat(chat_id, self.stats[chat_id]).top(10)
+
+        lines = [title]
+        for i, (pname, wins) in enumerate(top, start=1):
+            lines.append(f"{i}. {pname} — {wins} побед")
+
+        await r.reply("\n".join(lines))
+
+    async def tournament(self, r, chat_id, user_id, name, args):
+        await self.tournaments.command(r, chat_id, user_id, name, args)
+
+    # команда -> метод, в порядке /start
+    COMMANDS = {
+        "start": start_help,
+        "newgame": new_game,
+        "join": join,
+        "bet": bet,
+        "startgame": start_game,
+        "rematch": rematch,
+        "status": status,
+        "odds": show_odds,
+        "hint": hint,
+        "cancel": cancel,
+        "balance": balance,
+        "stats": show_stats,
+        "me": show_profile,
+        "top": top,
+        "tournament": tournament,
+    }
+
+    async def command(self, command, r, chat_id, user_id, name, args=()):
+        t = time.perf_counter()
+        try:
+            await self.COMMANDS[command](self, r, chat_id, user_id, name, list(args))
+        finally:
+            metrics.HANDLER_SECONDS.observe(time.perf_counter() - t, command)
+
+    # ===== ЗАВЕРШЕНИЕ ИГРЫ =====
+
+    def finish_game(self, chat_id):
+        t = time.perf_counter()
+        game = self.games[chat_id]
+        game.started = False
+        game.finished = True
+        if game.dealer is None:
+            result_text, balance_info = self._settle_pot(chat_id, game)
+        else:
+            result_text, balance_info = self._settle_dealer(chat_id, game)
+
+        state = self.format_game_state(game)
+        text = f"Игра окончена!\n\n{state}\n\n{result_text}\n\n{balance_info}"
+        self.save_game(chat_id)
+        # добор дилера – карты после первых двух
+        drawn = b"" if game.dealer is None else bytes(game.dealer.cards[2:])
+        self._log(eventlog.SETTLE, chat_id, payload=drawn)
+        if not self.replaying:
+            self.disarm_turn(chat_id)
+            self.tables.update(chat_id, game, text)
+        metrics.HANDLER_SECONDS.observe(time.perf_counter() - t, "finish_game")
+
+    def _balance_lines(self, chat_id, players):
+        balances = self.balances[chat_id]
+        return "\n".join([f"Баланс {p.name}: {balances[uid].balance}" for uid, p in players])
+
+    def _settle_pot(self, chat_id, game):
+        """Банк – лучшей руке без перебора; при равенстве лучшие делят банк."""
+        players = game.players
+        best, top, rest_ids = self.rank_hands(game)
+        pot = 0
+        for uid in game.order:
+            p = players[uid]
+            pot += p.bet
+            if p.hand.score > 21:
+                self.add_stat(chat_id, uid, p.name, "busts")
+
+        losers = [(uid, players[uid]) for uid in rest_ids]
+        for uid, p in losers:
+            self.add_stat(chat_id, uid, p.name, "losses")
+
+        if not top:
+            everyone = "Оба игрока" if len(game.order) == 2 else "Все игроки"
+            result_text = f"{everyone} с перебором 💥\nБанк сгорает, ставки не возвращаются."
+            return result_text, "Баланс учитывает списанные ставки."
+
+        if len(top) == 1:
+            winner_id = top[0]
+            winner = players[winner_id]
+            self.add_stat(chat_id, winner_id, winner.name, "wins")
+            self.add_balance(chat_id, winner_id, winner.name, pot)
+            lost = ", ".join([f"{p.name} ({p.hand.score} очков)" for _, p in losers])
+            result_text = (
+                f"Победитель: {winner.name} с {best} очками! 🎉\n"
+                f"{'Проиграл' if len(losers) == 1 else 'Проиграли'}: {lost}"
+            )
+            balance_info = (
+                f"{winner.name} получает банк {pot} фишек.\n"
+                + self._balance_lines(chat_id, [(winner_id, winner)] + losers)
+            )
+            return result_text, balance_info
+
+        # ничья за первое место: каждому своя ставка и поровну ставки проигравших
+        winners = [(uid, players[uid]) for uid in top]
+        rest = pot - sum([p.bet for _, p in winners])
+        share, extra = divmod(rest, len(winners))
+        for i, (uid, p) in enumerate(winners):
+            self.add_stat(chat_id, uid, p.name, "draws")
+            self.add_balance(chat_id, uid, p.name, p.bet + share + (1 if i < extra else 0))
+        names = [p.name for _, p in winners]
+        both = " оба" if len(names) == 2 else ""
+        result_text = f"Ничья! {', '.join(names[:-1])} и {names[-1]}{both} с {best} очками 🤝"
+        if rest:
+            returned = f"Ставки возвращены, проигранные {rest} фишек делятся поровну."
+        else:
+            returned = "Ставки возвращены игрокам."
+        return result_text, returned + "\n" + self._balance_lines(chat_id, winners + losers)
+
+    def _settle_dealer(self, chat_id, game):
+        """Каждый играет с дилером: дилер добирает до 17, выигрыш 1:1."""
+        players = game.players
+        dealer = game.dealer
+        if any(players[uid].hand.score <= 21 for uid in game.order):
+            shoe = game.shoe
+            while dealer.score < DEALER_STANDS:
+                dealer.add(shoe.draw())
+        d = dealer.score
+
+        lines = []
+        for uid in game.order:
+            p = players[uid]
+            s = p.hand.score
+            if s > 21:
+                self.add_stat(chat_id, uid, p.name, "busts")
+                self.add_stat(chat_id, uid, p.name, "losses")
+                lines.append(f"{p.name}: перебор, ставка {p.bet} сгорает")
+            elif d > 21 or s > d:
+                self.add_stat(chat_id, uid, p.name, "wins")
+                self.add_balance(chat_id, uid, p.name, 2 * p.bet)
+                lines.append(f"{p.name}: победа, +{p.bet} 🎉")
+            elif s == d:
+                self.add_stat(chat_id, uid, p.name, "draws")
+                self.add_balance(chat_id, uid, p.name, p.bet)
+                lines.append(f"{p.name}: ничья, ставка возвращена 🤝")
+            else:
+                self.add_stat(chat_id, uid, p.name, "losses")
+                lines.append(f"{p.name}: проигрыш, -{p.bet}")
+
+        head = "У дилера перебор 💥" if d > 21 else f"У дилера {d}."
+        result_text = head + "\n" + "\n".join(lines)
+        return result_text, self._balance_lines(chat_id, [(uid, players[uid]) for uid in game.order])
+
+    # ===== КНОПКИ (Hit / Stand) =====
+
+    async def press(self, r, chat_id, user_id, name, data):
+        t = time.perf_counter()
+        try:
+            await self._press(r, chat_id, user_id, name, data)
+        finally:
+            metrics.HANDLER_SECONDS.observe(time.perf_counter() - t, "button")
+
+    async def _press(self, r, chat_id, user_id, name, data):
+        if data.startswith("t:"):
+            await self.tournaments.press(r, chat_id, user_id, name, data)
+            return
+
+        if chat_id not in self.games:
+            await r.answer()
+            await r.edit("Игра уже закончена или не создана. /newgame чтобы начать новую.")
+            return
+
+        game = self.games[chat_id]
+
+        # двойное нажатие или кнопка старого сообщения – без хода и без правок
+        if self.is_stale(game, data):
+            metrics.STALE_PRESSES.inc("engine")
+            await r.answer(STALE_PRESS)
+            return
+
+        if not game.started:
+            await r.answer()
+            await r.edit("Игра ещё не началась. Напишите /startgame.")
+            return
+
+        if user_id not in game.players:
+            await r.answer("Ты не участвуешь в этой игре.", alert=True)
+            return
+
+        # Проверяем очередь
+        current_id = game.order[game.turn]
+        if user_id != current_id:
+            await r.answer("Сейчас ход другого игрока!", alert=True)
+            return
+
+        player = game.players[user_id]
+        action = data.partition(":")[0]
+
+        # Всё показываем в сообщении-столе: одно редактирование на ход
+        if action == "hit":
+            self.apply_hit(chat_id, user_id)
+            if not player.busted:
+                self.show_turn(chat_id, f"{player.name} взял карту: {player.hand.last_glyph()}")
+                await r.answer()
+                return  # тот же игрок ходит дальше
+            last_action = f"{player.name} взял карту: {player.hand.last_glyph()} – перебор 💥"
+        elif action == "stand":
+            self.apply_stand(chat_id, user_id)
+            last_action = f"{player.name} остановился."
+        else:
+            await r.answer()
+            return
+
+        # Все закончили – расчёт, иначе ход уже передан следующему
+        self.next_turn(chat_id, game, last_action)
+        await r.answer()
@@ -0,0 +1,498 @@
+# ===== ЖУРНАЛ СОБЫТИЙ И СНИМКИ =====
+#
+# Каждый переход состояния игры (создание стола, вход, ставка, раздача,
+# Hit, Stand, расчёт, реванш, отмена, истечение) пишется в журнал как
+# одна бинарная запись фиксированного размера:
+#
+#   kind u8 | ts f64 | chat_id i64 | key i64 | arg i32 | len u16 | payload
+#
+# key – обычно user_id, arg – число (ставка, карта); payload – имя
+# пользователя в UTF-8 у NAME, розданные карты у DEAL (игроки по две, потом
+# дилер) и добор дилера у SETTLE, по байту на карту. Имя пишется один
+# раз, пока не поменяется, остальные события ссылаются на user_id. Карты
+# пишутся (у HIT – в arg), потому что перетасовка башмака по seed из
+# NEWGAME зависит от NumPy и его версии: повтор берёт карты из журнала,
+# а башмак только сдвигается (shoe.ScriptedShoe).
+#
+# Снимок – состояние games/stats/balances на позицию журнала log_offset.
+# Файл снимка отображается в память (mmap): в начале отсортированный
+# индекс chat_id -> (смещение, длина), дальше JSON каждого чата. Чат
+# разбирается только при первом обращении к нему, так что старт – это
+# mmap и повтор хвоста журнала после снимка, и он не растёт с историей.
+# Профили игроков по всем чатам (profiles.py) лежат в снимке так же – по
+# user_id, и поднимаются при первом обращении к игроку; общая таблица
+# лидеров – одним JSON, он читается при первом /top all.
+#
+# EventStore – хранилище для движка поверх журнала и снимков (вместо
+# SQLite): загрузка чатов из снимка, восстановление хвоста, снимок раз в
+# snapshot_every событий и при остановке.
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+
+from profiles import aggregate
+from storage import game_from_data, game_to_data
+from records import Balance, StatLine
+
+(NAME, NEWGAME, JOIN, BET, DEAL, HIT, STAND, SETTLE,
+ REMATCH, CANCEL, EXPIRE, BALANCE) = range(1, 13)
+
+KIND_NAMES = {
+    NAME: "name", NEWGAME: "newgame", JOIN: "join", BET: "bet", DEAL: "deal",
+    HIT: "hit", STAND: "stand", SETTLE: "settle", REMATCH: "rematch",
+    CANCEL: "cancel", EXPIRE: "expire", BALANCE: "balance",
+}
+
+EVENT = struct.Struct("<BdqqiH")
+
+# бит в arg события NEWGAME: стол против дилера
+WITH_DEALER = 1 << 15
+
+def pack_shoe(decks: int, penetration: float) -> int:
+    """Параметры башмака в arg события NEWGAME: колоды и подрезка в промилле."""
+    return decks << 16 | round(penetration * 1000)
+
+def unpack_shoe(arg: int):
+    return arg >> 16, (arg & 0x7FFF) / 1000
+
+# ===== ЖУРНАЛ =====
+
+class EventLog:
+    """Файл, в который события только дописываются.
+
+    Каждая запись уходит в ОС сразу (os.write), так что падение процесса
+    её не теряет; sync() – fsync для падения машины.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.offset = os.fstat(self._fd).st_size
+        self.appended = 0
+
+    def append(self, kind, chat_id, key=0, arg=0, payload=b"", ts=None):
+        data = EVENT.pack(kind, time.time() if ts is None else ts, chat_id, key, arg, len(payload)) + payload
+        os.write(self._fd, data)
+        self.offset += len(data)
+        self.appended += 1
+
+    def truncate(self, offset: int):
+        """Отрезать недописанный хвост (после падения посреди записи)."""
+        if offset < self.offset:
+            os.ftruncate(self._fd, offset)
+            self.offset = offset
+
+    def sync(self):
+        os.fsync(self._fd)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+def read_events(path: str, start: int = 0):
+    """События журнала с позиции start: (конец записи, kind, ts, chat_id, key, arg, payload).
+
+    Обрезанная последняя запись (процесс упал посреди write) пропускается.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= start:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            head = EVENT.size
+            unpack = EVENT.unpack_from
+            while pos + head <= size:
+                kind, ts, chat_id, key, arg, n = unpack(mm, pos)
+                end = pos + head + n
+                if end > size:
+                    break
+                payload = mm[pos + head:end] if n else b""
+                pos = end
+                yield end, kind, ts, chat_id, key, arg, payload
+
+# ===== СНИМОК =====
+
+# magic, длина JSON общей таблицы лидеров, позиция журнала, число чатов,
+# время, число игроков
+SNAP_HEADER = struct.Struct("<4sIQQdQ")
+SNAP_MAGIC = b"BJS2"
+
+def chat_blob(game, stats, balances) -> bytes:
+    """JSON одного чата в снимке; None-таблицы не пишутся."""
+    data = {}
+    if game is not None:
+        data["g"] = game_to_data(game)
+    if stats:
+        data["s"] = [[uid, r.name, r.wins, r.losses, r.draws, r.busts] for uid, r in stats.items()]
+    if balances:
+        data["b"] = [[uid, r.name, r.balance] for uid, r in balances.items()]
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+def profile_blob(row) -> bytes:
+    """JSON профиля игрока: строка profiles.Profile.row() без user_id."""
+    return json.dumps(row[1:], ensure_ascii=False, separators=(",", ":")).encode()
+
+def _write_index(f, blobs):
+    offsets, pos = [], 0
+    for _, blob in blobs:
+        offsets.append(pos)
+        pos += len(blob)
+    n = len(blobs)
+    f.write(struct.pack(f"<{n}q", *[key for key, _ in blobs]))
+    f.write(struct.pack(f"<{n}Q", *offsets))
+    f.write(struct.pack(f"<{n}I", *[len(blob) for _, blob in blobs]))
+    return pos
+
+def write_snapshot(path, log_offset, blobs, world, users=()):
+    """blobs – [(chat_id, bytes)] по возрастанию chat_id, world – [(user_id, имя, победы)],
+    users – [(user_id, bytes)] профилей по возрастанию user_id."""
+    world_json = json.dumps(world, ensure_ascii=False, separators=(",", ":")).encode()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAP_HEADER.pack(SNAP_MAGIC, len(world_json), log_offset, len(blobs), time.time(), len(users)))
+        _write_index(f, blobs)
+        _write_index(f, users)
+        f.write(world_json)
+        for _, blob in blobs:
+            f.write(blob)
+        for _, blob in users:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _merged(fresh, old_keys, old_raw):
+    """[(ключ, bytes)] по возрастанию ключа: fresh поверх старого снимка, b"{}" – удалить."""
+    keys = set(fresh)
+    keys.update(old_keys)
+    out = []
+    for key in sorted(keys):
+        blob = fresh.get(key)
+        if blob is None:
+            blob = bytes(old_raw(key))
+        if blob != b"{}":
+            out.append((key, blob))
+    return out
+
+def _game_times(snap):
+    """(chat_id, last_active) игр снимка; разбираются только чаты с игрой."""
+    out = []
+    for chat_id in snap.chat_ids:
+        raw = snap.raw(chat_id)
+        if b'"g":' in raw:
+            out.append((chat_id, json.loads(raw)["g"].get("last_active", 0.0)))
+    return out
+
+class _Index:
+    """Отсортированный индекс ключ -> (смещение, длина) внутри снимка."""
+
+    def __init__(self, view, pos, n):
+        self.keys = view[pos:pos + 8 * n].cast("q")
+        pos += 8 * n
+        self.offsets = view[pos:pos + 8 * n].cast("Q")
+        pos += 8 * n
+        self.lengths = view[pos:pos + 4 * n].cast("I")
+        self.end = pos + 4 * n
+        self.base = 0      # где в файле начинаются данные
+
+    def raw(self, mm, key):
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        start = self.base + self.offsets[i]
+        return mm[start:start + self.lengths[i]]
+
+    def size(self):
+        n = len(self.keys)
+        return self.offsets[n - 1] + self.lengths[n - 1] if n else 0
+
+    def release(self):
+        self.keys.release()
+        self.offsets.release()
+        self.lengths.release()
+
+class Snapshot:
+    """Снимок, отображённый в память; чаты и профили разбираются по запросу."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, world_len, self.log_offset, n, self.ts, users = SNAP_HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            self._mm.close()
+            raise
+        if magic != SNAP_MAGIC:
+            # снимок старого формата не читается: журнал повторяется с начала
+            self._mm.close()
+            raise ValueError(f"{path}: не снимок")
+        view = memoryview(self._mm)
+        self._chats = _Index(view, SNAP_HEADER.size, n)
+        self._users = _Index(view, self._chats.end, users)
+        self.chat_ids = self._chats.keys
+        self.user_ids = self._users.keys
+        self._world = (self._users.end, world_len)
+        self._chats.base = self._users.end + world_len
+        self._users.base = self._chats.base + self._chats.size()
+        self._cached = (None, None)
+
+    @classmethod
+    def open(cls, path):
+        try:
+            return cls(path)
+        except (FileNotFoundError, ValueError, struct.error):
+            return None
+
+    def __len__(self):
+        return len(self.chat_ids)
+
+    def raw(self, chat_id):
+        return self._chats.raw(self._mm, chat_id)
+
+    def chat(self, chat_id):
+        # три загрузчика подряд спрашивают один и тот же чат
+        if self._cached[0] == chat_id:
+            return self._cached[1]
+        raw = self.raw(chat_id)
+        data = None if raw is None else json.loads(raw)
+        self._cached = (chat_id, data)
+        return data
+
+    def user_raw(self, user_id):
+        return self._users.raw(self._mm, user_id)
+
+    def profile(self, user_id):
+        """Строка профиля без user_id (как profiles.Profile.row()) или None."""
+        raw = self.user_raw(user_id)
+        return None if raw is None else json.loads(raw)
+
+    def world(self):
+        pos, n = self._world
+        return [tuple(row) for row in json.loads(self._mm[pos:pos + n])]
+
+    def close(self):
+        self._chats.release()
+        self._users.release()
+        self._cached = (None, None)
+        self._mm.close()
+
+# ===== ХРАНИЛИЩЕ =====
+
+class EventStore:
+    """Хранилище движка на журнале событий и снимках (интерфейс как у Storage)."""
+
+    def __init__(self, log_path, snapshot_path, snapshot_every=100000, flush_interval=2.0):
+        self.log = EventLog(log_path)
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self.snap = Snapshot.open(snapshot_path)
+        self.engine = None
+        # log.appended на момент последнего снимка (за вычетом хвоста из recover())
+        self._snapshot_at = 0
+        self._dropped = set()        # игры, удалённые после снимка
+        self._snapshotting = asyncio.Lock()
+        self._wake = None
+        self._stopping = False
+
+    # --- загрузка чатов из снимка ---
+
+    def _part(self, chat_id, key):
+        if self.snap is None:
+            return None
+        data = self.snap.chat(chat_id)
+        return None if data is None else data.get(key)
+
+    def load_stats(self, chat_id):
+        rows = self._part(chat_id, "s")
+        if not rows:
+            return None
+        return {uid: StatLine(name, w, l, d, b) for uid, name, w, l, d, b in rows}
+
+    def load_balances(self, chat_id):
+        rows = self._part(chat_id, "b")
+        if not rows:
+            return None
+        return {uid: Balance(name, bal) for uid, name, bal in rows}
+
+    def load_game(self, chat_id):
+        # в снимке игра ещё есть, но её уже закрыли
+        if chat_id in self._dropped:
+            return None
+        data = self._part(chat_id, "g")
+        return None if data is None else game_from_data(data)
+
+    def load_total_wins(self):
+        return [] if self.snap is None else self.snap.world()
+
+    def load_profile(self, user_id, start_balance):
+        return None if self.snap is None else self.snap.profile(user_id)
+
+    def load_profiles(self, start_balance):
+        """Профили заново по записям всех чатов снимка одним проходом (строки ProfileIndex.seed)."""
+        snap = self.snap
+        if snap is None:
+            return []
+
+        def records():
+            for chat_id in snap.chat_ids:
+                data = json.loads(snap.raw(chat_id))
+                for uid, name, wins, losses, draws, busts in data.get("s", ()):
+                    yield chat_id, uid, name, wins, losses, draws, busts, None
+                for uid, name, balance in data.get("b", ()):
+                    yield chat_id, uid, name, 0, 0, 0, 0, balance
+
+        return aggregate(records(), start_balance)
+
+    async def load_game_times(self):
+        """(chat_id, last_active) игр снимка – сроки истечения при старте."""
+        # под замком: снимок не сменится и не закроется, пока его читает поток
+        async with self._snapshotting:
+            if self.snap is None:
+                return []
+            return await asyncio.to_thread(_game_times, self.snap)
+
+    # состояние пишется событиями движка, пометки не нужны
+    def mark_stats(self, chat_id, user_id, record):
+        pass
+
+    mark_balance = mark_stats
+
+    def mark_game(self, chat_id, game):
+        pass
+
+    def mark_seeded(self, count):
+        pass
+
+    def load_seeded(self):
+        # отдельного счётчика нет: позиция журнала после recover() растёт с
+        # каждой игрой (NEWGAME), Engine.game_seed подмешивает её к номеру
+        return self.log.offset
+
+    def drop_game(self, chat_id):
+        self._dropped.add(chat_id)
+
+    # --- восстановление и снимки ---
+
+    def recover(self, engine):
+        """Повторить хвост журнала после снимка через движок. Возвращает число событий."""
+        self.engine = engine
+        start = 0 if self.snap is None else self.snap.log_offset
+        end = start
+        count = 0
+
+        def tail():
+            nonlocal end, count
+            for event in read_events(self.log.path, start):
+                end = event[0]
+                count += 1
+                yield event
+
+        engine.replay(tail())
+        # недописанная запись в конце журнала – отрезаем, чтобы дописывать после целых
+        self.log.truncate(end)
+        # повторённый хвост считается к порогу снимка, как новые события:
+        # иначе после падения его повторял бы и следующий старт
+        self._snapshot_at = self.log.appended - count
+        return count
+
+    def snapshot(self):
+        """Записать снимок текущего состояния на текущую позицию журнала."""
+        state = self._capture()
+        self._write(state)
+        self._install(state)
+
+    def _capture(self):
+        """Состояние для снимка – в event loop, пока его не меняют.
+
+        Кодируются только чаты и профили в памяти и закрытые игры: всё
+        остальное не менялось с прошлого снимка, и _write() копирует его
+        байты оттуда.
+        """
+        engine = self.engine
+        games, stats, balances = engine.games, engine.stats, engine.balances
+        chat_ids = set(games) | set(stats) | set(balances) | self._dropped
+        # таблицы чата, которых нет в памяти, берутся через ленивую загрузку;
+        # b"{}" – чата больше нет
+        chats = {
+            chat_id: chat_blob(games.get(chat_id), stats.get(chat_id), balances.get(chat_id))
+            for chat_id in chat_ids
+        }
+        users = {uid: profile_blob(p.row(uid)) for uid, p in dict.items(engine.profiles.users)}
+        state = (self.snap, self.log.offset, self.log.appended, set(self._dropped),
+                 chats, engine.leaders.world.rows(), users)
+        # хвост после снимка должен сам называть имена игроков
+        engine.forget_logged_names()
+        return state
+
+    def _write(self, state):
+        """Слияние со старым снимком, запись файла и fsync журнала – можно в потоке."""
+        old, offset, _, _, chats, world, users = state
+        if old is None:
+            blobs, profiles = _merged(chats, (), None), _merged(users, (), None)
+        else:
+            blobs = _merged(chats, old.chat_ids, old.raw)
+            profiles = _merged(users, old.user_ids, old.user_raw)
+        write_snapshot(self.snapshot_path, offset, blobs, world, profiles)
+        self.log.sync()
+
+    def _install(self, state):
+        old, _, appended, dropped, *_ = state
+        if old is not None:
+            old.close()
+        self.snap = Snapshot(self.snapshot_path)
+        # закрытые уже после _capture() игры в новом снимке ещё есть
+        self._dropped -= dropped
+        self._snapshot_at = appended
+
+    async def flush(self):
+        """Снимок сейчас; копия и запись – в потоке (на 100k чатов это секунды)."""
+        async with self._snapshotting:
+            state = self._capture()
+            await asyncio.to_thread(self._write, state)
+            self._install(state)
+
+    async def run(self):
+        """Фоновый цикл: fsync журнала и снимок раз в snapshot_every событий."""
+        self._wake = asyncio.Event()
+        self._stopping = False
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.engine is not None and self.log.appended - self._snapshot_at >= self.snapshot_every:
+                try:
+                    await self.flush()
+                except Exception as exc:
+                    # старый снимок и журнал целы, попробуем на следующем шаге
+                    print(f"eventlog: снимок не записан: {exc!r}")
+            else:
+                await asyncio.to_thread(self.log.sync)
+        self._wake = None
+
+    def stop(self):
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def close(self):
+        # снимок при остановке – следующий старт без повтора журнала
+        if self.engine is not None and self.log.appended != self._snapshot_at:
+            self.snapshot()
+        self.log.close()
+        if self.snap is not None:
+            self.snap.close()
+            self.snap = None
@@ -0,0 +1,19 @@
+# ===== GCRA =====
+#
+# Лимит rate событий в секунду с запасом burst: хранится одно число –
+# «теоретическое время прибытия» следующего события (tat). Событие
+# занимает место, сдвигая tat на интервал 1/rate; пришедшее раньше, чем
+# tat минус запас, ждёт разницу. Все лимиты бота считаются так: общий и
+# по чатам в очереди исходящих (outbox.Outbox) и общий на процессы
+# shard.SharedRateLimiter, где tat лежит в общей памяти.
+
+def params(rate, burst):
+    """(интервал, запас) для rate событий в секунду с запасом burst; rate 0 – без лимита."""
+    if not rate:
+        return 0.0, 0.0
+    return 1.0 / rate, (burst - 1) / rate
+
+def reserve(tat, now, interval, tolerance):
+    """Занять место под событие: (новый tat, сколько секунд ждать)."""
+    start = max(tat, now)
+    return start + interval, max(0.0, start - tolerance - now)
@@ -0,0 +1,33 @@
+# ===== ЛЕНИВЫЙ ИМПОРТ =====
+#
+# Тяжёлые модули (NumPy – около 90 мс, python-telegram-bot с httpx –
+# около 250 мс) нужны не с первой миллисекунды: NumPy – к первой тасовке,
+# PTB – когда строится приложение. lazy_import() отдаёт модуль-заместитель,
+# настоящий импорт идёт при первом обращении к атрибуту. Импорт – обычный
+# importlib.import_module, с его блокировками, так что первое обращение
+# может случиться и в потоке (odds считается в asyncio.to_thread).
+# Модуль, которого нет, – None, как в привычном try: import ... except
+# ImportError.
+
+import importlib
+import importlib.util
+import types
+
+class LazyModule(types.ModuleType):
+    def __getattr__(self, attr):
+        # сюда попадаем, только пока атрибуты модуля не скопированы
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+def lazy_import(name):
+    """Модуль name, загружаемый при первом обращении к атрибуту, или None."""
+    if importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
+
+def load(module):
+    """Загрузить ленивый модуль сейчас (например, в потоке, пока loop занят другим)."""
+    if isinstance(module, LazyModule):
+        module.__getattr__("__name__")
+    return module
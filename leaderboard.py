@@ -0,0 +1,99 @@
+# ===== ТАБЛИЦА ЛИДЕРОВ =====
+#
+# Вместо сортировки всех игроков чата на каждый /top держим уже
+# отсортированный список (-wins, seq, user_id) и обновляем его при каждой
+# победе: bisect находит старую запись, insort вставляет новую.
+# /top читает первые K элементов.
+
+from bisect import bisect_left, insort
+
+class Leaderboard:
+    def __init__(self):
+        self._wins = {}     # user_id -> победы
+        self._names = {}    # user_id -> имя
+        self._seq = {}      # user_id -> порядок появления (для равных побед)
+        self._sorted = []   # (-wins, seq, user_id), по возрастанию
+
+    def update(self, user_id, name, wins):
+        self._names[user_id] = name
+        old = self._wins.get(user_id)
+        if old == wins:
+            return
+        if old is None:
+            self._seq[user_id] = len(self._seq)
+        else:
+            i = bisect_left(self._sorted, (-old, self._seq[user_id], user_id))
+            del self._sorted[i]
+        self._wins[user_id] = wins
+        insort(self._sorted, (-wins, self._seq[user_id], user_id))
+
+    def add_win(self, user_id, name):
+        self.update(user_id, name, self._wins.get(user_id, 0) + 1)
+
+    def fill(self, rows):
+        """Заполнить пустую таблицу строками (user_id, имя, победы) одной сортировкой."""
+        for user_id, name, wins in rows:
+            self._names[user_id] = name
+            self._wins[user_id] = wins
+            self._seq[user_id] = len(self._seq)
+        self._sorted = sorted((-wins, self._seq[uid], uid) for uid, wins in self._wins.items())
+
+    def top(self, k=10):
+        """[(имя, победы), ...] первых k игроков."""
+        return [(self._names[uid], -neg) for neg, _, uid in self._sorted[:k]]
+
+    def rows(self):
+        """[(user_id, имя, победы), ...] в порядке таблицы – в формате seed()."""
+        return [(uid, self._names[uid], -neg) for neg, _, uid in self._sorted]
+
+    def __len__(self):
+        return len(self._sorted)
+
+class LeaderboardIndex:
+    """Таблицы лидеров по чатам плюс общая по всем чатам.
+
+    Таблица чата строится один раз из stats[chat_id] при первом /top и
+    дальше поддерживается через touch()/win(). Общая таблица суммирует
+    победы пользователя по всем чатам и строится при первом обращении
+    из world_loader() -> [(user_id, имя, победы)] (или seed), в неё
+    попадают только игроки хотя бы с одной победой. До того win() её не
+    трогает: загрузчик отдаёт уже текущие суммы.
+    """
+
+    def __init__(self, world_loader=None):
+        self.chats = {}
+        self._world = None
+        self._world_loader = world_loader
+
+    @property
+    def world(self):
+        if self._world is None:
+            self.seed(self._world_loader() if self._world_loader is not None else ())
+        return self._world
+
+    def seed(self, rows):
+        self._world = Leaderboard()
+        self._world.fill(rows)
+
+    def refresh(self):
+        """Забыть общую таблицу: следующее обращение построит её заново."""
+        self._world = None
+
+    def chat(self, chat_id, records):
+        board = self.chats.get(chat_id)
+        if board is None:
+            board = Leaderboard()
+            for uid, rec in records.items():
+                board.update(uid, rec.name, rec.wins)
+            self.chats[chat_id] = board
+        return board
+
+    def touch(self, chat_id, user_id, record):
+        board = self.chats.get(chat_id)
+        if board is not None:
+            board.update(user_id, record.name, record.wins)
+
+    def win(self, chat_id, user_id, record):
+        self.touch(chat_id, user_id, record)
+        if self._world is not None:
+            self._world.add_win(user_id, record.name)
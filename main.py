@@ -1,583 +1,309 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-import random
+import asyncio
 import os
+import secrets
+import signal
+
+import lazy
+import metrics
+import shard
+from engine import Engine
+from webhook import WebhookServer
+from solver import HintTable
+from storage import Storage
+from eventlog import EventStore
+from outbox import Outbox
+from tournament import TournamentScheduler
+
+# python-telegram-bot (adapter.py) грузится при первом обращении: вебхук
+# открывается раньше, а фронт шардов и воркеры не платят за лишнее
+adapter = lazy.lazy_import("adapter")
+
 # ⛔ ТВОЙ ТОКЕН ОТ BotFather
 TOKEN = os.environ.get("BOT_TOKEN") or os.environ["TELEGRAM_BOT_TOKEN"]
 
 # ===== ДАННЫЕ ИГР, СТАТЫ И БАЛАНСОВ =====
 
-# games[chat_id] = {
-#   'players': {user_id: {'name','hand','stand','busted','bet'}},
-#   'order': [user_id1, user_id2],
-#   'turn': int,
-#   'started': bool,
-#   'finished': bool,
-# }
-games = {}
-
-# stats[chat_id][user_id] = {'name','wins','losses','draws','busts'}
-stats = {}
-
-# balances[chat_id][user_id] = {'name','balance'}
-balances = {}
-START_BALANCE = 1000
-
-# Визуальные карты Unicode
-cards = [
-    "🂡","🂢","🂣","🂤","🂥","🂦","🂧","🂨","🂩","🂪","🂫","🂭","🂮",  # ♠
-    "🂱","🂲","🂳","🂴","🂵","🂶","🂷","🂸","🂹","🂺","🂻","🂽","🂾",  # ♥
-    "🃁","🃂","🃃","🃄","🃅","🃆","🃇","🃈","🃉","🃊","🃋","🃍","🃎",  # ♦
-    "🃑","🃒","🃓","🃔","🃕","🃖","🃗","🃘","🃙","🃚","🃛","🃝","🃞"   # ♣
-]
-
-# ===== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =====
-
-def card_value(card: str) -> int:
-    idx = cards.index(card) % 13 + 1
-    if idx == 1:
-        return 11          # туз
-    if idx > 10:
-        return 10          # J Q K
-    return idx             # 2–10
-
-def score(hand):
-    total = sum(card_value(c) for c in hand)
-    aces = sum(1 for c in hand if card_value(c) == 11)
-    while total > 21 and aces > 0:
-        total -= 10
-        aces -= 1
-    return total
-
-def draw_card():
-    return random.choice(cards)
-
-def keyboard():
-    return InlineKeyboardMarkup(
-        [[InlineKeyboardButton("Hit 🃏", callback_data="hit"),
-          InlineKeyboardButton("Stand ✋", callback_data="stand")]]
-    )
-
-def ensure_stats(chat_id, user_id, name):
-    if chat_id not in stats:
-        stats[chat_id] = {}
-    if user_id not in stats[chat_id]:
-        stats[chat_id][user_id] = {
-            "name": name,
-            "wins": 0,
-            "losses": 0,
-            "draws": 0,
-            "busts": 0,
-        }
-    else:
-        stats[chat_id][user_id]["name"] = name
-
-def ensure_balance(chat_id, user_id, name):
-    if chat_id not in balances:
-        balances[chat_id] = {}
-    if user_id not in balances[chat_id]:
-        balances[chat_id][user_id] = {
-            "name": name,
-            "balance": START_BALANCE,
-        }
-    else:
-        balances[chat_id][user_id]["name"] = name
-
-def format_game_state(game):
-    lines = []
-    for uid in game["order"]:
-        p = game["players"][uid]
-        s = score(p["hand"]) if p["hand"] else 0
-        status = ""
-        if p["busted"]:
-            status = " (перебор 💥)"
-        elif p["stand"]:
-            status = " (стоит)"
-        bet_info = f", ставка: {p['bet']}" if p["bet"] else ""
-        cards_str = " ".join(p["hand"]) if p["hand"] else "—"
-        lines.append(f"{p['name']}: {cards_str} = {s}{status}{bet_info}")
-    return "\n".join(lines)
-
-async def show_turn(chat_id: int, context: ContextTypes.DEFAULT_TYPE):
-    game = games[chat_id]
-    turn_idx = game["turn"]
-    current_id = game["order"][turn_idx]
-    current_player = game["players"][current_id]
-
-    text = (
-        "Текущее состояние игры:\n\n"
-        f"{format_game_state(game)}\n\n"
-        f"Сейчас ход: {current_player['name']}"
-    )
-    await context.bot.send_message(chat_id, text, reply_markup=keyboard())
-
-def all_players_done(game):
-    for uid in game["order"]:
-        p = game["players"][uid]
-        if not p["stand"] and not p["busted"]:
-            return False
-    return True
-
-# ===== КОМАНДЫ =====
-
-async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "Привет! Я бот Блэкджек 🎰\n\n"
-        "Формат: 1 на 1, максимум 2 игрока, без дилера.\n\n"
-        "Команды:\n"
-        "/newgame – создать новую игру\n"
-        "/join – присоединиться (до 2 игроков)\n"
-        "/bet N – поставить N фишек\n"
-        "/startgame – начать игру\n"
-        "/rematch – реванш теми же игроками\n"
-        "/status – показать текущие карты\n"
-        "/balance – твой баланс фишек\n"
-        "/stats – твоя статистика\n"
-        "/top – топ игроков по победам\n"
-        "/cancel – отменить игру"
-    )
-
-async def cmd_newgame(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-
-    games[chat_id] = {
-        "players": {},   # user_id -> { 'name','hand','stand','busted','bet' }
-        "order": [],
-        "turn": 0,
-        "started": False,
-        "finished": False,
-    }
-    await update.message.reply_text(
-        "Создана новая игра!\n"
-        "Игроки могут присоединиться командой /join (максимум 2).\n"
-        "Потом ставьте /bet и запускайте /startgame."
-    )
-
-async def cmd_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    user = update.effective_user
-    user_id = user.id
-
-    if chat_id not in games:
-        await update.message.reply_text("Сначала создайте игру командой /newgame.")
-        return
-
-    game = games[chat_id]
-
-    if game["started"]:
-        await update.message.reply_text("Игра уже началась, присоединиться нельзя.")
-        return
-
-    if user_id in game["players"]:
-        await update.message.reply_text("Ты уже участвуешь в этой игре.")
-        return
-
-    if len(game["players"]) >= 2:
-        await update.message.reply_text("В этой игре уже 2 игрока, мест нет.")
-        return
-
-    game["players"][user_id] = {
-        "name": user.first_name,
-        "hand": [],
-        "stand": False,
-        "busted": False,
-        "bet": 0,
-    }
-    game["order"].append(user_id)
-
-    ensure_stats(chat_id, user_id, user.first_name)
-    ensure_balance(chat_id, user_id, user.first_name)
-    bal = balances[chat_id][user_id]["balance"]
-
-    await update.message.reply_text(
-        f"{user.first_name} присоединился к игре!\nБаланс: 💰 {bal} фишек.\n"
-        "Сделай ставку /bet N (например, /bet 50)."
-    )
-
-    if len(game["players"]) == 2:
-        await update.message.reply_text("2 игрока в игре. Не забудьте поставить /bet и потом /startgame.")
-
-async def cmd_bet(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    user = update.effective_user
-    user_id = user.id
-
-    if chat_id not in games:
-        await update.message.reply_text("Сначала создайте игру /newgame.")
-        return
-    game = games[chat_id]
-
-    if user_id not in game["players"]:
-        await update.message.reply_text("Сначала присоединись к игре /join.")
-        return
-
-    if game["started"]:
-        await update.message.reply_text("Игра уже началась, ставку менять нельзя.")
-        return
-
-    if not context.args:
-        await update.message.reply_text("Использование: /bet N\nНапример: /bet 50")
-        return
-
-    try:
-        amount = int(context.args[0])
-    except ValueError:
-        await update.message.reply_text("Ставка должна быть целым числом.")
-        return
-
-    if amount <= 0:
-        await update.message.reply_text("Ставка должна быть > 0.")
-        return
-
-    ensure_balance(chat_id, user_id, user.first_name)
-    bal = balances[chat_id][user_id]["balance"]
-
-    if amount > bal:
-        await update.message.reply_text(f"У тебя нет столько фишек. Баланс: {bal}.")
-        return
-
-    game["players"][user_id]["bet"] = amount
-    await update.message.reply_text(
-        f"Ставка {amount} фишек установлена для {user.first_name}."
+# По умолчанию все три таблицы лежат в SQLite (storage.py): чат подгружается
+# при первом обращении, изменения помечаются движком и пишутся на диск
+# пачками в фоне. STORAGE=events – журнал событий и снимки (eventlog.py):
+# старт – mmap снимка и повтор хвоста журнала.
+DB_PATH = os.environ.get("DB_PATH", "blackjack.db")
+STORAGE = os.environ.get("STORAGE", "sqlite")
+
+def open_storage(suffix=""):
+    if STORAGE == "events":
+        return EventStore(
+            os.environ.get("EVENT_LOG", "blackjack.events") + suffix,
+            os.environ.get("SNAPSHOT_PATH", "blackjack.snapshot") + suffix,
+            snapshot_every=int(os.environ.get("SNAPSHOT_EVERY", "100000")),
+            flush_interval=float(os.environ.get("DB_FLUSH_INTERVAL", "2")),
+        )
+    return Storage(
+        DB_PATH,
+        flush_interval=float(os.environ.get("DB_FLUSH_INTERVAL", "2")),
+        flush_size=int(os.environ.get("DB_FLUSH_SIZE", "500")),
     )
 
-async def cmd_startgame(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
+db = open_storage()
 
-    if chat_id not in games:
-        await update.message.reply_text("Сначала создайте игру командой /newgame.")
-        return
+# точная таблица для /hint: грузится из файла или считается на старте
+HINT_TABLE = os.environ.get("HINT_TABLE", "hint_table.bin")
 
-    game = games[chat_id]
+# игровой движок (engine.py), создаётся в on_startup, когда есть app.bot
+engine = None
 
-    if game["started"]:
-        await update.message.reply_text("Игра уже началась.")
-        return
+# METRICS_PORT – отдавать /metrics (Prometheus) на METRICS_LISTEN:METRICS_PORT,
+# PROFILER=1 – ещё и /debug/profile с сэмплирующим профайлером
+METRICS_PORT = os.environ.get("METRICS_PORT")
 
-    if len(game["players"]) < 2:
-        await update.message.reply_text("Для игры нужно 2 игрока. Пусть второй сделает /join.")
-        return
+# общий лимит исходящих запросов к Bot API (в секунду и запас), 0 – без лимита
+BOT_RATE_LIMIT = float(os.environ.get("BOT_RATE_LIMIT", "30"))
+BOT_RATE_BURST = int(os.environ.get("BOT_RATE_BURST", "30"))
 
-    # Проверяем ставки и списываем фишки
-    for uid, p in game["players"].items():
-        ensure_balance(chat_id, uid, p["name"])
-        bal = balances[chat_id][uid]["balance"]
-        bet = p["bet"] or 10  # если игрок не сделал /bet – ставка по умолчанию 10
-        if bet > bal:
-            await update.message.reply_text(
-                f"{p['name']} не хватает фишек на ставку {bet}. Баланс: {bal}."
-            )
-            return
-
-    for uid, p in game["players"].items():
-        bet = p["bet"] or 10
-        p["bet"] = bet
-        balances[chat_id][uid]["balance"] -= bet
-        p["hand"] = [draw_card(), draw_card()]
-        p["stand"] = False
-        p["busted"] = False
-
-    game["started"] = True
-    game["finished"] = False
-    game["turn"] = 0
-
-    await update.message.reply_text("Игра началась! Раздаю карты 👇")
-    await show_turn(chat_id, context)
-
-async def cmd_rematch(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-
-    if chat_id not in games:
-        await update.message.reply_text("Ещё не было игры. Используй /newgame.")
-        return
+# лимит на чат для очереди исходящих: в группе – сообщений в минуту
+GROUP_RATE_LIMIT = float(os.environ.get("GROUP_RATE_LIMIT", "20"))
 
-    game = games[chat_id]
+# очередь исходящих (outbox.Outbox), создаётся при старте
+outbox = None
 
-    if not game["finished"]:
-        await update.message.reply_text("Текущая игра ещё не окончена. Доиграйте или /cancel.")
-        return
+# в воркере шарда – общий на все процессы лимит (shard.SharedRateLimiter):
+# тогда общий лимит бота очередь берёт из него
+shared_limiter = None
 
-    if len(game["players"]) != 2:
-        await update.message.reply_text("Для реванша нужно, чтобы было 2 игрока.")
-        return
+# процесс – воркер шарда (SHARDS=N): в его памяти только его чаты
+sharded = False
 
-    for uid, p in game["players"].items():
-        p["hand"] = []
-        p["stand"] = False
-        p["busted"] = False
-        # ставка остаётся, можно изменить /bet перед /startgame
+# апдейтов в обработке одновременно (разные чаты)
+MAX_CONCURRENT_UPDATES = int(os.environ.get("MAX_CONCURRENT_UPDATES", "256"))
 
-    game["started"] = False
-    game["finished"] = False
+# ===== ЗАПУСК =====
 
-    await update.message.reply_text(
-        "Реванш! Игроки те же.\n"
-        "Можете поменять ставки /bet и снова запустить /startgame."
+async def on_startup(app):
+    global engine, outbox
+    outbox = Outbox(
+        rate=BOT_RATE_LIMIT,
+        burst=BOT_RATE_BURST,
+        limiter=shared_limiter,
+        group_rate=GROUP_RATE_LIMIT / 60,
+        concurrency=int(os.environ.get("OUTBOX_CONCURRENCY", "64")),
+        retry_after=adapter.flood_wait,
     )
-
-async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-
-    if chat_id not in games or not games[chat_id]["started"]:
-        await update.message.reply_text("Сейчас нет активной игры. /newgame чтобы создать.")
-        return
-
-    game = games[chat_id]
-    text = format_game_state(game)
-    await update.message.reply_text(text)
-
-async def cmd_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-
-    if chat_id not in games:
-        await update.message.reply_text("Игра не найдена.")
-        return
-
-    del games[chat_id]
-    await update.message.reply_text("Игра отменена.")
-
-async def cmd_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    user = update.effective_user
-    user_id = user.id
-
-    ensure_balance(chat_id, user_id, user.first_name)
-    bal = balances[chat_id][user_id]["balance"]
-    await update.message.reply_text(f"Твой баланс в этом чате: 💰 {bal} фишек.")
-
-async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    user = update.effective_user
-    user_id = user.id
-
-    if chat_id not in stats or user_id not in stats[chat_id]:
-        await update.message.reply_text("У тебя пока нет статистики в этом чате. Сыграй пару игр!")
-        return
-
-    s = stats[chat_id][user_id]
-    await update.message.reply_text(
-        f"Статистика {s['name']} в этом чате:\n"
-        f"🏆 Победы: {s['wins']}\n"
-        f"😔 Поражения: {s['losses']}\n"
-        f"🤝 Ничьи: {s['draws']}\n"
-        f"💥 Переборы: {s['busts']}"
+    outbox.start()
+    cross_chat = "memory"
+    if sharded:
+        # в памяти воркера только его чаты: /me и /top all – из общей SQLite,
+        # а у журналов событий общей базы нет
+        cross_chat = None if STORAGE == "events" else "db"
+    engine = Engine(
+        db,
+        adapter.TelegramBot(app.bot, outbox),
+        table_delay=float(os.environ.get("TABLE_DEBOUNCE", "0.3")),
+        # башмак: число колод, подрезка и общий seed для воспроизводимых игр
+        shoe_decks=int(os.environ.get("SHOE_DECKS", "6")),
+        shoe_penetration=float(os.environ.get("SHOE_PENETRATION", "0.75")),
+        shoe_seed=os.environ.get("SHOE_SEED"),
+        # ODDS_IN_TURN=1 – добавлять строку с шансами к каждому ходу
+        odds_in_turn=os.environ.get("ODDS_IN_TURN") == "1",
+        hints=HintTable.load_or_build(HINT_TABLE),
+        # GAME_TTL – закрывать игры без ходов дольше стольких секунд (0 – никогда)
+        game_ttl=float(os.environ.get("GAME_TTL", "3600")),
+        expiry_interval=float(os.environ.get("GAME_EXPIRY_INTERVAL", "60")),
+        # мест за столом (до 7 по умолчанию)
+        max_players=int(os.environ.get("MAX_PLAYERS", "7")),
+        # TURN_TIMEOUT – секунд на ход, потом автоматический Stand (0 – ждать вечно)
+        turn_timeout=float(os.environ.get("TURN_TIMEOUT", "60")),
+        log=db.log if isinstance(db, EventStore) else None,
+        cross_chat=cross_chat,
+        # турниры: сколько столов играет одновременно (сообщения – через outbox),
+        # в одном чате – сколько тянет его лимит GROUP_RATE_LIMIT
+        tournament_scheduler=TournamentScheduler(
+            max_tables=int(os.environ.get("TOURNAMENT_TABLES", "32")),
+            chat_rate=GROUP_RATE_LIMIT / 60,
+        ),
     )
-
-async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-
-    if chat_id not in stats or not stats[chat_id]:
-        await update.message.reply_text("В этом чате ещё нет игр. /newgame чтобы начать.")
-        return
-
-    players = list(stats[chat_id].values())
-    players.sort(key=lambda x: x["wins"], reverse=True)
-
-    lines = ["🏆 Топ игроков по победам:"]
-    for i, p in enumerate(players[:10], start=1):
-        lines.append(f"{i}. {p['name']} — {p['wins']} побед")
-
-    await update.message.reply_text("\n".join(lines))
-
-# ===== ЗАВЕРШЕНИЕ ИГРЫ =====
-
-async def finish_game(chat_id: int, context: ContextTypes.DEFAULT_TYPE):
-    game = games[chat_id]
-
-    results = []
-    pot = 0
-
-    for uid in game["order"]:
-        p = game["players"][uid]
-        s = score(p["hand"])
-        busted = s > 21
-        bet = p["bet"]
-        pot += bet
-        results.append((uid, p["name"], s, busted, bet))
-        if busted:
-            ensure_stats(chat_id, uid, p["name"])
-            stats[chat_id][uid]["busts"] += 1
-
-    alive = [r for r in results if not r[3]]  # не перебор
-    state = format_game_state(game)
-    balance_info = ""
-
-    if len(alive) == 0:
-        # оба перебор
-        for uid, name, s, busted, bet in results:
-            ensure_stats(chat_id, uid, name)
-            stats[chat_id][uid]["losses"] += 1
-        result_text = "Оба игрока с перебором 💥\nБанк сгорает, ставки не возвращаются."
-        balance_info = "Баланс учитывает списанные ставки."
-    elif len(alive) == 1:
-        winner = alive[0]
-        winner_id, winner_name, winner_score, _, _ = winner
-        loser = [x for x in results if x[0] != winner_id][0]
-        loser_id, loser_name, loser_score, _, _ = loser
-
-        ensure_stats(chat_id, winner_id, winner_name)
-        ensure_stats(chat_id, loser_id, loser_name)
-        stats[chat_id][winner_id]["wins"] += 1
-        stats[chat_id][loser_id]["losses"] += 1
-
-        ensure_balance(chat_id, winner_id, winner_name)
-        balances[chat_id][winner_id]["balance"] += pot
-
-        result_text = (
-            f"Победитель: {winner_name} с {winner_score} очками! 🎉\n"
-            f"Проиграл: {loser_name} ({loser_score} очков)"
+    await engine.start()
+    if os.environ.get("REBUILD_PROFILES") == "1":
+        # починка: профили /me заново по stats и balances всех чатов
+        print(f"Профилей пересобрано: {await engine.rebuild_profiles()}")
+    engine.register_gauges()
+    handlers = app.bot_data["handlers"]
+    handlers.engine = engine
+    handlers.outbox = outbox
+    if METRICS_PORT:
+        profiler = metrics.SamplingProfiler() if os.environ.get("PROFILER") == "1" else None
+        server = metrics.MetricsServer(
+            host=os.environ.get("METRICS_LISTEN", "127.0.0.1"), port=int(METRICS_PORT), profiler=profiler
         )
-        balance_info = (
-            f"{winner_name} получает банк {pot} фишек.\n"
-            f"Баланс {winner_name}: {balances[chat_id][winner_id]['balance']}\n"
-            f"Баланс {loser_name}: {balances[chat_id][loser_id]['balance']}"
-        )
-    else:
-        a, b = alive[0], alive[1]
-        a_id, a_name, a_score, _, a_bet = a
-        b_id, b_name, b_score, _, b_bet = b
-
-        ensure_stats(chat_id, a_id, a_name)
-        ensure_stats(chat_id, b_id, b_name)
-
-        if a_score == b_score:
-            # ничья
-            stats[chat_id][a_id]["draws"] += 1
-            stats[chat_id][b_id]["draws"] += 1
-            ensure_balance(chat_id, a_id, a_name)
-            ensure_balance(chat_id, b_id, b_name)
-            balances[chat_id][a_id]["balance"] += a_bet
-            balances[chat_id][b_id]["balance"] += b_bet
-            result_text = (
-                f"Ничья! {a_name} и {b_name} оба с {a_score} очками 🤝"
-            )
-            balance_info = (
-                "Ставки возвращены игрокам.\n"
-                f"Баланс {a_name}: {balances[chat_id][a_id]['balance']}\n"
-                f"Баланс {b_name}: {balances[chat_id][b_id]['balance']}"
-            )
-        else:
-            if a_score > b_score:
-                winner_id, winner_name, winner_score = a_id, a_name, a_score
-                loser_id, loser_name, loser_score = b_id, b_name, b_score
-            else:
-                winner_id, winner_name, winner_score = b_id, b_name, b_score
-                loser_id, loser_name, loser_score = a_id, a_name, a_score
-
-            stats[chat_id][winner_id]["wins"] += 1
-            stats[chat_id][loser_id]["losses"] += 1
-
-            ensure_balance(chat_id, winner_id, winner_name)
-            balances[chat_id][winner_id]["balance"] += pot
-
-            result_text = (
-                f"Победитель: {winner_name} с {winner_score} очками! 🎉\n"
-                f"Проиграл: {loser_name} ({loser_score} очков)"
-            )
-            balance_info = (
-                f"{winner_name} получает банк {pot} фишек.\n"
-                f"Баланс {winner_name}: {balances[chat_id][winner_id]['balance']}\n"
-                f"Баланс {loser_name}: {balances[chat_id][loser_id]['balance']}"
-            )
-
-    text = f"Игра окончена!\n\n{state}\n\n{result_text}\n\n{balance_info}"
-    await context.bot.send_message(chat_id, text)
-    game["started"] = False
-    game["finished"] = True
-
-# ===== КНОПКИ (Hit / Stand) =====
-
-async def on_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    chat_id = query.message.chat.id
-    user_id = query.from_user.id
-
-    if chat_id not in games:
-        await query.edit_message_text("Игра уже закончена или не создана. /newgame чтобы начать новую.")
-        return
-
-    game = games[chat_id]
-
-    if not game["started"]:
-        await query.edit_message_text("Игра ещё не началась. Напишите /startgame.")
-        return
-
-    if user_id not in game["players"]:
-        await query.answer("Ты не участвуешь в этой игре.", show_alert=True)
-        return
-
-    # Проверяем очередь
-    current_id = game["order"][game["turn"]]
-    if user_id != current_id:
-        await query.answer("Сейчас ход другого игрока!", show_alert=True)
-        return
+        await server.start()
+        app.bot_data["metrics_server"] = server
+    # фоновая запись грязных записей в SQLite (или fsync журнала и снимки)
+    app.bot_data["db_flusher"] = asyncio.create_task(db.run())
+
+async def on_shutdown(app):
+    server = app.bot_data.pop("metrics_server", None)
+    if server is not None:
+        await server.stop()
+    await engine.stop()
+    await outbox.stop()
+    db.stop()
+    await app.bot_data.pop("db_flusher")
+    db.close()
+
+async def run_webhook():
+    # Порт открывается до загрузки PTB и состояния: апдейты, пришедшие за
+    # время старта, ждут в очереди сервера, а не получают отказ соединения
+    ready = asyncio.Event()
+    app = None
+
+    async def handle(data):
+        if not ready.is_set():
+            await ready.wait()
+        await adapter.process_raw_update(app, data)
+
+    server = webhook_server(handle, MAX_CONCURRENT_UPDATES)
+    stop = stop_event()
+    await server.start()
+    print(f"Вебхук слушает {server.host}:{server.port}{server.path}")
+
+    # импорт PTB и сборка приложения – в потоке, loop тем временем принимает
+    app = await asyncio.to_thread(build_app)
+    async with app:
+        await on_startup(app)
+        await app.start()
+        ready.set()
+        # WEBHOOK_URL – публичный адрес; без него сервер просто слушает локально
+        url = os.environ.get("WEBHOOK_URL")
+        if url:
+            await adapter.set_webhook(app.bot, url, server.secret)
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await app.stop()
+            await on_shutdown(app)
+
+def webhook_server(handle, workers):
+    return WebhookServer(
+        handle,
+        host=os.environ.get("WEBHOOK_LISTEN", "127.0.0.1"),
+        port=int(os.environ.get("WEBHOOK_PORT", "8443")),
+        path=os.environ.get("WEBHOOK_PATH", "/webhook"),
+        # без WEBHOOK_SECRET – случайный на каждый запуск: set_webhook
+        # передаёт его Telegram, чужие POST на вебхук получают 403
+        secret=os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32),
+        queue_size=int(os.environ.get("WEBHOOK_QUEUE_SIZE", "1024")),
+        workers=workers,
+    )
 
-    player = game["players"][user_id]
-
-    if query.data == "hit":
-        player["hand"].append(draw_card())
-        s = score(player["hand"])
-        if s > 21:
-            player["busted"] = True
-            text = (
-                f"{player['name']} взял карту: {player['hand'][-1]}\n"
-                f"{player['name']}: {' '.join(player['hand'])} = {s} (перебор 💥)\n\n"
-                "Ход переходит к следующему игроку."
-            )
-            await query.edit_message_text(text)
+def stop_event():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+# ===== ШАРДИРОВАННЫЙ РЕЖИМ (SHARDS=N) =====
+
+def shard_worker(index, sock, limiter):
+    """Процесс-воркер: бот, который получает апдейты своих чатов от фронта."""
+    global METRICS_PORT, db, shared_limiter, sharded
+    # Ctrl+C ловит фронт; воркер заканчивает, когда фронт закрывает сокет
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if METRICS_PORT:
+        METRICS_PORT = str(int(METRICS_PORT) + 1 + index)
+    if STORAGE == "events":
+        # у каждого шарда свой журнал и снимок (SQLite общий на всех);
+        # чаты привязаны к шарду по chat_id, так что число шардов менять нельзя
+        db.close()
+        db = open_storage(f".{index}")
+    shared_limiter = limiter
+    sharded = True
+    asyncio.run(run_shard(build_app(), sock))
+
+async def run_shard(app, sock):
+    queue = asyncio.Queue(maxsize=int(os.environ.get("WEBHOOK_QUEUE_SIZE", "1024")))
+
+    async def consume():
+        while True:
+            data = await queue.get()
+            try:
+                await adapter.process_raw_update(app, data)
+            except Exception as exc:
+                print(f"shard: ошибка обработки апдейта {data.get('update_id')}: {exc!r}")
+            finally:
+                queue.task_done()
+
+    async with app:
+        await on_startup(app)
+        await app.start()
+        consumers = [asyncio.create_task(consume()) for _ in range(app.update_processor.max_concurrent_updates)]
+        try:
+            async for data in shard.read_frames(sock):
+                await queue.put(data)
+            await queue.join()
+        finally:
+            for task in consumers:
+                task.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+            await app.stop()
+            await on_shutdown(app)
+
+async def run_sharded(shards: int):
+    # таблица для /hint считается один раз здесь, воркеры только читают файл
+    HintTable.load_or_build(HINT_TABLE)
+    limiter = shard.SharedRateLimiter(BOT_RATE_LIMIT, BOT_RATE_BURST) if BOT_RATE_LIMIT else None
+    router = shard.ShardRouter(shards, shard_worker, (limiter,))
+    await router.start()
+    stop = stop_event()
+    print(f"Шардов: {shards}")
+    try:
+        if os.environ.get("BOT_MODE", "polling") == "webhook":
+            # один обработчик: апдейты уходят в шарды в порядке поступления
+            server = webhook_server(router.route, workers=1)
+            await server.start()
+            url = os.environ.get("WEBHOOK_URL")
+            if url:
+                async with adapter.Bot(TOKEN, **api_urls()) as bot:
+                    await adapter.set_webhook(bot, url, server.secret)
+            print(f"Вебхук слушает {server.host}:{server.port}{server.path}")
+            try:
+                await stop.wait()
+            finally:
+                await server.stop()
         else:
-            text = (
-                f"{player['name']} взял карту: {player['hand'][-1]}\n"
-                f"{player['name']}: {' '.join(player['hand'])} = {s}\n\n"
-                "Жми Hit или Stand."
-            )
-            await query.edit_message_text(text, reply_markup=keyboard())
-            return  # тот же игрок ходит дальше
-
-    elif query.data == "stand":
-        player["stand"] = True
-        text = (
-            f"{player['name']} остановился.\n"
-            f"{player['name']}: {' '.join(player['hand'])} = {score(player['hand'])}\n\n"
-            "Ход переходит к следующему игроку."
-        )
-        await query.edit_message_text(text)
+            async with adapter.Bot(TOKEN, **api_urls()) as bot:
+                poller = asyncio.create_task(adapter.poll_updates(bot, router.route, stop))
+                await stop.wait()
+                poller.cancel()
+                await asyncio.gather(poller, return_exceptions=True)
+    finally:
+        await router.stop()
+
+def api_urls():
+    # BOT_API_URL – свой Bot API сервер (например, локальный фейк для тестов)
+    api_url = os.environ.get("BOT_API_URL")
+    if not api_url:
+        return {}
+    return {"base_url": f"{api_url}/bot", "base_file_url": f"{api_url}/file/bot"}
+
+def build_app():
+    return adapter.build_app(
+        TOKEN, adapter.Handlers(), on_startup, on_shutdown,
+        urls=api_urls(), max_concurrent=MAX_CONCURRENT_UPDATES,
+    )
 
-    # Проверяем, все ли закончили
-    if all_players_done(game):
-        await finish_game(chat_id, context)
+def main():
+    # SHARDS=N – фронт и N процессов-воркеров, чаты делятся по chat_id
+    shards = int(os.environ.get("SHARDS", "1"))
+    if shards > 1:
+        asyncio.run(run_sharded(shards))
         return
 
-    # Переходим к следующему игроку
-    while True:
-        game["turn"] = (game["turn"] + 1) % len(game["order"])
-        next_id = game["order"][game["turn"]]
-        next_p = game["players"][next_id]
-        if not next_p["stand"] and not next_p["busted"]:
-            break
-
-    await show_turn(chat_id, context)
-
-# ===== ЗАПУСК =====
-
-def main():
-    app = Application.builder().token(TOKEN).build()
-
-    app.add_handler(CommandHandler("start", cmd_start))
-    app.add_handler(CommandHandler("newgame", cmd_newgame))
-    app.add_handler(CommandHandler("join", cmd_join))
-    app.add_handler(CommandHandler("bet", cmd_bet))
-    app.add_handler(CommandHandler("startgame", cmd_startgame))
-    app.add_handler(CommandHandler("rematch", cmd_rematch))
-    app.add_handler(CommandHandler("status", cmd_status))
-    app.add_handler(CommandHandler("cancel", cmd_cancel))
-    app.add_handler(CommandHandler("balance", cmd_balance))
-    app.add_handler(CommandHandler("stats", cmd_stats))
-    app.add_handler(CommandHandler("top", cmd_top))
-    app.add_handler(CallbackQueryHandler(on_button))
-
-    app.run_polling()
+    # BOT_MODE=webhook – принимать апдейты вебхуком, иначе long polling
+    if os.environ.get("BOT_MODE", "polling") == "webhook":
+        asyncio.run(run_webhook())
+    else:
+        build_app().run_polling()
 
 if __name__ == "__main__":
     main()
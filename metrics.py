@@ -0,0 +1,236 @@
+# ===== МЕТРИКИ =====
+#
+# Счётчики, гистограммы и гейджи в текстовом формате Prometheus без
+# сторонних библиотек. Гистограмма – фиксированные границы корзин и
+# bisect, так что observe() стоит пару операций и годится для каждого
+# апдейта. Гейджи считаются функцией в момент опроса (/metrics).
+#
+# MetricsServer отдаёт:
+#   GET /metrics                          – все метрики реестра;
+#   GET /debug/profile?seconds=5&top=25   – сэмплирующий профайлер: самые
+#                                           «горячие» функции event loop.
+
+import asyncio
+import bisect
+import collections
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from webhook import read_request, write_response
+
+# от 0.1 мс до 10 с: и обработчик в памяти, и медленный запрос к Bot API
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = collections.Counter()   # значения меток -> число
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # значения меток -> [счётчики корзин..., +Inf, сумма]
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            names = self.labels + ("le",)
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                total += count
+                yield f"{self.name}_bucket{_labels(names, labels + (bound,))} {total}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {total}"
+
+class Gauge:
+    """Значение считается функцией fn() при каждом опросе."""
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.fn()}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn):
+        return self.add(Gauge(name, help, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as exc:
+                lines.append(f"# {metric.name}: {exc!r}")
+        return "\n".join(lines) + "\n"
+
+# ===== МЕТРИКИ БОТА =====
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "blackjack_handler_seconds", "Время обработчиков команд, кнопок и стола", ("handler",)
+)
+API_CALLS = REGISTRY.counter(
+    "blackjack_bot_api_calls_total", "Запросы к Bot API по методам", ("method", "outcome")
+)
+API_SECONDS = REGISTRY.histogram(
+    "blackjack_bot_api_seconds", "Длительность запросов к Bot API", ("method",)
+)
+STALE_PRESSES = REGISTRY.counter(
+    "blackjack_stale_presses_total", "Отброшенные устаревшие и повторные нажатия", ("stage",)
+)
+
+# ===== ПРОФАЙЛЕР =====
+
+class SamplingProfiler:
+    """Раз в interval секунд снимает стек потока thread_id из отдельного потока.
+
+    Считается, сколько раз функция была на вершине стека (self) и сколько
+    раз – где-то в стеке (total). Сам поток-цель при этом не замедляется,
+    кроме взятия GIL на время снимка.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.interval = interval
+
+    def sample(self, seconds):
+        own = collections.Counter()
+        total = collections.Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                samples += 1
+                seen = set()
+                own[_where(frame)] += 1
+                while frame is not None:
+                    key = _where(frame)
+                    if key not in seen:
+                        seen.add(key)
+                        total[key] += 1
+                    frame = frame.f_back
+            time.sleep(self.interval)
+        return samples, own, total
+
+    def report(self, seconds=5.0, top=25) -> str:
+        samples, own, total = self.sample(seconds)
+        if not samples:
+            return "нет сэмплов\n"
+        lines = [f"{samples} сэмплов за {seconds:g} с", "", "   self%  total%  функция"]
+        for key, count in own.most_common(top):
+            lines.append(f"  {count / samples:6.1%}  {total[key] / samples:6.1%}  {key}")
+        return "\n".join(lines) + "\n"
+
+def _where(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+# ===== HTTP =====
+
+class MetricsServer:
+    MAX_PROFILE = 60.0
+
+    def __init__(self, registry=REGISTRY, *, host="127.0.0.1", port=9100, profiler=None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.profiler = profiler
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader, writer):
+        try:
+            try:
+                request = await read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                write_response(writer, 400)
+                return
+            if request is None:
+                return
+            status, body = await self._route(request[0], request[1])
+            write_response(writer, status, body.encode(), "text/plain; version=0.0.4; charset=utf-8")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target):
+        if method != "GET":
+            return 405, ""
+        url = urlsplit(target)
+        if url.path == "/metrics":
+            return 200, self.registry.render()
+        if url.path == "/debug/profile" and self.profiler is not None:
+            query = parse_qs(url.query)
+            try:
+                seconds = min(float(query.get("seconds", ["5"])[0]), self.MAX_PROFILE)
+                top = int(query.get("top", ["25"])[0])
+            except ValueError:
+                return 400, ""
+            # сэмплируем из другого потока, event loop продолжает работать
+            return 200, await asyncio.to_thread(self.profiler.report, seconds, top)
+        return 404, ""
@@ -0,0 +1,133 @@
+# ===== ШАНСЫ (МОНТЕ-КАРЛО) =====
+#
+# Оценка для /odds: вероятность перебора при Hit и шансы на победу при
+# Hit и при Stand против соперника. Все розыгрыши идут одним батчем
+# NumPy-массивов: цикл только по «номеру карты», а не по розыгрышам.
+# Карты берутся из тех же таблиц VALUE/IS_ACE и сбрасываются по тем же
+# правилам, что и в Hand (туз 11 -> 1, пока сумма больше 21).
+#
+# Модель: колода бесконечная (каждая из 52 карт равновероятна).
+# После Hit игрок добирает, пока у него меньше, чем у стоявшего соперника
+# (или до 17, если соперник ещё будет ходить). Соперник, который ходит
+# после нас, добирает, пока у него меньше, чем у нас; дилер – до
+# DEALER_STANDS, не глядя на наши очки.
+
+import time
+from functools import lru_cache
+
+from cards import DEALER_STANDS, DECK_SIZE, IS_ACE, VALUE
+from lazy import lazy_import
+
+# NumPy грузится при первой оценке, а не при старте бота
+np = lazy_import("numpy")
+
+# состояние соперника
+TO_ACT = "to_act"
+STOOD = "stood"
+BUSTED = "busted"
+DEALER = "dealer"
+
+MAX_CARDS = 12          # больше 12 карт без перебора не набрать
+CHUNK = 4096            # розыгрышей за один проход
+MAX_ROLLOUTS = 20000
+BUDGET = 0.05           # секунд на одну оценку
+SELF_STAND = 17
+
+@lru_cache(maxsize=None)
+def _tables():
+    """VALUE и IS_ACE как массивы NumPy."""
+    return np.array(VALUE, dtype=np.int16), np.array(IS_ACE, dtype=np.int16)
+
+class Odds:
+    __slots__ = ("hit_bust", "hit_win", "hit_draw", "stand_win", "stand_draw", "rollouts")
+
+    def __init__(self, hit_bust, hit_win, hit_draw, stand_win, stand_draw, rollouts):
+        self.hit_bust = hit_bust
+        self.hit_win = hit_win
+        self.hit_draw = hit_draw
+        self.stand_win = stand_win
+        self.stand_draw = stand_draw
+        self.rollouts = rollouts
+
+    def line(self) -> str:
+        return (
+            f"🎲 Hit: перебор {self.hit_bust:.0%}, победа {self.hit_win:.0%} · "
+            f"Stand: победа {self.stand_win:.0%}"
+        )
+
+def _add(total, soft, cards, active):
+    """Добавить карты cards строкам с active=True – как Hand.add, но батчем."""
+    value, ace = _tables()
+    total = np.where(active, total + value[cards], total)
+    soft = np.where(active, soft + ace[cards], soft)
+    # одной картой больше двух тузов не «смягчить»
+    for _ in range(2):
+        fix = (total > 21) & (soft > 0)
+        total = total - 10 * fix
+        soft = soft - fix
+    return total, soft
+
+def _play(total, soft, target, rng, n):
+    """Добирать, пока total < target (target – число или массив)."""
+    total = np.full(n, total, dtype=np.int16) if np.isscalar(total) else total
+    soft = np.full(n, soft, dtype=np.int16) if np.isscalar(soft) else soft
+    cards = rng.integers(0, DECK_SIZE, size=(MAX_CARDS, n))
+    for k in range(MAX_CARDS):
+        active = total < target
+        if not active.any():
+            break
+        total, soft = _add(total, soft, cards[k], active)
+    return total
+
+def _settle(mine, theirs):
+    win = (mine <= 21) & ((theirs > 21) | (mine > theirs))
+    draw = (mine <= 21) & (mine == theirs)
+    return int(win.sum()), int(draw.sum())
+
+def _chunk(total, soft, opp_total, opp_soft, opp_state, rng, n):
+    """Один батч: (перебор при hit, победы/ничьи hit, победы/ничьи stand)."""
+    # Hit: одна карта, потом добор по простой стратегии
+    first = rng.integers(0, DECK_SIZE, size=n)
+    mine, my_soft = _add(
+        np.full(n, total, dtype=np.int16), np.full(n, soft, dtype=np.int16),
+        first, np.ones(n, dtype=bool),
+    )
+    busts = int((mine > 21).sum())
+    if opp_state == STOOD:
+        target = opp_total
+    elif opp_state in (TO_ACT, DEALER):
+        target = SELF_STAND
+    else:
+        target = 0
+    mine = _play(mine, my_soft, target, rng, n)
+
+    stand = np.full(n, total, dtype=np.int16)
+    if opp_state == TO_ACT:
+        # соперник ходит после нас и видит наш итог
+        opp_hit = _play(opp_total, opp_soft, np.where(mine > 21, 0, mine), rng, n)
+        opp_stand = _play(opp_total, opp_soft, total, rng, n)
+    elif opp_state == DEALER:
+        # дилер добирает одинаково, что бы мы ни сделали
+        opp_hit = opp_stand = _play(opp_total, opp_soft, DEALER_STANDS, rng, n)
+    else:
+        opp_hit = opp_stand = np.full(n, opp_total if opp_state == STOOD else 22, dtype=np.int16)
+    return (busts,) + _settle(mine, opp_hit) + _settle(stand, opp_stand)
+
+@lru_cache(maxsize=8192)
+def _estimate(total, soft, opp_total, opp_soft, opp_state):
+    rng = np.random.default_rng()
+    deadline = time.perf_counter() + BUDGET
+    sums = [0, 0, 0, 0, 0]
+    n = 0
+    while n < MAX_ROLLOUTS and (n == 0 or time.perf_counter() < deadline):
+        size = min(CHUNK, MAX_ROLLOUTS - n)
+        for i, x in enumerate(_chunk(total, soft, opp_total, opp_soft, opp_state, rng, size)):
+            sums[i] += x
+        n += size
+    return Odds(*(x / n for x in sums), n)
+
+def estimate(hand, opp_hand, opp_state) -> Odds:
+    """Шансы для руки hand против руки соперника opp_hand (Hand)."""
+    if np is None:
+        raise RuntimeError("для /odds нужен NumPy")
+    return _estimate(hand.score, int(hand.soft > 0), opp_hand.score, int(opp_hand.soft > 0), opp_state)
@@ -0,0 +1,282 @@
+# ===== ОЧЕРЕДЬ ИСХОДЯЩИХ ЗАПРОСОВ =====
+#
+# Все отправки и правки сообщений идут через один Outbox, а не await
+# прямо в обработчике. У каждого чата своя очередь в двух классах:
+# GAME (стол, итоги раздачи, уведомления игры) уходит раньше INFO
+# (ответы на /top, /stats, /balance и прочие команды).
+#
+# Лимиты как у Telegram: общий на бота (rate в секунду) и на чат – в
+# группе около 20 сообщений в минуту, в личке около одного в секунду.
+# Оба – GCRA (gcra.py), как shard.SharedRateLimiter: чат ждёт своей очереди в
+# куче «проснуться в момент t», и пока он ждёт, остальные чаты
+# отправляют. Общий лимит занимается в момент отправки, в порядке
+# классов, так что под нагрузкой GAME не ждёт за INFO; в шардированном
+# режиме это место в общем на все процессы limiter. answerCallbackQuery
+# идёт мимо очереди и лимита не ждёт. RetryAfter (flood control) усыпляет только тот чат, где
+# он случился; запрос повторяется первым в очереди чата.
+#
+# Внутри чата – не больше одного запроса в полёте, так что порядок
+# сообщений одного класса сохраняется. Правка сообщения, которое ещё
+# ждёт в очереди (тот же key), заменяет старую: уходит только последняя.
+# Запись чата живёт, пока в нём есть запросы или пока не истёк его
+# лимит, так что память – по чатам, писавшим за последнюю минуту.
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+import gcra
+
+GAME = 0
+INFO = 1
+
+class _Item:
+    __slots__ = ("call", "future", "key", "priority", "attempts")
+
+    def __init__(self, call, future, key, priority):
+        self.call = call
+        self.future = future
+        self.key = key
+        self.priority = priority
+        self.attempts = 0
+
+class _Chat:
+    __slots__ = ("chat_id", "queues", "keys", "tat", "retry_until", "state", "heap_priority")
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.queues = (deque(), deque())  # по классам GAME, INFO
+        self.keys = {}                    # key -> _Item, ещё не отправленный
+        self.tat = 0.0                    # GCRA чата
+        self.retry_until = 0.0            # до какого момента молчать после RetryAfter
+        self.state = IDLE
+        self.heap_priority = None         # с каким классом чат лежит в куче готовых
+
+    def best(self):
+        for priority, queue in enumerate(self.queues):
+            if queue:
+                return priority
+        return None
+
+# состояния чата
+IDLE, READY, SLEEPING, BUSY = range(4)
+
+def _copy_result(source, target):
+    if target.done():
+        return
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+class Outbox:
+    def __init__(self, rate=30.0, burst=30, group_rate=20 / 60, group_burst=20,
+                 private_rate=1.0, private_burst=3, concurrency=64, retry_after=None, max_attempts=5,
+                 limiter=None):
+        # rate 0 – без лимита; limiter (shard.SharedRateLimiter) – общий лимит
+        # всех процессов вместо своего
+        self.interval, self.tolerance = gcra.params(rate, burst)
+        self._tat = 0.0
+        self.limiter = limiter
+        # у групп и каналов chat_id отрицательный
+        self._group = gcra.params(group_rate, group_burst)
+        self._private = gcra.params(private_rate, private_burst)
+        self.concurrency = concurrency
+        # retry_after(exc) -> секунды ожидания, если exc – flood control, иначе None
+        self.retry_after = retry_after
+        self.max_attempts = max_attempts
+
+        self._chats = {}          # chat_id -> _Chat
+        self._ready = []          # куча (класс, порядок, chat_id)
+        self._sleeping = []       # куча (когда можно, порядок, chat_id)
+        self._expiring = []       # куча (когда забыть, порядок, chat_id) для чатов без запросов
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._in_flight = 0
+        self._pending = 0         # запросов в очередях и в полёте
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = None
+        self._tasks = set()
+
+        self.sent = 0
+        self.retried = 0
+        self.superseded = 0
+
+    def __len__(self):
+        """Запросов в очередях и в полёте."""
+        return self._pending
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10.0):
+        """Дождаться отправки очереди (не дольше timeout) и остановиться."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"outbox: при остановке не отправлено {len(self)} запросов")
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ===== ПОСТАНОВКА В ОЧЕРЕДЬ =====
+
+    def post(self, chat_id, priority, call, key=None):
+        """Отправить call() в свою очередь и не ждать результата (ошибки – в лог)."""
+        self._submit(chat_id, priority, call, key, None)
+
+    async def call(self, chat_id, priority, call, key=None):
+        """Отправить call() в свою очередь и дождаться его результата."""
+        future = asyncio.get_running_loop().create_future()
+        return await self._submit(chat_id, priority, call, key, future)
+
+    def _submit(self, chat_id, priority, call, key, future):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(chat_id)
+        item = None if key is None else chat.keys.get(key)
+        if item is not None:
+            # правка того же сообщения ещё не ушла – уходит только новая
+            item.call = call
+            self.superseded += 1
+            if future is not None:
+                if item.future is None:
+                    item.future = future
+                else:
+                    future = item.future
+            return future
+        item = _Item(call, future, key, priority)
+        chat.queues[priority].append(item)
+        if key is not None:
+            chat.keys[key] = item
+        self._pending += 1
+        self._idle.clear()
+        if chat.state == IDLE:
+            self._schedule(chat, time.monotonic())
+        elif chat.state == READY and priority < chat.heap_priority:
+            # GAME обгоняет INFO, уже ждущий в куче: старая запись станет пустой
+            self._push_ready(chat, priority)
+        return future
+
+    def _push_ready(self, chat, priority):
+        chat.state = READY
+        chat.heap_priority = priority
+        heapq.heappush(self._ready, (priority, next(self._seq), chat.chat_id))
+        self._wake.set()
+
+    def _schedule(self, chat, now):
+        """Чат с запросами – в кучу готовых или спящих по его лимиту."""
+        interval, tolerance = self._group if chat.chat_id < 0 else self._private
+        at = max(chat.tat - tolerance, chat.retry_until)
+        if at <= now:
+            self._push_ready(chat, chat.best())
+        else:
+            chat.state = SLEEPING
+            heapq.heappush(self._sleeping, (at, next(self._seq), chat.chat_id))
+            self._wake.set()
+
+    # ===== ОТПРАВКА =====
+
+    async def _run(self):
+        ready, sleeping = self._ready, self._sleeping
+        expiring = self._expiring
+        while True:
+            now = time.monotonic()
+            while sleeping and sleeping[0][0] <= now:
+                _, _, chat_id = heapq.heappop(sleeping)
+                self._push_ready(self._chats[chat_id], self._chats[chat_id].best())
+            while expiring and expiring[0][0] <= now:
+                _, _, chat_id = heapq.heappop(expiring)
+                chat = self._chats.get(chat_id)
+                if chat is not None and chat.state == IDLE and max(chat.tat, chat.retry_until) <= now:
+                    del self._chats[chat_id]
+
+            if not ready or self._in_flight >= self.concurrency:
+                self._wake.clear()
+                timeout = sleeping[0][0] - now if sleeping else None
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            priority, _, chat_id = heapq.heappop(ready)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.state != READY or chat.heap_priority != priority:
+                continue  # запись, которую обогнала более срочная
+
+            # общий лимит бота: ждём здесь, он одинаков для всех чатов
+            if self.limiter is not None:
+                delay = self.limiter.reserve()
+            else:
+                self._tat, delay = gcra.reserve(self._tat, now, self.interval, self.tolerance)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                now = time.monotonic()
+
+            # чат уже дождался своего лимита (_schedule), ждать нечего
+            chat.tat, _ = gcra.reserve(chat.tat, now, *(self._group if chat_id < 0 else self._private))
+            item = chat.queues[chat.best()].popleft()
+            if item.key is not None:
+                del chat.keys[item.key]
+            chat.state = BUSY
+            self._in_flight += 1
+            task = asyncio.create_task(self._send(chat, item))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, chat, item):
+        item.attempts += 1
+        done = True
+        try:
+            result = await item.call()
+        except Exception as exc:
+            wait = None if self.retry_after is None else self.retry_after(exc)
+            if wait is not None and item.attempts < self.max_attempts:
+                # flood control: молчит только этот чат, запрос – снова первым
+                self.retried += 1
+                chat.retry_until = time.monotonic() + wait
+                done = self._requeue(chat, item)
+            elif item.future is not None:
+                item.future.set_exception(exc)
+            else:
+                print(f"outbox: не удалось отправить в чат {chat.chat_id}: {exc!r}")
+        else:
+            self.sent += 1
+            if item.future is not None and not item.future.done():
+                item.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            if done:
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.set()
+            now = time.monotonic()
+            if chat.best() is None:
+                chat.state = IDLE
+                heapq.heappush(self._expiring, (max(chat.tat, chat.retry_until), next(self._seq), chat.chat_id))
+            else:
+                self._schedule(chat, now)
+            self._wake.set()
+
+    def _requeue(self, chat, item):
+        """Вернуть запрос в начало очереди чата. False – он снова ждёт отправки."""
+        newer = None if item.key is None else chat.keys.get(item.key)
+        if newer is None:
+            chat.queues[item.priority].appendleft(item)
+            if item.key is not None:
+                chat.keys[item.key] = item
+            return False
+        # пока ждали, пришла новая правка того же сообщения – она и уйдёт
+        self.superseded += 1
+        if item.future is not None:
+            if newer.future is None:
+                newer.future = item.future
+            else:
+                newer.future.add_done_callback(lambda f, old=item.future: _copy_result(f, old))
+        return True
@@ -0,0 +1,107 @@
+# ===== ПРОФИЛИ ИГРОКОВ =====
+#
+# Статистика и балансы лежат по чатам (stats[chat_id][user_id]), и чтобы
+# собрать итог игрока по всем чатам, пришлось бы обойти их все. Индекс
+# по user_id держит для каждого игрока список его чатов (ссылки на
+# записи в stats/balances) и готовые суммы: победы, поражения, ничьи,
+# переборы и выигрыш в фишках относительно стартового баланса.
+#
+# Суммы обновляются там же, где меняются записи чатов (ensure_*/add_*
+# движка), поэтому /me отвечает за O(1) и не расходится с таблицами
+# чатов. Профиль поднимается из хранилища при первом обращении к игроку
+# (как чат в LazyChatTable) – до любого изменения его записей, так что
+# на старте индекс не строится. Целиком он пересобирается одним проходом
+# (Engine.rebuild_profiles – починка): seed() строк хранилища или
+# aggregate() записей чатов.
+
+from storage import LazyChatTable
+
+class Profile:
+    __slots__ = ("name", "chats", "wins", "losses", "draws", "busts", "net")
+
+    def __init__(self, name, chats=(), wins=0, losses=0, draws=0, busts=0, net=0):
+        self.name = name
+        self.chats = set(chats)   # chat_id, где у игрока есть stats или balance
+        self.wins = wins
+        self.losses = losses
+        self.draws = draws
+        self.busts = busts
+        self.net = net            # сумма (баланс - стартовый) по чатам
+
+    def row(self, user_id):
+        return (user_id, self.name, sorted(self.chats), self.wins, self.losses, self.draws, self.busts, self.net)
+
+def chat_records(stats, balances):
+    """Записи чатов в памяти в формате строк aggregate()."""
+    for chat_id, chat in dict.items(stats):
+        for uid, s in chat.items():
+            yield chat_id, uid, s.name, s.wins, s.losses, s.draws, s.busts, None
+    for chat_id, chat in dict.items(balances):
+        for uid, b in chat.items():
+            yield chat_id, uid, b.name, 0, 0, 0, 0, b.balance
+
+def aggregate(rows, start_balance):
+    """Строки seed() из записей чатов за один проход.
+
+    rows – (chat_id, user_id, имя, wins, losses, draws, busts, баланс или None).
+    """
+    users = {}
+    for chat_id, user_id, name, wins, losses, draws, busts, balance in rows:
+        p = users.get(user_id)
+        if p is None:
+            p = users[user_id] = Profile(name)
+        p.chats.add(chat_id)
+        p.wins += wins
+        p.losses += losses
+        p.draws += draws
+        p.busts += busts
+        if balance is not None:
+            p.net += balance - start_balance
+    return [p.row(uid) for uid, p in users.items()]
+
+class ProfileIndex:
+    """user_id -> Profile по всем чатам.
+
+    loader(user_id) возвращает строку профиля без user_id или None.
+    """
+
+    def __init__(self, loader=None):
+        self._loader = loader
+        self.users = LazyChatTable(self._load)
+
+    def _load(self, user_id):
+        row = None if self._loader is None else self._loader(user_id)
+        return None if row is None else Profile(*row)
+
+    def __len__(self):
+        """Профилей в памяти."""
+        return len(self.users)
+
+    def get(self, user_id):
+        return self.users.get(user_id)
+
+    def seed(self, rows):
+        """Заменить индекс строками (user_id, имя, [chat_id], w, l, d, b, net)."""
+        self.users = LazyChatTable(self._load)
+        for uid, *fields in rows:
+            self.users[uid] = Profile(*fields)
+
+    def rows(self):
+        """Строки профилей в памяти в формате seed()."""
+        return [p.row(uid) for uid, p in self.users.items()]
+
+    def link(self, chat_id, user_id, name):
+        """У игрока появилась (или переименована) запись в чате chat_id."""
+        p = self.users.get(user_id)
+        if p is None:
+            self.users[user_id] = Profile(name, (chat_id,))
+            return
+        p.name = name
+        p.chats.add(chat_id)
+
+    def add_stat(self, user_id, field):
+        p = self.users[user_id]
+        setattr(p, field, getattr(p, field) + 1)
+
+    def add_chips(self, user_id, delta):
+        self.users[user_id].net += delta
@@ -0,0 +1,91 @@
+# ===== ЗАПИСИ =====
+#
+# Игра, игрок, строка статистики и баланс – классы со __slots__ вместо
+# dict со строковыми ключами: у объекта нет собственного __dict__, поля
+# лежат в фиксированных ячейках. Рука – Hand с картами в array('B'),
+# порядок ходов – array('q') из user_id. Имя пользователя интернируется
+# (sys.intern), так что игрок, его статистика и баланс ссылаются на одну
+# и ту же строку.
+
+import sys
+from array import array
+
+from cards import Hand
+
+def intern_name(name: str) -> str:
+    return sys.intern(name)
+
+class Player:
+    # line – готовая строка игрока для стола (Engine.player_line), None – собрать заново
+    __slots__ = ("name", "hand", "stand", "busted", "bet", "line")
+
+    def __init__(self, name, hand=None, stand=False, busted=False, bet=0):
+        self.name = intern_name(name)
+        self.hand = Hand() if hand is None else hand
+        self.stand = stand
+        self.busted = busted
+        self.bet = bet
+        self.line = None
+
+class TableMessage:
+    """Сообщение-стол одной раздачи: message_id и что в нём показано.
+
+    На каждую раздачу – новый объект, так что обновления прошлой раздачи,
+    ещё ждущие отправки, не попадают в сообщение следующей.
+    """
+
+    __slots__ = ("message_id", "shown")
+
+    def __init__(self, message_id=None):
+        self.message_id = message_id
+        self.shown = None
+
+class Game:
+    """Стол в чате.
+
+    players – user_id -> Player, order – порядок ходов, turn – индекс в нём.
+    Игроки ходят по очереди до Stand или перебора, так что ещё не
+    закончившие раздачу – это хвост order[turn:]: очередь готовых к ходу,
+    где переход хода – turn += 1. dealer – рука дилера (Hand) за столом
+    против дилера или None.
+    table – сообщение-стол текущей раздачи (TableMessage; показанное в нём
+    только в памяти).
+    gid и version – id игры и номер её состояния, они зашиты в кнопки стола,
+    чтобы отличать нажатия на старые сообщения и повторные.
+    """
+
+    __slots__ = (
+        "players", "order", "turn", "started", "finished",
+        "table", "shoe", "last_active", "dealer",
+        "gid", "version",
+    )
+
+    def __init__(self, shoe, last_active=0.0, dealer=False):
+        self.players = {}
+        self.order = array("q")
+        self.turn = 0
+        self.started = False
+        self.finished = False
+        self.table = TableMessage()
+        self.shoe = shoe
+        self.last_active = last_active
+        self.dealer = Hand() if dealer else None
+        self.gid = 0
+        self.version = 0
+
+class StatLine:
+    __slots__ = ("name", "wins", "losses", "draws", "busts")
+
+    def __init__(self, name, wins=0, losses=0, draws=0, busts=0):
+        self.name = intern_name(name)
+        self.wins = wins
+        self.losses = losses
+        self.draws = draws
+        self.busts = busts
+
+class Balance:
+    __slots__ = ("name", "balance")
+
+    def __init__(self, name, balance):
+        self.name = intern_name(name)
+        self.balance = balance
@@ -0,0 +1,135 @@
+# ===== ШАРДИРОВАНИЕ ПО ЧАТАМ =====
+#
+# Один процесс – одно ядро. В шардированном режиме (SHARDS=N) фронт-процесс
+# только принимает апдейты (вебхук или getUpdates) и по chat_id отдаёт
+# каждый одному из N процессов-воркеров. Воркер – обычный бот со своим
+# Engine: в его памяти лежат games/stats/balances только его чатов, и все
+# апдейты одного чата всегда попадают в один и тот же процесс, так что
+# порядок внутри чата сохраняется, как и в ChatUpdateProcessor.
+#
+# Фронт и воркер связаны парой Unix-сокетов: кадр – 4 байта длины и JSON
+# апдейта. Если воркер не успевает, буфер сокета заполняется и drain()
+# фронта ждёт – backpressure доходит до вебхука (503) или до getUpdates.
+#
+# Исходящие запросы всех воркеров проходят через общий SharedRateLimiter:
+# очередь исходящих (outbox.Outbox) каждого воркера занимает в нём место.
+
+import asyncio
+import json
+import multiprocessing
+import socket
+import struct
+import time
+
+import gcra
+
+FRAME = struct.Struct("!I")
+
+# spawn, а не fork: у фронта к моменту запуска воркеров уже работает event loop
+CTX = multiprocessing.get_context("spawn")
+
+def update_chat_id(data: dict):
+    """chat_id из сырого апдейта (dict) или None."""
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        msg = data.get(key)
+        if msg:
+            return msg["chat"]["id"]
+    query = data.get("callback_query")
+    if query:
+        msg = query.get("message")
+        if msg:
+            return msg["chat"]["id"]
+        return query["from"]["id"]
+    for key in ("my_chat_member", "chat_member", "chat_join_request"):
+        member = data.get(key)
+        if member:
+            return member["chat"]["id"]
+    return None
+
+def shard_of(chat_id, shards: int) -> int:
+    # апдейты без чата – в нулевой шард
+    return 0 if chat_id is None else chat_id % shards
+
+# ===== ОБЩИЙ ЛИМИТ ЗАПРОСОВ =====
+
+class SharedRateLimiter:
+    """Лимит rate запросов в секунду (с запасом burst) на все процессы сразу.
+
+    GCRA (gcra.py): tat лежит в общей памяти, reserve() сдвигает его под
+    межпроцессной блокировкой и говорит, сколько ждать. CLOCK_MONOTONIC
+    в Linux общий для всех процессов.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, ctx=CTX):
+        self.interval, self.tolerance = gcra.params(rate, burst)
+        self._tat = ctx.Value("d", 0.0, lock=False)
+        self._lock = ctx.Lock()
+
+    def reserve(self) -> float:
+        """Занять место под запрос; вернуть, сколько секунд ждать."""
+        now = time.monotonic()
+        with self._lock:
+            self._tat.value, delay = gcra.reserve(self._tat.value, now, self.interval, self.tolerance)
+        return delay
+
+# ===== СВЯЗЬ ФРОНТ – ВОРКЕР =====
+
+def write_frame(writer, data: dict):
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    writer.write(FRAME.pack(len(body)) + body)
+
+async def read_frames(sock):
+    """Апдейты из сокета воркера, пока фронт его не закроет."""
+    reader, writer = await asyncio.open_unix_connection(sock=sock)
+    try:
+        while True:
+            try:
+                head = await reader.readexactly(FRAME.size)
+                body = await reader.readexactly(FRAME.unpack(head)[0])
+            except asyncio.IncompleteReadError:
+                return
+            yield json.loads(body)
+    finally:
+        writer.close()
+
+class ShardRouter:
+    """Фронт: запускает воркеры target(index, sock, *args) и раздаёт им апдейты."""
+
+    def __init__(self, shards: int, target, args=()):
+        self.shards = shards
+        self.target = target
+        self.args = args
+        self.routed = [0] * shards
+        self._procs = []
+        self._writers = []
+
+    async def start(self):
+        for index in range(self.shards):
+            front, back = socket.socketpair()
+            proc = CTX.Process(
+                target=self.target, args=(index, back) + tuple(self.args),
+                name=f"shard-{index}", daemon=True,
+            )
+            proc.start()
+            back.close()
+            _, writer = await asyncio.open_unix_connection(sock=front)
+            self._procs.append(proc)
+            self._writers.append(writer)
+
+    async def route(self, data: dict):
+        index = shard_of(update_chat_id(data), self.shards)
+        writer = self._writers[index]
+        write_frame(writer, data)
+        self.routed[index] += 1
+        await writer.drain()
+
+    async def stop(self, timeout: float = 30.0):
+        # закрытый сокет – сигнал воркеру доработать и выйти
+        for writer in self._writers:
+            writer.close()
+        for proc in self._procs:
+            await asyncio.to_thread(proc.join, timeout)
+            if proc.is_alive():
+                proc.terminate()
+        self._writers = []
+        self._procs = []
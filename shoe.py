@@ -0,0 +1,112 @@
+# ===== БАШМАК (SHOE) =====
+#
+# Вместо random.choice на каждую карту (бесконечная колода с возвращением)
+# у каждого стола свой башмак из decks колод. Он тасуется целиком одной
+# перестановкой в компактный array('B'), после чего взять карту – это
+# просто сдвинуть указатель. Когда указатель доходит до подрезной карты
+# (penetration от размера башмака), перед следующей раздачей башмак
+# перетасовывается.
+#
+# Перестановка однозначно задаётся (seed, номер тасовки), поэтому на диск
+# пишется только пара чисел и позиция, а игру можно воспроизвести.
+
+import os
+import random
+from array import array
+
+from cards import DECK_SIZE
+from lazy import lazy_import
+
+# NumPy грузится при первой тасовке; без него тасуем через random.Random
+np = lazy_import("numpy")
+
+SEED_MASK = (1 << 63) - 1
+
+def new_seed() -> int:
+    return int.from_bytes(os.urandom(8), "little") & SEED_MASK
+
+class Shoe:
+    __slots__ = ("decks", "penetration", "seed", "shuffles", "cards", "pos", "cut")
+
+    def __init__(self, decks: int = 6, penetration: float = 0.75, seed: int = None):
+        self.decks = decks
+        self.penetration = penetration
+        self.seed = new_seed() if seed is None else seed & SEED_MASK
+        self.shuffles = 0
+        self.cards = array("B")
+        self.pos = 0
+        self.cut = 0
+        self.shuffle()
+
+    def _permutation(self) -> array:
+        if np is not None:
+            rng = np.random.default_rng([self.seed, self.shuffles])
+            deck = np.tile(np.arange(DECK_SIZE, dtype=np.uint8), self.decks)
+            return array("B", rng.permutation(deck).tobytes())
+        cards = array("B", range(DECK_SIZE)) * self.decks
+        random.Random(self.seed * 1000003 + self.shuffles).shuffle(cards)
+        return cards
+
+    def shuffle(self):
+        self.shuffles += 1
+        self.cards = self._permutation()
+        self.pos = 0
+        self.cut = int(len(self.cards) * self.penetration)
+
+    @property
+    def needs_shuffle(self) -> bool:
+        """Подрезная карта вышла – тасовать перед следующей раздачей."""
+        return self.pos >= self.cut
+
+    def draw(self) -> int:
+        if self.pos >= len(self.cards):
+            # башмак кончился посреди раздачи
+            self.shuffle()
+        card = self.cards[self.pos]
+        self.pos += 1
+        return card
+
+    def remaining(self) -> int:
+        return len(self.cards) - self.pos
+
+    # --- сохранение: (колоды, подрезка, seed, тасовка, позиция) ---
+
+    def state(self):
+        return [self.decks, self.penetration, self.seed, self.shuffles, self.pos]
+
+    @classmethod
+    def from_state(cls, state):
+        decks, penetration, seed, shuffles, pos = state
+        shoe = cls.__new__(cls)
+        shoe.decks = decks
+        shoe.penetration = penetration
+        shoe.seed = seed
+        shoe.shuffles = shuffles - 1
+        shoe.shuffle()
+        shoe.pos = pos
+        return shoe
+
+class ScriptedShoe:
+    """Башмак при повторе журнала: карты берутся из события.
+
+    Настоящий башмак тасуется и сдвигается как при живой раздаче, так что
+    его позиция после повтора та же; его карта идёт в ход, только если
+    событие своих не записало (журнал до записи карт).
+    """
+
+    __slots__ = ("shoe", "_cards")
+
+    def __init__(self, shoe, cards):
+        self.shoe = shoe
+        self._cards = iter(cards)
+
+    @property
+    def needs_shuffle(self) -> bool:
+        return self.shoe.needs_shuffle
+
+    def shuffle(self):
+        self.shoe.shuffle()
+
+    def draw(self) -> int:
+        card = self.shoe.draw()
+        return next(self._cards, card)
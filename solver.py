@@ -0,0 +1,168 @@
+# ===== ТОЧНЫЙ РЕШАТЕЛЬ ДЛЯ /hint =====
+#
+# Динамическое программирование по состояниям нашей игры (два игрока,
+# без дилера, бесконечная колода): для каждой пары
+#   (свои очки, мягкий туз, очки соперника, мягкий туз соперника, статус соперника)
+# считается матожидание Hit и Stand в ставках (победа +1, ничья 0,
+# поражение или перебор −1) при дальнейшей оптимальной игре.
+# Вероятности карт берутся из VALUE/IS_ACE – тех же таблиц, что и в
+# card_value, а сброс туза – по правилу Hand.add.
+#
+# Соперник, который ходит после нас, добирает, пока у него меньше, чем у
+# нас; дилер (статус DEALER, видна одна карта) – до DEALER_STANDS, как в
+# odds.py. Таблица – плоский array('d'), поиск – одна формула
+# индекса. Её можно сохранить в бинарный файл и грузить на старте.
+
+import os
+import struct
+from array import array
+from collections import Counter
+
+from cards import DEALER_STANDS, DECK_SIZE, IS_ACE, VALUE
+
+TO_ACT, STOOD, BUSTED, DEALER = range(4)
+STATUS_NAMES = {"to_act": TO_ACT, "stood": STOOD, "busted": BUSTED, "dealer": DEALER}
+
+TOTALS = 23            # 0..21 и 22 = перебор
+HIT, STAND = 0, 1
+
+MAGIC = b"BJH2"
+HEADER = struct.Struct("<4sI")
+
+# (очки карты, туз) -> вероятность
+CARD_PROBS = tuple(
+    (value, ace, count / DECK_SIZE)
+    for (value, ace), count in sorted(Counter(zip(VALUE, IS_ACE)).items())
+)
+
+def add_card(total, soft, value, ace):
+    total += value
+    soft += ace
+    while total > 21 and soft:
+        total -= 10
+        soft -= 1
+    return min(total, 22), min(soft, 1)
+
+def index(total, soft, opp_total, opp_soft, status, action):
+    return ((((total * 2 + soft) * TOTALS + opp_total) * 2 + opp_soft) * 4 + status) * 2 + action
+
+TABLE_SIZE = index(TOTALS - 1, 1, TOTALS - 1, 1, DEALER, 1) + 1
+
+class Solver:
+    def __init__(self):
+        self._opp = {}
+        self._value = {}
+
+    def opponent_final(self, total, soft, target):
+        """Распределение итога соперника, который добирает, пока total < target."""
+        key = (total, soft, target)
+        dist = self._opp.get(key)
+        if dist is not None:
+            return dist
+        if total >= target:
+            dist = {total: 1.0}
+        else:
+            dist = {}
+            for value, ace, p in CARD_PROBS:
+                for final, q in self.opponent_final(*add_card(total, soft, value, ace), target).items():
+                    dist[final] = dist.get(final, 0.0) + p * q
+        self._opp[key] = dist
+        return dist
+
+    def stand_ev(self, total, opp_total, opp_soft, status):
+        if total > 21:
+            return -1.0
+        if status == BUSTED:
+            return 1.0
+        if status == STOOD:
+            return (total > opp_total) - (total < opp_total)
+        target = DEALER_STANDS if status == DEALER else total
+        ev = 0.0
+        for final, p in self.opponent_final(opp_total, opp_soft, target).items():
+            if final > 21 or final < total:
+                ev += p
+            elif final > total:
+                ev -= p
+        return ev
+
+    def hit_ev(self, total, soft, opp_total, opp_soft, status):
+        ev = 0.0
+        for value, ace, p in CARD_PROBS:
+            t, s = add_card(total, soft, value, ace)
+            ev += p * (-1.0 if t > 21 else self.best_ev(t, s, opp_total, opp_soft, status))
+        return ev
+
+    def best_ev(self, total, soft, opp_total, opp_soft, status):
+        key = (total, soft, opp_total, opp_soft, status)
+        ev = self._value.get(key)
+        if ev is None:
+            ev = max(
+                self.stand_ev(total, opp_total, opp_soft, status),
+                self.hit_ev(total, soft, opp_total, opp_soft, status),
+            )
+            self._value[key] = ev
+        return ev
+
+    def build(self) -> array:
+        table = array("d", bytes(8 * TABLE_SIZE))
+        for total in range(22):
+            for soft in (0, 1):
+                for opp_total in range(TOTALS):
+                    for opp_soft in (0, 1):
+                        for status in (TO_ACT, STOOD, BUSTED, DEALER):
+                            i = index(total, soft, opp_total, opp_soft, status, HIT)
+                            table[i] = self.hit_ev(total, soft, opp_total, opp_soft, status)
+                            table[i + 1] = self.stand_ev(total, opp_total, opp_soft, status)
+        return table
+
+class HintTable:
+    """Готовая таблица: hint() – O(1) поиск по индексу."""
+
+    def __init__(self, table: array):
+        self.table = table
+
+    @classmethod
+    def build(cls):
+        return cls(Solver().build())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or size != TABLE_SIZE:
+                raise ValueError(f"{path}: таблица другого формата")
+            table = array("d")
+            table.fromfile(f, size)
+        return cls(table)
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, TABLE_SIZE))
+            self.table.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_or_build(cls, path):
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, EOFError, struct.error):
+            hints = cls.build()
+            try:
+                hints.save(path)
+            except OSError:
+                pass
+            return hints
+
+    def hint(self, hand, opp_hand, status: str):
+        """(EV Hit, EV Stand) для руки hand против opp_hand."""
+        i = index(
+            min(hand.score, 22), int(hand.soft > 0),
+            min(opp_hand.score, 22), int(opp_hand.soft > 0),
+            STATUS_NAMES[status], HIT,
+        )
+        return self.table[i], self.table[i + 1]
+
+    @property
+    def nbytes(self):
+        return self.table.itemsize * len(self.table)
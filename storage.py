@@ -0,0 +1,475 @@
+# ===== ХРАНИЛИЩЕ (SQLite) =====
+#
+# games / stats / balances живут в памяти как раньше, но за ними стоит
+# SQLite-файл в режиме WAL. Обработчики только помечают записи
+# «грязными» (mark_*), а фоновая задача run() раз в flush_interval
+# секунд или при накоплении flush_size записей сбрасывает их одной
+# транзакцией в отдельном потоке. Чтение идёт лениво: данные чата
+# поднимаются из базы при первом обращении к нему (LazyChatTable).
+
+import asyncio
+import json
+import sqlite3
+
+from cards import Hand
+from records import Balance, Game, Player, StatLine
+from shoe import Shoe
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    busts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS balances (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, user_id)
+) WITHOUT ROWID;
+-- профиль игрока по всем чатам (/me) поднимается по user_id
+CREATE INDEX IF NOT EXISTS stats_by_user ON stats (user_id);
+CREATE INDEX IF NOT EXISTS balances_by_user ON balances (user_id);
+CREATE TABLE IF NOT EXISTS games (
+    chat_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+-- счётчики движка, которые должны пережить перезапуск (seeded)
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# ===== СЕРИАЛИЗАЦИЯ ИГРЫ =====
+
+# Формат JSON тот же, что был у dict-версии игры; показанное в столе
+# (table.shown) – состояние в памяти и на диск не пишется.
+
+def game_to_data(game) -> dict:
+    players = {
+        str(uid): {"name": p.name, "hand": list(p.hand), "stand": p.stand, "busted": p.busted, "bet": p.bet}
+        for uid, p in game.players.items()
+    }
+    data = {
+        "players": players,
+        "order": list(game.order),
+        "turn": game.turn,
+        "started": game.started,
+        "finished": game.finished,
+        "table_id": game.table.message_id,
+        "shoe": game.shoe.state(),
+        "last_active": game.last_active,
+        "gid": game.gid,
+        "version": game.version,
+    }
+    if game.dealer is not None:
+        data["dealer"] = list(game.dealer)
+    return data
+
+def game_to_json(game) -> str:
+    return json.dumps(game_to_data(game), ensure_ascii=False, separators=(",", ":"))
+
+def game_from_data(data: dict):
+    game = Game(Shoe.from_state(data["shoe"]), data.get("last_active", 0.0))
+    for uid, p in data["players"].items():
+        game.players[int(uid)] = Player(p["name"], Hand(p["hand"]), p["stand"], p["busted"], p["bet"])
+    game.order.extend(data["order"])
+    game.turn = data["turn"]
+    game.started = data["started"]
+    game.finished = data["finished"]
+    game.table.message_id = data.get("table_id")
+    game.gid = data.get("gid", 0)
+    game.version = data.get("version", 0)
+    if "dealer" in data:
+        game.dealer = Hand(data["dealer"])
+    return game
+
+def game_from_json(text: str):
+    return game_from_data(json.loads(text))
+
+# ===== ЛЕНИВАЯ ТАБЛИЦА ПО ЧАТАМ =====
+
+# сколько последних промахов (чатов, которых нет в базе) помнит таблица
+ABSENT_LIMIT = 65536
+
+class LazyChatTable(dict):
+    """dict chat_id -> данные, который подгружает чат из базы при первом обращении.
+
+    loader(chat_id) возвращает данные чата или None, если в базе ничего нет.
+    Последние absent_limit отсутствующих чатов запоминаются (LRU), чтобы не
+    ходить за ними в базу повторно. Удалённое, но ещё не записанное,
+    loader сам должен отдавать как None (см. Storage.load_game).
+    """
+
+    def __init__(self, loader, absent_limit=ABSENT_LIMIT):
+        super().__init__()
+        self._loader = loader
+        self._absent = {}    # chat_id -> None, от давнего промаха к свежему
+        self._absent_limit = absent_limit
+
+    def _miss(self, chat_id):
+        absent = self._absent
+        absent[chat_id] = None
+        if len(absent) > self._absent_limit:
+            del absent[next(iter(absent))]
+
+    def _load(self, chat_id):
+        absent = self._absent
+        if chat_id in absent:
+            # свежий промах – в конец очереди на вытеснение
+            del absent[chat_id]
+            absent[chat_id] = None
+            return None
+        value = self._loader(chat_id)
+        if value is None:
+            self._miss(chat_id)
+        else:
+            dict.__setitem__(self, chat_id, value)
+        return value
+
+    def __contains__(self, chat_id):
+        if dict.__contains__(self, chat_id):
+            return True
+        return self._load(chat_id) is not None
+
+    def __missing__(self, chat_id):
+        value = self._load(chat_id)
+        if value is None:
+            raise KeyError(chat_id)
+        return value
+
+    def get(self, chat_id, default=None):
+        if chat_id in self:
+            return self[chat_id]
+        return default
+
+    def __setitem__(self, chat_id, value):
+        self._absent.pop(chat_id, None)
+        dict.__setitem__(self, chat_id, value)
+
+    def __delitem__(self, chat_id):
+        dict.__delitem__(self, chat_id)
+        self._miss(chat_id)
+
+    def touched(self, chat_id):
+        """Чат в памяти или известно, что его нет, – в базу за ним не ходим."""
+        return dict.__contains__(self, chat_id) or chat_id in self._absent
+
+# ===== БАЗА С ОТЛОЖЕННОЙ ЗАПИСЬЮ =====
+
+class Storage:
+    def __init__(self, path: str, flush_interval: float = 2.0, flush_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._reader = None
+        self._writer = None
+        # грязные записи: ключ -> ссылка на живую запись (None = удалить)
+        self._stats = {}
+        self._balances = {}
+        self._games = {}
+        self._meta = {}
+        self._writing = {}       # игры пачки, которая сейчас пишется
+        self._flushing = asyncio.Lock()
+        self._wake = None
+        self._stopping = False
+
+    # --- соединения ---
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = self._connect()
+            self._reader.executescript(SCHEMA)
+        return self._reader
+
+    @property
+    def writer(self):
+        # отдельное соединение для потока записи: в WAL читатели ему не мешают
+        if self._writer is None:
+            self.reader
+            self._writer = self._connect()
+        return self._writer
+
+    def recover(self, engine):
+        """SQLite и так хранит последнее состояние – восстанавливать нечего."""
+        return 0
+
+    def close(self):
+        self.flush_sync()
+        for conn in (self._reader, self._writer):
+            if conn is not None:
+                conn.close()
+        self._reader = self._writer = None
+
+    # --- ленивое чтение по чатам ---
+
+    def load_stats(self, chat_id):
+        rows = self.reader.execute(
+            "SELECT user_id, name, wins, losses, draws, busts FROM stats WHERE chat_id = ?",
+            (chat_id,),
+        ).fetchall()
+        if not rows:
+            return None
+        return {uid: StatLine(name, w, l, d, b) for uid, name, w, l, d, b in rows}
+
+    def load_balances(self, chat_id):
+        rows = self.reader.execute(
+            "SELECT user_id, name, balance FROM balances WHERE chat_id = ?",
+            (chat_id,),
+        ).fetchall()
+        if not rows:
+            return None
+        return {uid: Balance(name, bal) for uid, name, bal in rows}
+
+    def load_total_wins(self):
+        """(user_id, имя, победы) по всем чатам – для общей таблицы лидеров."""
+        return self.reader.execute(
+            "SELECT user_id, MAX(name), SUM(wins) FROM stats GROUP BY user_id HAVING SUM(wins) > 0"
+        ).fetchall()
+
+    def load_profile(self, user_id, start_balance, skip=()):
+        """Профиль игрока по всем чатам (как profiles.Profile.row() без user_id) или None.
+
+        skip – чаты, записи которых не читать (вызывающий берёт их из памяти).
+        """
+        skip = list(skip)
+        marks = ", ".join("?" * len(skip))
+        name, chats, *totals = self.reader.execute(
+            "SELECT MAX(name), GROUP_CONCAT(DISTINCT chat_id), SUM(wins), SUM(losses), SUM(draws), SUM(busts),"
+            " SUM(net) FROM ("
+            " SELECT chat_id, name, wins, losses, draws, busts, 0 AS net FROM stats WHERE user_id = ?"
+            " UNION ALL SELECT chat_id, name, 0, 0, 0, 0, balance - ? FROM balances WHERE user_id = ?"
+            f") WHERE chat_id NOT IN ({marks})",
+            (user_id, start_balance, user_id, *skip),
+        ).fetchone()
+        if chats is None:
+            return None
+        return (name, [int(c) for c in chats.split(",")], *totals)
+
+    def load_profiles(self, start_balance):
+        """Профили игроков по всем чатам (profiles.ProfileIndex.seed) одним проходом."""
+        rows = self.reader.execute(
+            "SELECT user_id, MAX(name), GROUP_CONCAT(DISTINCT chat_id), SUM(wins), SUM(losses), SUM(draws), SUM(busts),"
+            " SUM(net) FROM ("
+            " SELECT chat_id, user_id, name, wins, losses, draws, busts, 0 AS net FROM stats"
+            " UNION ALL SELECT chat_id, user_id, name, 0, 0, 0, 0, balance - ? FROM balances"
+            ") GROUP BY user_id",
+            (start_balance,),
+        )
+        return [
+            (uid, name, [int(c) for c in chats.split(",")], *totals)
+            for uid, name, chats, *totals in rows
+        ]
+
+    async def load_game_times(self):
+        """(chat_id, last_active) всех игр в базе – сроки истечения при старте."""
+        self.reader
+
+        def read():
+            # своё соединение: чтение в потоке, reader занят event loop
+            conn = self._connect()
+            try:
+                return conn.execute(
+                    "SELECT chat_id, json_extract(data, '$.last_active') FROM games"
+                ).fetchall()
+            finally:
+                conn.close()
+
+        return await asyncio.to_thread(read)
+
+    def load_seeded(self):
+        """Сколько игр уже получили seed от SHOE_SEED (Engine.game_seed)."""
+        row = self.reader.execute("SELECT value FROM meta WHERE key = 'seeded'").fetchone()
+        return row[0] if row else 0
+
+    def _dropped(self, chat_id):
+        """Игра удалена, но удаление ещё не в базе (ждёт сброса или пишется)."""
+        for games in (self._games, self._writing):
+            if chat_id in games:
+                return games[chat_id] is None
+        return False
+
+    def load_game(self, chat_id):
+        if self._dropped(chat_id):
+            return None
+        row = self.reader.execute(
+            "SELECT data FROM games WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        return game_from_json(row[0]) if row else None
+
+    # --- пометки для отложенной записи ---
+
+    def _dirty(self):
+        if len(self._stats) + len(self._balances) + len(self._games) >= self.flush_size:
+            if self._wake is not None:
+                self._wake.set()
+
+    def mark_stats(self, chat_id, user_id, record):
+        self._stats[(chat_id, user_id)] = record
+        self._dirty()
+
+    def mark_balance(self, chat_id, user_id, record):
+        self._balances[(chat_id, user_id)] = record
+        self._dirty()
+
+    def mark_game(self, chat_id, game):
+        self._games[chat_id] = game
+        self._dirty()
+
+    def mark_seeded(self, count):
+        self._meta["seeded"] = count
+
+    def drop_game(self, chat_id):
+        self._games[chat_id] = None
+        self._dirty()
+
+    # --- сброс на диск ---
+
+    def _take_batch(self):
+        # снимок делается в потоке event loop, пока записи не меняются;
+        # ссылки на записи остаются у пачки – на случай неудачной записи
+        refs = (self._stats, self._balances, self._games, self._meta)
+        stats_rows = [
+            (c, u, r.name, r.wins, r.losses, r.draws, r.busts)
+            for (c, u), r in self._stats.items()
+        ]
+        balance_rows = [(c, u, r.name, r.balance) for (c, u), r in self._balances.items()]
+        game_rows = [(c, game_to_json(g)) for c, g in self._games.items() if g is not None]
+        game_drops = [(c,) for c, g in self._games.items() if g is None]
+        meta_rows = list(self._meta.items())
+        self._stats = {}
+        self._balances = {}
+        self._games = {}
+        self._meta = {}
+        return refs, (stats_rows, balance_rows, game_rows, game_drops, meta_rows)
+
+    def _restore(self, refs):
+        """Вернуть записи несохранённой пачки в грязные – более новые пометки не трогаем."""
+        for dirty, failed in zip((self._stats, self._balances, self._games, self._meta), refs):
+            for key, record in failed.items():
+                dirty.setdefault(key, record)
+
+    def _write(self, batch):
+        stats_rows, balance_rows, game_rows, game_drops, meta_rows = batch
+        if not any(batch):
+            return
+        with self.writer as conn:
+            conn.executemany("INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?, ?, ?)", stats_rows)
+            conn.executemany("INSERT OR REPLACE INTO balances VALUES (?, ?, ?, ?)", balance_rows)
+            conn.executemany("INSERT OR REPLACE INTO games VALUES (?, ?)", game_rows)
+            conn.executemany("DELETE FROM games WHERE chat_id = ?", game_drops)
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta_rows)
+
+    async def flush(self):
+        # сброс из run() и по запросу движка (/me у шардов) – по очереди
+        async with self._flushing:
+            refs, batch = self._take_batch()
+            self._writing = refs[2]
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except BaseException:
+                self._restore(refs)
+                raise
+            finally:
+                self._writing = {}
+
+    def flush_sync(self):
+        if self._reader is None and not (self._stats or self._balances or self._games or self._meta):
+            return
+        refs, batch = self._take_batch()
+        try:
+            self._write(batch)
+        except BaseException:
+            self._restore(refs)
+            raise
+
+    async def run(self):
+        """Фоновый цикл записи: по таймеру или по порогу flush_size."""
+        self._wake = asyncio.Event()
+        self._stopping = False
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                # база занята или диск полон: записи остались грязными, их
+                # запишет следующий сброс (после stop() – close())
+                print(f"storage: сброс не удался: {exc!r}")
+        self._wake = None
+
+    def stop(self):
+        """Просит run() сделать последний сброс и завершиться."""
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+
+class NullStorage:
+    """Хранилище без диска: всё только в памяти (нагрузочные тесты, офлайн-прогоны)."""
+
+    def load_stats(self, chat_id):
+        return None
+
+    load_balances = load_game = load_stats
+
+    def load_total_wins(self):
+        return []
+
+    def load_profile(self, user_id, start_balance):
+        return None
+
+    def load_profiles(self, start_balance):
+        # записей чатов нигде, кроме памяти движка, нет – пересобирать не из чего
+        return None
+
+    async def load_game_times(self):
+        return []
+
+    def load_seeded(self):
+        return 0
+
+    def recover(self, engine):
+        return 0
+
+    def mark_stats(self, chat_id, user_id, record):
+        pass
+
+    mark_balance = mark_stats
+
+    def mark_game(self, chat_id, game):
+        pass
+
+    def mark_seeded(self, count):
+        pass
+
+    def drop_game(self, chat_id):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def run(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
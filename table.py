@@ -0,0 +1,81 @@
+# ===== СООБЩЕНИЕ-СТОЛ =====
+#
+# На каждую раздачу в чате одно сообщение «стол»: первый показ отправляет
+# его, дальше оно только редактируется (game.table – его TableMessage).
+# Изменения копятся в течение delay секунд и уходят одним
+# редактированием; если текст и кнопки не поменялись, запрос не делается.
+#
+# Ожидающее обновление привязано к раздаче, а не только к чату: новая
+# раздача (reset) начинает новое сообщение, а итог прошлой, ещё не
+# отправленный, уходит отдельно в её сообщение и не затирается столом
+# следующей.
+#
+# bot – исходящая сторона движка (см. engine.Bot): send() и edit().
+# Обычно стол в чате один и ключ – chat_id; у турнира столов в чате много,
+# и ключом служит key.
+
+import asyncio
+import time
+
+import metrics
+from records import TableMessage
+
+class TableRenderer:
+    def __init__(self, bot, delay: float = 0.3):
+        self.bot = bot
+        self.delay = delay
+        self._pending = {}   # (ключ, TableMessage раздачи) -> (chat_id, text, buttons, shown)
+        self._tasks = {}     # (ключ, TableMessage раздачи) -> задача, которая сбрасывает pending
+
+    def update(self, chat_id, game, text, buttons=None, key=None, shown=None):
+        """Запомнить новое состояние стола; отправка – не позже чем через delay.
+
+        shown() вызывается, когда этот текст дошёл до чата (или отправить его
+        не удалось); если его заменило более новое состояние – не вызывается.
+        """
+        if key is None:
+            key = chat_id
+        hand = (key, game.table)
+        self._pending[hand] = (chat_id, text, buttons, shown)
+        if hand not in self._tasks:
+            self._tasks[hand] = asyncio.create_task(self._run(hand))
+
+    async def _run(self, hand):
+        try:
+            while hand in self._pending:
+                await asyncio.sleep(self.delay)
+                t = time.perf_counter()
+                chat_id, text, buttons, shown = self._pending.pop(hand)
+                try:
+                    await self._apply(chat_id, hand[1], text, buttons)
+                except Exception as exc:
+                    print(f"table: не удалось обновить стол в чате {chat_id}: {exc!r}")
+                if shown is not None:
+                    shown()
+                metrics.HANDLER_SECONDS.observe(time.perf_counter() - t, "table")
+        finally:
+            del self._tasks[hand]
+
+    async def _apply(self, chat_id, table, text, buttons):
+        # сравниваем и текст, и кнопки: финал стола убирает клавиатуру
+        shown = (text, buttons)
+        if table.shown == shown:
+            return
+        message_id = table.message_id
+        # edit() вернёт False, если сообщение удалили – тогда шлём новое
+        if message_id is None or not await self.bot.edit(chat_id, message_id, text, buttons):
+            table.message_id = await self.bot.send(chat_id, text, buttons)
+        table.shown = shown
+
+    def reset(self, game):
+        """Следующая раздача начнётся с нового сообщения."""
+        game.table = TableMessage()
+
+    def discard(self, key, game):
+        """Забыть неотправленное обновление стола (игра закрыта)."""
+        self._pending.pop((key, game.table), None)
+
+    async def drain(self):
+        """Дождаться отправки всего, что накопилось (при остановке бота)."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
@@ -0,0 +1,61 @@
+# ===== ТАЙМЕРЫ ХОДОВ =====
+#
+# Хешированное колесо таймеров: сроки раскладываются по ведрам
+# «номер тика % число вёдер», у каждого ключа не больше одного срока.
+# schedule() и cancel() – O(1) (перенос ключа между множествами),
+# advance() раз в тик просматривает только вёдра прошедших тиков. Срок
+# дальше одного оборота колеса лежит в своём ведре и ждёт, пока до него
+# дойдёт очередь: при обходе сравнивается сам срок, а не номер ведра.
+#
+# Одно колесо и одна задача на все столы вместо таймера на каждую игру.
+
+import time
+
+class TimingWheel:
+    def __init__(self, tick: float = 1.0, slots: int = 256, now: float = None):
+        self.tick = tick
+        self._slots = [set() for _ in range(slots)]
+        self._deadlines = {}   # ключ -> (срок, номер ведра)
+        # следующий тик, который обойдёт advance()
+        self._cursor = int((time.monotonic() if now is None else now) // tick)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def schedule(self, key, deadline: float):
+        """Поставить или перенести срок ключа."""
+        # просроченный срок – в ближайший обход, а не через оборот
+        slot = max(int(deadline // self.tick), self._cursor) % len(self._slots)
+        old = self._deadlines.get(key)
+        if old is not None and old[1] != slot:
+            self._slots[old[1]].discard(key)
+        self._slots[slot].add(key)
+        self._deadlines[key] = (deadline, slot)
+
+    def cancel(self, key):
+        old = self._deadlines.pop(key, None)
+        if old is not None:
+            self._slots[old[1]].discard(key)
+
+    def advance(self, now: float) -> list:
+        """Снять и вернуть ключи со сроком не позже now."""
+        tick = int(now // self.tick)
+        slots = self._slots
+        deadlines = self._deadlines
+        fired = []
+        # отстали больше чем на оборот – каждое ведро обходим один раз
+        for t in range(max(self._cursor, tick - len(slots) + 1), tick + 1):
+            bucket = slots[t % len(slots)]
+            if not bucket:
+                continue
+            due = [key for key in bucket if deadlines[key][0] <= now]
+            for key in due:
+                bucket.discard(key)
+                del deadlines[key]
+            fired += due
+        # текущий тик ещё не кончился – в следующий раз обходим и его
+        self._cursor = tick
+        return fired
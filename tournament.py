@@ -0,0 +1,379 @@
+# ===== ТУРНИРЫ =====
+#
+# Турнир на выбывание в одном чате: /tournament открывает регистрацию,
+# /tournament join – участие, /tournament start – старт. Участники
+# рассаживаются по столам до seats человек, каждый стол играет раздачу
+# без дилера и без ставок, лучшая рука проходит в следующий раунд (при
+# ничьей за первое место или общем переборе – переигровка среди лучших).
+# Раунды идут, пока не останется один победитель.
+#
+# Столы – обычные записи Game, раздача и ходы – те же Engine.deal/hit/
+# stand, победитель стола – Engine.rank_hands, как в расчёте finish_game.
+# Турнирные столы живут только в памяти: в games, базу и журнал событий
+# они не попадают, статистику и балансы чата не трогают.
+#
+# Один TournamentScheduler на все турниры решает, когда садиться за стол:
+# одновременно играет не больше max_tables столов, в одном чате – не
+# больше, чем успевает обновлять лимит чата; остальные ждут в очереди,
+# и место получает чат, у которого столов меньше. Сообщения турнира идут
+# через исходящую сторону движка, то есть через общую очередь исходящих
+# (outbox.Outbox) с её лимитами бота и чата; пока стол ждёт там, правки
+# его сообщения заменяют друг друга.
+
+import asyncio
+import random
+from array import array
+from collections import deque
+
+import metrics
+from records import Game, Player
+from shoe import Shoe
+from table import TableRenderer
+
+SEATS = 7
+
+# планировщик: как часто (секунд) каждый стол чата должен успевать обновиться
+TABLE_PERIOD = 15.0
+
+def turn_buttons(no, game):
+    """Hit/Stand турнирного стола: "t:hit:<номер стола>:<версия>" в hex."""
+    token = f"{no:x}:{game.version:x}"
+    return ((("Hit 🃏", "t:hit:" + token), ("Stand ✋", "t:stand:" + token)),)
+
+class TournamentScheduler:
+    """Общий планировщик турнирных столов.
+
+    Место достаётся чату, у которого меньше всего столов за игрой, а не
+    первому в очереди: раунд большого турнира не занимает все max_tables. В одном чате играет не
+    больше столов, чем лимит чата успевает обновлять: chat_rate сообщений
+    в секунду – правка каждому столу не реже чем раз в table_period секунд.
+    chat_rate=None – без лимита на чат.
+    """
+
+    def __init__(self, max_tables=32, chat_rate=None, table_period=TABLE_PERIOD):
+        self.max_tables = max_tables
+        self.per_chat = max_tables if chat_rate is None else max(1, int(chat_rate * table_period))
+        self.active = 0
+        self._active = {}           # chat_id -> столов этого чата за игрой
+        self._ready = {}            # chat_id -> deque(start) – столы, ждущие места
+
+    def submit(self, chat_id, start):
+        """Поставить стол в очередь; start() вызовется, когда освободится место."""
+        queue = self._ready.get(chat_id)
+        if queue is None:
+            queue = self._ready[chat_id] = deque()
+        queue.append(start)
+        self._admit()
+
+    def _admit(self):
+        ready, active = self._ready, self._active
+        while ready and self.active < self.max_tables:
+            # место – чату, у которого сейчас меньше всего столов (при равенстве –
+            # кто раньше встал в очередь): один турнир не занимает все места
+            chat_id = min(ready, key=lambda c: active.get(c, 0))
+            if active.get(chat_id, 0) >= self.per_chat:
+                break
+            queue = ready[chat_id]
+            start = queue.popleft()
+            if not queue:
+                del ready[chat_id]
+            self.active += 1
+            active[chat_id] = active.get(chat_id, 0) + 1
+            start()
+
+    def done(self, chat_id):
+        """Стол чата доиграл – место следующему в очереди."""
+        self.active -= 1
+        left = self._active[chat_id] - 1
+        if left:
+            self._active[chat_id] = left
+        else:
+            del self._active[chat_id]
+        self._admit()
+
+    def cancel(self, chat_id):
+        """Убрать из очереди столы турнира этого чата."""
+        self._ready.pop(chat_id, None)
+
+class Tournament:
+    def __init__(self, chat_id, seed=None):
+        self.chat_id = chat_id
+        self.entrants = {}      # user_id -> имя, в порядке регистрации
+        self.started = False
+        self.round = 0
+        self.alive = []         # user_id, играющие в текущем раунде
+        self.advanced = []      # победители столов текущего раунда
+        self.tables = {}        # номер стола -> Game, пока стол играет
+        self.seat = {}          # user_id -> номер стола
+        self.waiting = 0        # столов раунда в очереди планировщика
+        self.last_table = 0
+        self.hands = 0
+        self.rng = random.Random(seed)
+
+class Tournaments:
+    """Турниры по чатам: команды, рассадка, ходы за турнирными столами."""
+
+    def __init__(self, engine, scheduler=None, seats=SEATS, table_delay=0.3):
+        self.engine = engine
+        self.scheduler = scheduler or TournamentScheduler()
+        self.seats = seats
+        self.bot = engine.bot
+        self.tables = TableRenderer(self.bot, table_delay)
+        self.by_chat = {}       # chat_id -> Tournament
+        self._announcements = set()
+
+    async def stop(self):
+        await self.tables.drain()
+        if self._announcements:
+            await asyncio.gather(*self._announcements, return_exceptions=True)
+
+    def _announce(self, chat_id, text):
+        task = asyncio.create_task(self.bot.send(chat_id, text))
+        self._announcements.add(task)
+        task.add_done_callback(self._announcements.discard)
+
+    # ===== КОМАНДЫ =====
+
+    async def command(self, r, chat_id, user_id, name, args):
+        sub = args[0].lower() if args else ""
+        t = self.by_chat.get(chat_id)
+
+        if sub in ("", "new"):
+            if t is not None:
+                await r.reply(self.status_text(t))
+                return
+            # seed от движка: с SHOE_SEED турнир воспроизводим
+            self.by_chat[chat_id] = Tournament(chat_id, self.engine.game_seed(chat_id))
+            await r.reply(
+                "Открыта регистрация на турнир! 🏆\n"
+                f"За столом до {self.seats} игроков, дальше проходит лучшая рука.\n"
+                "/tournament join – участвовать\n"
+                "/tournament start – начать (от 2 участников)"
+            )
+            return
+
+        if t is None:
+            await r.reply("Турнира нет. /tournament чтобы открыть регистрацию.")
+            return
+
+        if sub == "join":
+            if t.started:
+                await r.reply("Турнир уже идёт, регистрация закрыта.")
+            elif user_id in t.entrants:
+                await r.reply("Ты уже в турнире.")
+            else:
+                t.entrants[user_id] = name
+                await r.reply(f"{name} в турнире! Участников: {len(t.entrants)}.")
+        elif sub == "start":
+            if t.started:
+                await r.reply("Турнир уже идёт.")
+            elif len(t.entrants) < 2:
+                await r.reply("Для турнира нужно хотя бы 2 участника: /tournament join.")
+            else:
+                t.started = True
+                t.alive = list(t.entrants)
+                await r.reply(f"Турнир начался! Участников: {len(t.alive)}.")
+                self._next_round(t)
+        elif sub == "status":
+            await r.reply(self.status_text(t))
+        elif sub == "cancel":
+            self.cancel(t)
+            await r.reply("Турнир отменён.")
+        else:
+            await r.reply("Использование: /tournament [join | start | status | cancel]")
+
+    def status_text(self, t):
+        if not t.started:
+            return f"Идёт регистрация на турнир. Участников: {len(t.entrants)}. /tournament join"
+        return (
+            f"Турнир, раунд {t.round}: в игре {len(t.alive)} из {len(t.entrants)}.\n"
+            f"Столов играет: {len(t.tables)}, ждут начала: {t.waiting}, "
+            f"доиграли: {len(t.advanced)}."
+        )
+
+    def cancel(self, t):
+        self.scheduler.cancel(t.chat_id)
+        for no, game in t.tables.items():
+            self.tables.discard((t.chat_id, no), game)
+            self.engine.disarm_turn((t.chat_id, no))
+            self.scheduler.done(t.chat_id)
+        t.tables.clear()
+        del self.by_chat[t.chat_id]
+
+    # ===== РАУНДЫ И СТОЛЫ =====
+
+    def _next_round(self, t):
+        if len(t.alive) == 1:
+            winner = t.entrants[t.alive[0]]
+            del self.by_chat[t.chat_id]
+            self._announce(
+                t.chat_id,
+                f"🏆 Победитель турнира: {winner}!\n"
+                f"Участников: {len(t.entrants)}, раундов: {t.round}, раздач: {t.hands}.",
+            )
+            return
+
+        t.round += 1
+        alive = t.alive
+        t.rng.shuffle(alive)
+        # столы поровну: 8 игроков при 7 местах – два стола по 4
+        count = -(-len(alive) // self.seats)
+        size, extra = divmod(len(alive), count)
+        self._announce(t.chat_id, f"Раунд {t.round}: {len(alive)} игроков за {count} столами.")
+        pos = 0
+        for i in range(count):
+            uids = alive[pos:pos + size + (1 if i < extra else 0)]
+            pos += len(uids)
+            t.last_table += 1
+            no = t.last_table
+            for uid in uids:
+                t.seat[uid] = no
+            t.waiting += 1
+            self.scheduler.submit(t.chat_id, lambda no=no, uids=uids: self._start_table(t, no, uids))
+
+    def _start_table(self, t, no, uids):
+        t.waiting -= 1
+        engine = self.engine
+        game = Game(Shoe(engine.shoe_decks, engine.shoe_penetration, t.rng.getrandbits(63)))
+        for uid in uids:
+            game.players[uid] = Player(t.entrants[uid])
+            game.order.append(uid)
+        t.tables[no] = game
+        engine.deal(game)
+        t.hands += 1
+        self._show(t, no, game)
+
+    def _show(self, t, no, game, last_action=""):
+        current = game.players[game.order[game.turn]]
+        text = (
+            f"🏆 Турнир · раунд {t.round} · стол {no}\n\n"
+            f"{self.engine.format_game_state(game)}\n\n"
+            f"Сейчас ход: {current.name}"
+        )
+        if last_action:
+            text = f"{last_action}\n\n{text}"
+        # показ идёт после каждого изменения стола – кнопки прошлого показа устаревают
+        game.version += 1
+        version = game.version
+        key = (t.chat_id, no)
+        # срок хода идёт с доставки стола, а не с постановки в очередь: у
+        # группы ~20 сообщений в минуту, и правка может ждать дольше срока
+        self.engine.disarm_turn(key)
+        self.tables.update(
+            t.chat_id, game, text, turn_buttons(no, game), key=key,
+            shown=lambda: self._arm(t, no, game, version),
+        )
+
+    def _arm(self, t, no, game, version):
+        # стол уже доиграли, отменили или показали заново – этот показ устарел
+        if t.tables.get(no) is game and game.version == version:
+            self.engine.arm_turn((t.chat_id, no))
+
+    def _finish_table(self, t, no, game):
+        engine = self.engine
+        best, top, rest = engine.rank_hands(game)
+        state = engine.format_game_state(game)
+
+        if len(top) != 1:
+            # ничья за первое место или все с перебором – лучшие играют ещё раз
+            if top:
+                for uid in rest:
+                    del t.seat[uid]
+                names = ", ".join([game.players[uid].name for uid in top])
+                reason = f"Ничья: {names} с {best} очками 🤝"
+                game.players = {uid: game.players[uid] for uid in top}
+                game.order = array("q", top)
+            else:
+                reason = "Все с перебором 💥"
+            engine.deal(game)
+            t.hands += 1
+            self._show(t, no, game, f"{reason}\n{state}\n\nПереигровка!")
+            return
+
+        winner = top[0]
+        t.advanced.append(winner)
+        self.engine.disarm_turn((t.chat_id, no))
+        for uid in game.order:
+            del t.seat[uid]
+        del t.tables[no]
+        self.tables.update(
+            t.chat_id, game,
+            f"🏆 Турнир · раунд {t.round} · стол {no}\n\n{state}\n\n"
+            f"Дальше проходит {game.players[winner].name} с {best} очками! 🎉",
+            key=(t.chat_id, no),
+        )
+        self.scheduler.done(t.chat_id)
+        if not t.tables and not t.waiting:
+            t.alive, t.advanced = t.advanced, []
+            self._next_round(t)
+
+    # ===== КНОПКИ =====
+
+    def _table(self, chat_id, data):
+        """(турнир, номер стола, Game) для текущих кнопок стола или None."""
+        parts = data.split(":")
+        t = self.by_chat.get(chat_id)
+        if len(parts) != 4 or t is None:
+            return None
+        try:
+            no, version = int(parts[2], 16), int(parts[3], 16)
+        except ValueError:
+            return None
+        game = t.tables.get(no)
+        if game is None or game.version != version:
+            return None
+        return t, no, game
+
+    def is_stale(self, chat_id, data):
+        return self._table(chat_id, data) is None
+
+    async def press(self, r, chat_id, user_id, name, data):
+        found = self._table(chat_id, data)
+        if found is None:
+            metrics.STALE_PRESSES.inc("engine")
+            await r.answer("Эта кнопка уже устарела.")
+            return
+        t, no, game = found
+        if t.seat.get(user_id) != no:
+            await r.answer("Ты не играешь за этим столом.", alert=True)
+            return
+
+        if game.order[game.turn] != user_id:
+            await r.answer("Сейчас ход другого игрока!", alert=True)
+            return
+
+        player = game.players[user_id]
+        action = data.split(":", 2)[1]
+        if action == "hit":
+            self.engine.hit(game, user_id)
+            if not player.busted:
+                self._show(t, no, game, f"{player.name} взял карту: {player.hand.last_glyph()}")
+                await r.answer()
+                return
+            last_action = f"{player.name} взял карту: {player.hand.last_glyph()} – перебор 💥"
+        elif action == "stand":
+            self.engine.stand(game, user_id)
+            last_action = f"{player.name} остановился."
+        else:
+            await r.answer()
+            return
+
+        self._next_turn(t, no, game, last_action)
+        await r.answer()
+
+    def _next_turn(self, t, no, game, last_action):
+        if self.engine.all_players_done(game):
+            self._finish_table(t, no, game)
+        else:
+            self._show(t, no, game, last_action)
+
+    def turn_timeout(self, key):
+        """Срок хода за турнирным столом истёк – игрок стоит (см. Engine.arm_turn)."""
+        chat_id, no = key
+        t = self.by_chat.get(chat_id)
+        game = None if t is None else t.tables.get(no)
+        if game is None or self.engine.all_players_done(game):
+            return
+        player = game.players[game.order[game.turn]]
+        self.engine.stand(game, game.order[game.turn])
+        self._next_turn(t, no, game, f"{player.name} не походил вовремя и остановился ⏰")
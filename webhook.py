@@ -0,0 +1,152 @@
+# ===== ВЕБХУК =====
+#
+# Альтернатива run_polling: Telegram сам присылает апдейты POST-запросами.
+# Сервер на голом asyncio (без лишних зависимостей) проверяет секретный
+# заголовок, кладёт JSON апдейта в ограниченную очередь и сразу отвечает.
+# Если очередь забита дольше put_timeout, отвечаем 503 – Telegram повторит
+# доставку позже, а мы не копим апдейты без границ (backpressure).
+# Апдейты из очереди разбирают workers обработчиков.
+
+import asyncio
+import hmac
+import json
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+MAX_BODY = 1 << 20
+
+# ===== МИНИМАЛЬНЫЙ HTTP/1.1 =====
+
+async def read_request(reader):
+    """(method, path, headers, body) или None, если клиент закрыл соединение."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("bad request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise ValueError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+def write_response(writer, status: int, body: bytes = b"", content_type: str = "application/json"):
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+# ===== СЕРВЕР =====
+
+class WebhookServer:
+    """Приём апдейтов от Telegram.
+
+    handle(data) – корутина, которая обрабатывает один апдейт (dict из JSON).
+    """
+
+    def __init__(self, handle, *, host="127.0.0.1", port=8443, path="/webhook",
+                 secret=None, queue_size=1024, workers=64, put_timeout=1.0):
+        self.handle = handle
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self.accepted = 0
+        self.rejected = 0
+        self._server = None
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # дорабатываем то, что уже приняли
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            data = await self.queue.get()
+            try:
+                await self.handle(data)
+            except Exception as exc:
+                print(f"webhook: ошибка обработки апдейта {data.get('update_id')}: {exc!r}")
+            finally:
+                self.queue.task_done()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    write_response(writer, 400)
+                    break
+                if request is None:
+                    break
+                status = await self._accept(*request)
+                write_response(writer, status)
+                await writer.drain()
+                if request[2].get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _accept(self, method, path, headers, body) -> int:
+        if path != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if self.secret is not None:
+            token = headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token.encode(), self.secret.encode()):
+                return 403
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400
+        if not isinstance(data, dict) or "update_id" not in data:
+            return 400
+        try:
+            await asyncio.wait_for(self.queue.put(data), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return 503
+        self.accepted += 1
+        return 200